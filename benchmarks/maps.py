@@ -0,0 +1,68 @@
+from typing import Dict
+import os
+import numpy as np
+from src.models.grid import (
+    Grid,
+    CELL_NORMAL_CHANNEL,
+    CELL_MAIN_CHANNEL,
+    DIRECTION_BITS,
+    MAP_FORMAT_BINARY,
+)
+
+# 仓库自带的地图
+BASE_MAP = os.path.join("output", "map.json")
+
+# 生成地图的尺寸 (宽, 高)
+GENERATED_SIZES = {
+    "warehouse_200x120": (200, 120),
+    "warehouse_400x240": (400, 240),
+}
+
+ALL_DIRECTIONS = sum(DIRECTION_BITS.values())
+VERTICAL = DIRECTION_BITS["up"] | DIRECTION_BITS["down"]
+
+
+def generate_warehouse(width: int, height: int, seed: int = 0, cargo_ratio: float = 0.6,
+                       row_spacing: int = 8, column_spacing: int = 16) -> Grid:
+    """按自带地图的结构生成立库地图
+
+    每隔 row_spacing 行、column_spacing 列是四向通行的主干道，其余格子是只能
+    上下通行的货架巷道，按 cargo_ratio 随机放置货物。左侧主干道与各主干道
+    行的交点作为入口和出口。
+    """
+    rng = np.random.RandomState(seed)
+    ys, xs = np.divmod(np.arange(width * height), width)
+    main = (ys % row_spacing == 0) | (xs % column_spacing == 0)
+    cell_types = np.where(main, CELL_MAIN_CHANNEL, CELL_NORMAL_CHANNEL).astype(np.uint8)
+    direction_masks = np.where(main, ALL_DIRECTIONS, VERTICAL).astype(np.uint8)
+    cargo = ~main & (rng.rand(width * height) < cargo_ratio)
+
+    grid = Grid(width, height)
+    grid.cell_types[:] = cell_types
+    grid.direction_masks[:] = direction_masks
+    grid.cargo[:] = cargo
+    grid.structure_version += 1
+    grid.cargo_version += 1
+    for y in range(0, height, row_spacing):
+        grid.add_entrance(0, y)
+        grid.add_exit(0, y)
+    return grid
+
+
+def prepare_maps(directory: str, include_generated: bool = True) -> Dict[str, str]:
+    """准备基准使用的地图文件，返回 名称 -> 文件名；生成的地图以二进制格式保存在 directory"""
+    maps = {"base": BASE_MAP}
+    if include_generated:
+        os.makedirs(directory, exist_ok=True)
+        for name, (width, height) in GENERATED_SIZES.items():
+            filename = os.path.join(directory, f"{name}.bin")
+            generate_warehouse(width, height).save(filename, MAP_FORMAT_BINARY)
+            maps[name] = filename
+    return maps
+
+
+def load_map(filename: str) -> Grid:
+    """加载地图文件"""
+    grid = Grid(1, 1)
+    grid.load(filename)
+    return grid
@@ -0,0 +1,134 @@
+"""性能基准
+
+在仓库根目录运行：
+
+    python -m benchmarks.run --save-baseline      # 在本机生成基准线
+    python -m benchmarks.run                      # 运行并与 benchmarks/baseline.json 比较
+    python -m benchmarks.run --quick --no-generated
+
+基准线是本机的绝对耗时，只能与同一台机器上的结果比较，不提交到仓库。
+发现退化时以状态码 1 退出。
+"""
+from typing import Dict, List, Tuple
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+from src.utils.events import events, LEVEL_OFF
+from benchmarks.maps import prepare_maps
+from benchmarks.suite import run_suite, Result
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# 检查退化的指标及其好坏方向：1 表示越大越好，-1 表示越小越好；尾部延迟
+# 样本少、波动大，不在表中的指标只展示
+METRIC_DIRECTIONS = {
+    "mean_ms": -1,
+    "p50_ms": -1,
+    "wall_s": -1,
+    "steps_per_s": 1,
+    "tasks_per_s": 1,
+    "peak_kb": -1,
+    "expanded_total": -1,
+}
+
+# 吞吐量基准完成的任务量，任何下降都算退化：完不成的任务越多，耗时反而可能越短
+COMPLETION_METRICS = ("tasks_total", "tasks_completed", "completion_rate")
+
+# 与计时无关、每次运行都相同的指标，任何变化都报告
+DETERMINISTIC_METRICS = ("queries", "found", "expanded_total", "assigned_mean", "steps", "tasks_total",
+                         "tasks_completed", "completion_rate", "distance_travelled")
+
+
+def compare(results: Dict[str, Result], baseline: Dict[str, Result], tolerance: float,
+            memory_tolerance: float) -> Tuple[List[str], List[str]]:
+    """与基准线比较，返回 (退化, 结果变化)"""
+    regressions = []
+    changes = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        for metric, value in result.items():
+            old = reference.get(metric)
+            if old is None:
+                continue
+            if metric in DETERMINISTIC_METRICS and value != old:
+                changes.append(f"{name} {metric}: {old} -> {value}")
+            if metric in COMPLETION_METRICS and value < old:
+                regressions.append(f"{name} {metric}: {old:.4g} -> {value:.4g} (fewer tasks completed)")
+            direction = METRIC_DIRECTIONS.get(metric)
+            if direction is None or not old:
+                continue
+            change = (value - old) / old * direction  # 负数表示变差
+            limit = memory_tolerance if metric == "peak_kb" else tolerance
+            if change < -limit:
+                regressions.append(f"{name} {metric}: {old:.4g} -> {value:.4g} ({-change:+.0%} worse)")
+    return regressions, changes
+
+
+def print_results(results: Dict[str, Result]) -> None:
+    for name, result in results.items():
+        metrics = "  ".join(f"{metric}={value:.4g}" for metric, value in result.items())
+        print(f"{name}\n    {metrics}")
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="路径规划与调度的性能基准")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="基准线 JSON 文件")
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果写入基准线文件")
+    parser.add_argument("--output", help="把本次结果另存为 JSON")
+    parser.add_argument("--quick", action="store_true", help="减少查询数和重复次数")
+    parser.add_argument("--no-generated", action="store_true", help="只使用 output/map.json")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="计时指标允许的相对退化")
+    parser.add_argument("--memory-tolerance", type=float, default=0.10, help="内存峰值允许的相对增长")
+    args = parser.parse_args(argv)
+
+    events.configure(level=LEVEL_OFF)
+    config = {"quick": args.quick, "generated": not args.no_generated}
+    with tempfile.TemporaryDirectory(prefix="benchmarks-") as workdir:
+        maps = prepare_maps(os.path.join(workdir, "maps"), include_generated=not args.no_generated)
+        results = run_suite(maps, workdir, quick=args.quick)
+    print_results(results)
+    incomplete = [name for name, result in results.items() if result.get("completion_rate", 1.0) < 1.0]
+    if incomplete:
+        # 吞吐量只在任务全部完成时有意义
+        print(f"\n未完成全部任务: {', '.join(incomplete)}")
+
+    report = {"config": config, "python": platform.python_version(), "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\n基准线已写入 {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\n没有基准线 {args.baseline}，使用 --save-baseline 在本机生成")
+        return 0
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("config") != config:
+        # 查询集和重复次数不同，结果不可比
+        print(f"\n基准线的配置 {baseline.get('config')} 与本次 {config} 不同，不做比较")
+        return 0
+    regressions, changes = compare(results, baseline["results"], args.tolerance, args.memory_tolerance)
+    if changes:
+        print("\n结果变化（与计时无关的指标，可能是算法行为改变）:")
+        for line in changes:
+            print(f"    {line}")
+    if regressions:
+        print("\n性能退化:")
+        for line in regressions:
+            print(f"    {line}")
+        return 1
+    print("\n没有超出容差的退化")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
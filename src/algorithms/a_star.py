@@ -1,13 +1,25 @@
-from typing import List, Tuple, Optional, Dict, Set
+from typing import List, Tuple, Optional, Callable, Dict
 from src.models.grid import Grid
+from src.models.graph import GridGraph
 from src.models.vehicle import Vehicle
 from src.models.constraints import ConstraintManager
-import heapq
+from src.algorithms.search import SearchSpace, SearchResult
+from src.algorithms.heuristics import DistanceFieldCache
+from src.algorithms.path_cache import PathCache
 
 class AStarPlanner:
+    # 规划结果是否依赖当前时刻；为 False 时一对多搜索得到的路径可以直接使用
+    time_dependent = False
+
     def __init__(self, grid: Grid, constraint_manager: ConstraintManager):
         self.grid = grid
         self.constraint_manager = constraint_manager
+        self.graph = GridGraph(grid)
+        self.search_space = SearchSpace(grid.num_nodes)
+        self.distance_fields = DistanceFieldCache(self.graph)
+        self.path_cache = PathCache()
+        self.last_result: Optional[SearchResult] = None
+        self.current_time = 0  # 调度器当前时刻，时空规划器使用
 
     @staticmethod
     def calculate_distance(pos1: Tuple[int, int], pos2: Tuple[int, int]) -> float:
@@ -31,9 +43,153 @@ class AStarPlanner:
 
     def get_valid_neighbors(self, position: Tuple[int, int], vehicle: Vehicle) -> List[Tuple[int, int]]:
         """获取有效的相邻位置"""
-        neighbors = self.grid.get_neighbors(position[0], position[1], vehicle.is_empty())
+        if not self.grid.is_valid_position(*position):
+            return []
+        self.graph.ensure_current()
+        node = self.grid.node_id(*position)
+        neighbors = [self.grid.node_position(n) for n in self.graph.neighbors(node, vehicle.is_empty())]
         return [n for n in neighbors if self.is_valid_position(n, vehicle)]
 
+    def manhattan_heuristic(self, goal: int) -> Callable[[int], float]:
+        """以节点编号计算到目标的曼哈顿距离"""
+        width = self.grid.width
+        goal_y, goal_x = divmod(goal, width)
+
+        def heuristic(node: int) -> float:
+            y, x = divmod(node, width)
+            return abs(x - goal_x) + abs(y - goal_y)
+
+        return heuristic
+
+    def heuristic(self, goal: int) -> Callable[[int], float]:
+        """优先使用目标的精确距离场，未缓存时退回曼哈顿距离"""
+        field = self.distance_fields.get(goal)
+        if field is not None:
+            return field.__getitem__
+        return self.manhattan_heuristic(goal)
+
+    def passability(self, vehicle: Vehicle, include_vehicle_conflict: bool = True) -> Callable[[int], bool]:
+        """返回按节点编号检查约束的函数：静态约束查掩码，动态约束逐个检查"""
+        grid = self.grid
+        width = grid.width
+        mask = self.constraint_manager.passable_mask(grid, vehicle.is_empty())
+        dynamic = self.constraint_manager.dynamic_constraints(include_vehicle_conflict)
+        if not dynamic:
+            return mask.__getitem__
+
+        def is_passable(node: int) -> bool:
+            if not mask[node]:
+                return False
+            y, x = divmod(node, width)
+            position = (x, y)
+            for constraint in dynamic:
+                if not constraint.check(grid, vehicle, position):
+                    return False
+            return True
+
+        return is_passable
+
+    def prepare(self) -> None:
+        """确保邻接表和搜索数组与地图同步"""
+        self.graph.ensure_current()
+        if self.search_space.num_nodes != self.grid.num_nodes:
+            self.search_space.resize(self.grid.num_nodes)
+
+    def cache_state(self):
+        """影响规划结果的版本号：地图、约束集合、车辆占用"""
+        return (
+            self.grid.version,
+            self.constraint_manager.version,
+            self.constraint_manager.vehicle_conflict_constraint.version,
+        )
+
+    def cache_query(self, vehicle: Vehicle, start: int, goal: int):
+        """同一版本下决定规划结果的查询参数"""
+        return (start, goal, vehicle.is_empty())
+
+    def search(
+        self,
+        vehicle: Vehicle,
+        start: Tuple[int, int],
+        goal: Tuple[int, int]
+    ) -> SearchResult:
+        """A*搜索，返回节点编号路径和扩展节点数；相同查询命中缓存"""
+        if not (self.grid.is_valid_position(*start) and self.grid.is_valid_position(*goal)):
+            self.last_result = SearchResult(None)
+            return self.last_result
+        self.prepare()
+        start_node = self.grid.node_id(*start)
+        goal_node = self.grid.node_id(*goal)
+
+        state = self.cache_state()
+        query = self.cache_query(vehicle, start_node, goal_node)
+        result = self.path_cache.get(state, query)
+        if result is None:
+            result = self.plan(vehicle, start_node, goal_node)
+            self.path_cache.put(state, query, result)
+        self.last_result = result
+        return self.last_result
+
+    def plan(self, vehicle: Vehicle, start: int, goal: int) -> SearchResult:
+        """不经缓存的单次搜索"""
+        return self.search_space.search(
+            start,
+            goal,
+            self.graph.successors(vehicle.is_empty()),
+            self.passability(vehicle),
+            self.heuristic(goal),
+        )
+
+    def search_many(self, vehicles: List[Vehicle], goal: Tuple[int, int]) -> Dict[str, SearchResult]:
+        """一次反向搜索求出多辆车到同一目标的最短路径，只返回可达的车辆"""
+        results: Dict[str, SearchResult] = {}
+        if not self.grid.is_valid_position(*goal):
+            return results
+        self.prepare()
+        goal_node = self.grid.node_id(*goal)
+        state = self.cache_state()
+        for is_empty in (True, False):
+            group = [v for v in vehicles
+                     if v.is_empty() == is_empty and self.grid.is_valid_position(*v.current_position)]
+            if not group:
+                continue
+            sources = {v.id: self.grid.node_id(*v.current_position) for v in group}
+
+            # 与单车查询共用缓存：全部命中时不用搜索
+            cached = {}
+            if not self.time_dependent:
+                for vehicle in group:
+                    hit = self.path_cache.get(state, self.cache_query(vehicle, sources[vehicle.id], goal_node))
+                    if hit is None:
+                        break
+                    cached[vehicle.id] = hit
+            if len(cached) == len(group):
+                found = {sources[vid]: result for vid, result in cached.items() if result.path is not None}
+            else:
+                found = self.search_space.reverse_search(
+                    goal_node,
+                    sources.values(),
+                    self.graph.predecessors(is_empty),
+                    self.passability(group[0]),
+                )
+                if not self.time_dependent:
+                    # 反向搜索结束时未找到的起点一定不可达
+                    for vehicle in group:
+                        source = sources[vehicle.id]
+                        result = found.get(source, SearchResult(None))
+                        self.path_cache.put(state, self.cache_query(vehicle, source, goal_node), result)
+
+            for vehicle_id, source in sources.items():
+                if source in found:
+                    results[vehicle_id] = found[source]
+        return results
+
+    def to_positions(self, path: Optional[List[int]]) -> Optional[List[Tuple[int, int]]]:
+        """节点编号路径转坐标路径"""
+        if path is None:
+            return None
+        return [self.grid.node_position(node) for node in path]
+
     def find_path(
         self,
         vehicle: Vehicle,
@@ -41,31 +197,20 @@ class AStarPlanner:
         goal: Tuple[int, int]
     ) -> Optional[List[Tuple[int, int]]]:
         """A*算法寻找路径"""
-        open_set: List[Tuple[float, int, Tuple[int, int]]] = []
-        closed_set: Set[Tuple[int, int]] = set()
-        counter = 0
-
-        g_score: Dict[Tuple[int, int], float] = {start: 0}
-        f_score: Dict[Tuple[int, int], float] = {start: self.calculate_distance(start, goal)}
-        came_from: Dict[Tuple[int, int], Tuple[int, int]] = {}
-
-        heapq.heappush(open_set, (f_score[start], counter, start))
-        counter += 1
-
-        while open_set:
-            _, _, current = heapq.heappop(open_set)
-            if current == goal:
-                return self.reconstruct_path(came_from, current)
-            closed_set.add(current)
-            for neighbor in self.get_valid_neighbors(current, vehicle):
-                if neighbor in closed_set:
-                    continue
-                tentative_g = g_score[current] + self.calculate_distance(current, neighbor)
-                if neighbor not in g_score or tentative_g < g_score[neighbor]:
-                    came_from[neighbor] = current
-                    g_score[neighbor] = tentative_g
-                    f_score[neighbor] = tentative_g + self.calculate_distance(neighbor, goal)
-                    if not any(neighbor == pos for _, _, pos in open_set):
-                        heapq.heappush(open_set, (f_score[neighbor], counter, neighbor))
-                        counter += 1
-        return None
\ No newline at end of file
+        return self.to_positions(self.search(vehicle, start, goal).path)
+
+    def register_vehicle(self, vehicle: Vehicle) -> None:
+        """注册车辆到约束系统"""
+        self.constraint_manager.add_vehicle(vehicle)
+
+    def reserve_path(self, vehicle: Vehicle, path: List[Tuple[int, int]]) -> None:
+        """提交车辆路径，整条路径视为占用"""
+        self.constraint_manager.add_path(vehicle, path)
+
+    def release_path(self, vehicle: Vehicle) -> None:
+        """撤销车辆路径"""
+        self.constraint_manager.remove_path(vehicle)
+
+    def reserve_paths(self, assignments: List[Tuple[Vehicle, List[Tuple[int, int]]]]) -> None:
+        """一次提交多辆车的路径，占用索引只更新一次"""
+        self.constraint_manager.update_paths(assignments)
@@ -0,0 +1,70 @@
+from typing import List, Tuple
+from src.algorithms.search import INF
+
+
+def hungarian(cost: List[List[float]]) -> List[Tuple[int, int]]:
+    """匈牙利算法求最小代价二分匹配
+
+    cost 为 行数 x 列数 的矩阵，可以不是方阵，INF 表示不可分配。
+    返回 (行, 列) 列表，每行、每列至多出现一次，匹配数为 min(行数, 列数)
+    中可行的最大值，不可分配的配对不会出现在结果中。
+    """
+    rows = len(cost)
+    cols = len(cost[0]) if rows else 0
+    if rows == 0 or cols == 0:
+        return []
+    if rows > cols:
+        transposed = [[cost[r][c] for r in range(rows)] for c in range(cols)]
+        return [(r, c) for c, r in hungarian(transposed)]
+
+    # 不可分配的格子换成足够大的有限值，求解后再剔除
+    finite = [value for row in cost for value in row if value != INF]
+    big = (max(finite) if finite else 0) * (rows + 1) + 1
+    matrix = [[value if value != INF else big for value in row] for row in cost]
+
+    # 势能法，行数 <= 列数，下标从 1 开始，0 为虚拟列
+    u = [0.0] * (rows + 1)
+    v = [0.0] * (cols + 1)
+    match = [0] * (cols + 1)  # match[列] = 行
+    way = [0] * (cols + 1)
+    for row in range(1, rows + 1):
+        match[0] = row
+        col0 = 0
+        min_value = [INF] * (cols + 1)
+        used = [False] * (cols + 1)
+        while True:
+            used[col0] = True
+            row0 = match[col0]
+            delta = INF
+            col1 = 0
+            for col in range(1, cols + 1):
+                if used[col]:
+                    continue
+                current = matrix[row0 - 1][col - 1] - u[row0] - v[col]
+                if current < min_value[col]:
+                    min_value[col] = current
+                    way[col] = col0
+                if min_value[col] < delta:
+                    delta = min_value[col]
+                    col1 = col
+            for col in range(cols + 1):
+                if used[col]:
+                    u[match[col]] += delta
+                    v[col] -= delta
+                else:
+                    min_value[col] -= delta
+            col0 = col1
+            if match[col0] == 0:
+                break
+        while col0:
+            col1 = way[col0]
+            match[col0] = match[col1]
+            col0 = col1
+
+    pairs = []
+    for col in range(1, cols + 1):
+        row = match[col]
+        if row and cost[row - 1][col - 1] != INF:
+            pairs.append((row - 1, col - 1))
+    pairs.sort()
+    return pairs
@@ -0,0 +1,189 @@
+from typing import List, Tuple, Optional, Dict, Set
+import heapq
+import time
+from src.models.vehicle import Vehicle
+from src.algorithms.space_time_a_star import SpaceTimeAStarPlanner
+from src.algorithms.search import SearchResult
+
+# 一段待规划的行程：(车辆, 起点, 终点)
+Leg = Tuple[Vehicle, Tuple[int, int], Tuple[int, int]]
+
+
+class _AgentConstraints:
+    """单辆车在约束树节点上累积的约束"""
+
+    __slots__ = ("vertices", "moves")
+
+    def __init__(self, vertices: Optional[Set[Tuple[int, int]]] = None,
+                 moves: Optional[Set[Tuple[int, int, int]]] = None):
+        self.vertices: Set[Tuple[int, int]] = vertices or set()  # (格子, 时刻)
+        self.moves: Set[Tuple[int, int, int]] = moves or set()  # (起点, 终点, 出发时刻)
+
+    def copy(self) -> "_AgentConstraints":
+        return _AgentConstraints(set(self.vertices), set(self.moves))
+
+
+class ConflictBasedSearch:
+    """基于冲突的多车联合规划（CBS）
+
+    一批车辆在同一时刻出发，底层用 SpaceTimeAStarPlanner 的时空 A* 为每辆车
+    单独规划：批外车辆的预约照常避让，批内车辆彼此忽略。高层在约束树上找出
+    最早的冲突，分别给冲突双方加约束后重新规划，直到所有路径互不冲突。
+    约束树节点数或耗时超出预算时退回按顺序逐车规划。
+    """
+
+    def __init__(self, planner: SpaceTimeAStarPlanner, max_nodes: int = 128, time_limit: float = 0.5):
+        self.planner = planner
+        self.max_nodes = max_nodes  # 约束树最多展开的节点数
+        self.time_limit = time_limit  # 单次规划的秒数上限
+        self.expanded_nodes = 0  # 累计展开的约束树节点
+        self.low_level_expansions = 0  # 累计底层搜索扩展的节点
+        self.fallbacks = 0  # 退回逐车规划的次数
+
+    def plan(self, legs: List[Leg]) -> Dict[str, Optional[List[Tuple[int, int]]]]:
+        """为一批行程规划互不冲突的路径，返回 车辆编号 -> 坐标路径，无法到达为 None
+
+        不修改预约表，路径由调用方通过 reserve_paths 提交。
+        """
+        planner = self.planner
+        grid = planner.grid
+        planner.prepare()
+        start_time = planner.current_time
+        results: Dict[str, Optional[List[Tuple[int, int]]]] = {vehicle.id: None for vehicle, _, _ in legs}
+
+        agents = {}
+        for vehicle, start, goal in legs:
+            if not (grid.is_valid_position(*start) and grid.is_valid_position(*goal)):
+                continue
+            start_node, goal_node = grid.node_id(*start), grid.node_id(*goal)
+            successors = planner.graph.successors(vehicle.is_empty())
+            is_passable = planner.passability(vehicle)
+            heuristic = planner.heuristic(goal_node)
+            # 静态地图上不可达的行程直接放弃
+            static_result = planner.search_space.search(start_node, goal_node, successors, is_passable, heuristic)
+            self.low_level_expansions += static_result.expanded
+            if static_result.path is not None:
+                agents[vehicle.id] = (start_node, goal_node, successors, is_passable, heuristic)
+        if not agents:
+            return results
+
+        deadline = time.perf_counter() + self.time_limit
+        paths = self._search(agents, start_time, deadline)
+        if paths is None:
+            self.fallbacks += 1
+            paths = self._prioritized(agents, start_time)
+        for vehicle_id, path in paths.items():
+            results[vehicle_id] = planner.to_positions(path)
+        return results
+
+    def _low_level(self, agents: Dict, vehicle_id: str, start_time: int,
+                   ignore: Set[str], constraints: Optional[_AgentConstraints] = None) -> SearchResult:
+        """带约束的单车时空搜索"""
+        start, goal, successors, is_passable, heuristic = agents[vehicle_id]
+        result = self.planner._search(
+            vehicle_id, start, goal, start_time, successors, is_passable, heuristic,
+            ignore=ignore,
+            blocked_vertices=constraints.vertices if constraints else None,
+            blocked_moves=constraints.moves if constraints else None,
+        )
+        self.low_level_expansions += result.expanded
+        return result
+
+    def _search(self, agents: Dict, start_time: int, deadline: float) -> Optional[Dict[str, List[int]]]:
+        """约束树上的最佳优先搜索，超出预算返回 None"""
+        # 根节点：无约束地规划每辆车；规划失败的车辆留在原地，其余车辆需要避让它
+        ignore = set(agents)
+        paths: Dict[str, List[int]] = {}
+        while True:
+            failed = []
+            for vehicle_id in agents:
+                result = self._low_level(agents, vehicle_id, start_time, ignore)
+                if result.path is None:
+                    failed.append(vehicle_id)
+                else:
+                    paths[vehicle_id] = result.path
+            if not failed:
+                break
+            for vehicle_id in failed:
+                del agents[vehicle_id]
+                ignore.discard(vehicle_id)
+            paths.clear()
+            if not agents:
+                return {}
+
+        constraints = {vehicle_id: _AgentConstraints() for vehicle_id in agents}
+        open_set = [(self._cost(paths), 0, constraints, paths)]
+        counter = 1
+        nodes = 0
+        while open_set:
+            if nodes >= self.max_nodes or time.perf_counter() > deadline:
+                return None
+            _, _, constraints, paths = heapq.heappop(open_set)
+            nodes += 1
+            self.expanded_nodes += 1
+            conflict = self._first_conflict(paths)
+            if conflict is None:
+                return paths
+
+            for vehicle_id, vertex, move in conflict:
+                child = constraints[vehicle_id].copy()
+                if vertex is not None:
+                    child.vertices.add(vertex)
+                else:
+                    child.moves.add(move)
+                result = self._low_level(agents, vehicle_id, start_time, ignore, child)
+                if result.path is None:
+                    continue
+                child_constraints = dict(constraints)
+                child_constraints[vehicle_id] = child
+                child_paths = dict(paths)
+                child_paths[vehicle_id] = result.path
+                heapq.heappush(open_set, (self._cost(child_paths), counter, child_constraints, child_paths))
+                counter += 1
+        return None
+
+    @staticmethod
+    def _cost(paths: Dict[str, List[int]]) -> int:
+        """各车到达终点的时刻之和"""
+        return sum(len(path) - 1 for path in paths.values())
+
+    def _first_conflict(self, paths: Dict[str, List[int]]):
+        """找出最早的冲突，返回冲突双方各自要加的约束 [(车辆, 格子约束, 移动约束)]
+
+        到达终点后的车辆视为一直停在终点。
+        """
+        start_time = self.planner.current_time
+        length = max(len(path) for path in paths.values())
+        previous: Dict[str, int] = {}
+        for offset in range(length):
+            t = start_time + offset
+            occupied: Dict[int, str] = {}
+            moves: Dict[Tuple[int, int], str] = {}
+            for vehicle_id, path in paths.items():
+                node = path[min(offset, len(path) - 1)]
+                other = occupied.get(node)
+                if other is not None:
+                    return [(other, (node, t), None), (vehicle_id, (node, t), None)]
+                occupied[node] = vehicle_id
+                if offset > 0 and previous[vehicle_id] != node:
+                    source = previous[vehicle_id]
+                    other = moves.get((node, source))
+                    if other is not None:
+                        return [(other, None, (node, source, t - 1)), (vehicle_id, None, (source, node, t - 1))]
+                    moves[(source, node)] = vehicle_id
+                previous[vehicle_id] = node
+        return None
+
+    def _prioritized(self, agents: Dict, start_time: int) -> Dict[str, List[int]]:
+        """按顺序逐车规划，后规划的车辆避让已规划的路径和仍停在原地的车辆"""
+        reservations = self.planner.reservations
+        paths: Dict[str, List[int]] = {}
+        for vehicle_id in agents:
+            result = self._low_level(agents, vehicle_id, start_time, {vehicle_id})
+            if result.path is not None:
+                paths[vehicle_id] = result.path
+                reservations.reserve_path(vehicle_id, result.path, start_time)
+        # 撤销临时预约，车辆回到出发前的停靠状态
+        for vehicle_id in paths:
+            reservations.park(vehicle_id, agents[vehicle_id][0], start_time)
+        return paths
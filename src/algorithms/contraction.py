@@ -0,0 +1,270 @@
+from typing import List, Tuple, Optional, Dict, Callable
+import heapq
+from src.models.grid import Grid, CELL_OBSTACLE
+from src.models.graph import GridGraph
+from src.models.vehicle import Vehicle
+from src.models.constraints import ConstraintManager
+from src.algorithms.a_star import AStarPlanner
+from src.algorithms.search import SearchResult, INF
+
+
+class ContractedGraph:
+    """把通道中间的格子串收缩成带权边
+
+    途经格子是只有一条路可走的格子：单向通道中一进一出的格子，或双向通道中
+    只与前后两个格子相连的格子。其余格子（路口、巷道口、尽头）以及入口、出口
+    为决策点。边记录途经的格子，路径可以原样展开。收缩只依赖地图结构，货物和
+    车辆占用在搜索时按格子检查，所以只有结构变化时才需要重建。
+    """
+
+    def __init__(self, graph: GridGraph):
+        self.graph = graph
+        self.structure_version = -1
+        self.edges: List[Tuple[int, int, List[int]]] = []  # (起点, 终点, 途经格子)
+        self.out_edges: Dict[int, List[int]] = {}  # 决策点 -> 出边编号
+        self.in_edges: Dict[int, List[int]] = {}  # 决策点 -> 入边编号
+        self.through: List[bool] = []  # 节点是否为途经格子
+        self.cell_edges: Dict[int, List[Tuple[int, int]]] = {}  # 途经格子 -> [(边编号, 在边上的序号)]
+
+    def ensure_current(self) -> None:
+        """地图结构变化时重建"""
+        self.graph.ensure_current()
+        if self.structure_version != self.graph.structure_version:
+            self.rebuild()
+
+    def rebuild(self) -> None:
+        grid = self.graph.grid
+        successors = self.graph.successors(True)
+        predecessors = self.graph.predecessors(True)
+        terminals = {grid.node_id(x, y) for x, y in grid.entrances + grid.exits}
+        cell_types = grid.cell_types.tolist()
+
+        def is_through(node: int) -> bool:
+            if node in terminals or cell_types[node] == CELL_OBSTACLE:
+                return False
+            out, into = successors[node], predecessors[node]
+            if len(out) == 1 and len(into) == 1:
+                return out[0] != into[0]  # 进出是同一个格子时为尽头
+            return len(out) == 2 and sorted(out) == sorted(into)
+
+        self.through = [is_through(node) for node in range(grid.num_nodes)]
+        self.edges = []
+        self.out_edges = {}
+        self.in_edges = {}
+        self.cell_edges = {}
+        for node in range(grid.num_nodes):
+            if self.through[node] or cell_types[node] == CELL_OBSTACLE:
+                continue
+            for first in successors[node]:
+                cells, end = self.follow(node, first)
+                if end is None:
+                    continue  # 不经过决策点的环
+                edge_index = len(self.edges)
+                self.out_edges.setdefault(node, []).append(edge_index)
+                self.in_edges.setdefault(end, []).append(edge_index)
+                self.edges.append((node, end, cells))
+                for offset, cell in enumerate(cells):
+                    self.cell_edges.setdefault(cell, []).append((edge_index, offset))
+        self.structure_version = self.graph.structure_version
+
+    def follow(self, previous: int, current: int) -> Tuple[List[int], Optional[int]]:
+        """从 previous 进入 current 后沿通道走到决策点，返回 (途经格子, 决策点)"""
+        successors = self.graph.successors(True)
+        cells = []
+        limit = len(self.through)
+        while self.through[current]:
+            cells.append(current)
+            if len(cells) > limit:
+                return cells, None
+            following = [node for node in successors[current] if node != previous]
+            if len(following) != 1:
+                return cells, None
+            previous, current = current, following[0]
+        return cells, current
+
+    @property
+    def num_decision_nodes(self) -> int:
+        cell_types = self.graph.grid.cell_types
+        return sum(1 for node, is_through in enumerate(self.through)
+                   if not is_through and cell_types[node] != CELL_OBSTACLE)
+
+
+class CorridorPlanner(AStarPlanner):
+    """在收缩图上搜索的 A*，长通道一次跨过，结果展开为逐格路径"""
+
+    def __init__(self, grid: Grid, constraint_manager: ConstraintManager):
+        super().__init__(grid, constraint_manager)
+        self.contracted = ContractedGraph(self.graph)
+        self._loaded_mask: List[bool] = []  # 满车按货物可通行的格子
+        self._loaded_version = None
+        self._static_open: Dict[bool, List[bool]] = {}  # 载货状态 -> 各边途经格子与终点是否都满足静态约束
+        self._static_version = None
+        self._cargo_changed = set()  # 上次检查以来货物变化的格子
+        grid.add_cargo_listener(self._on_cargo_changed)
+
+    def prepare(self) -> None:
+        super().prepare()
+        self.contracted.ensure_current()
+
+    def _cell_passability(self, vehicle: Vehicle) -> Callable[[int], bool]:
+        """收缩图基于空车结构，满车的货物限制在这里补上"""
+        base = self.passability(vehicle)
+        if vehicle.is_empty():
+            return base
+        grid = self.grid
+        if self._loaded_version != grid.version:
+            self._loaded_mask = grid.passable_mask(False).tolist()
+            self._loaded_version = grid.version
+        loaded_mask = self._loaded_mask
+        return lambda node: loaded_mask[node] and base(node)
+
+    def _on_cargo_changed(self, node: int) -> None:
+        self._cargo_changed.add(node)
+
+    def _static_edge_check(self, is_empty: bool) -> Callable[[int], bool]:
+        """按静态约束掩码和货物检查一条边的途经格子和终点"""
+        mask = self.constraint_manager.passable_mask(self.grid, is_empty)
+        cargo_mask = self.grid.passable_mask(is_empty).tolist()
+        edges = self.contracted.edges
+
+        def edge_check(edge_index: int) -> bool:
+            _, end, cells = edges[edge_index]
+            return mask[end] and cargo_mask[end] and all(mask[cell] and cargo_mask[cell] for cell in cells)
+
+        return edge_check
+
+    def _edge_filter(self, vehicle: Vehicle) -> Optional[Callable[[int], bool]]:
+        """整条边能否通过的检查
+
+        静态部分按地图和约束版本缓存，车辆占用按被占格子所在的边排除。存在车辆
+        冲突以外的动态约束时返回 None，由调用方逐格检查。
+        """
+        constraint_manager = self.constraint_manager
+        if constraint_manager.dynamic_constraints(include_vehicle_conflict=False):
+            return None
+        grid = self.grid
+        contracted = self.contracted
+        is_empty = vehicle.is_empty()
+        version = (grid.structure_version, constraint_manager.version, contracted.structure_version)
+        if self._static_version != version:
+            self._static_open = {}
+            self._static_version = version
+            self._cargo_changed.clear()
+        if self._cargo_changed:
+            # 货物变化只影响经过或到达这些格子的边
+            changed_edges = set()
+            for node in self._cargo_changed:
+                changed_edges.update(edge_index for edge_index, _ in contracted.cell_edges.get(node, ()))
+                changed_edges.update(contracted.in_edges.get(node, ()))
+            self._cargo_changed.clear()
+            for cached_empty, static_open in self._static_open.items():
+                edge_check = self._static_edge_check(cached_empty)
+                for edge_index in changed_edges:
+                    static_open[edge_index] = edge_check(edge_index)
+        static_open = self._static_open.get(is_empty)
+        if static_open is None:
+            edge_check = self._static_edge_check(is_empty)
+            static_open = self._static_open[is_empty] = [edge_check(edge_index)
+                                                         for edge_index in range(len(contracted.edges))]
+        blocked = set()
+        cell_edges = contracted.cell_edges
+        in_edges = contracted.in_edges
+        for x, y in constraint_manager.vehicle_conflict_constraint.occupied_positions:
+            if not grid.is_valid_position(x, y):
+                continue
+            node = grid.node_id(x, y)
+            blocked.update(edge_index for edge_index, _ in cell_edges.get(node, ()))
+            blocked.update(in_edges.get(node, ()))
+        return lambda edge_index: static_open[edge_index] and edge_index not in blocked
+
+    def _origins(self, start: int, goal: int, is_passable: Callable[[int], bool]) -> Dict[int, List[int]]:
+        """搜索的出发点及从起点走到该点的格子；起点在通道中间时沿各方向走到决策点或终点"""
+        contracted = self.contracted
+        if not contracted.through[start]:
+            return {start: [start]}
+        origins: Dict[int, List[int]] = {}
+        for first in self.graph.successors(True)[start]:
+            cells, end = contracted.follow(start, first)
+            prefix = [start]
+            for cell in cells + ([end] if end is not None else []):
+                if not is_passable(cell):
+                    break
+                prefix.append(cell)
+                if cell == goal:
+                    break
+            else:
+                if end is None:
+                    continue
+            last = prefix[-1]
+            if last != start and (last == goal or last == end):
+                if last not in origins or len(prefix) < len(origins[last]):
+                    origins[last] = prefix
+        return origins
+
+    def plan(self, vehicle: Vehicle, start: int, goal: int) -> SearchResult:
+        """收缩图上的 A*"""
+        if start == goal:
+            return SearchResult([start], 0, 0)
+        contracted = self.contracted
+        is_passable = self._cell_passability(vehicle)
+        heuristic = self.heuristic(goal)
+
+        origins = self._origins(start, goal, is_passable)
+        goal_offsets = dict(contracted.cell_edges.get(goal, []))
+        edge_open = self._edge_filter(vehicle)
+        g = {node: len(prefix) - 1 for node, prefix in origins.items()}
+        parent: Dict[int, Tuple[int, int, int]] = {}  # 节点 -> (上一个决策点, 边编号, 使用的途经格子数)
+        closed = set()
+        open_set = []
+        counter = 0
+        for node, cost in g.items():
+            heapq.heappush(open_set, (cost + heuristic(node), counter, node))
+            counter += 1
+        expanded = 0
+        open_peak = 0
+        while open_set:
+            _, _, node = heapq.heappop(open_set)
+            if node in closed:
+                continue
+            if node == goal:
+                return SearchResult(self._expand(node, parent, origins), g[goal], expanded, open_peak)
+            closed.add(node)
+            expanded += 1
+            if len(open_set) >= open_peak:
+                open_peak = len(open_set) + 1
+            for edge_index in contracted.out_edges.get(node, []):
+                _, end, cells = contracted.edges[edge_index]
+                offset = goal_offsets.get(edge_index)
+                if offset is not None:
+                    # 终点在这条边的通道中间
+                    if not all(map(is_passable, cells[:offset + 1])):
+                        continue
+                    target, used = goal, offset + 1
+                elif edge_open(edge_index) if edge_open else all(map(is_passable, cells)) and is_passable(end):
+                    target, used = end, len(cells)
+                else:
+                    continue
+                cost = g[node] + used + (target == end)
+                if target in closed or cost >= g.get(target, INF):
+                    continue
+                h = heuristic(target)
+                if h == INF:
+                    continue
+                g[target] = cost
+                parent[target] = (node, edge_index, used)
+                heapq.heappush(open_set, (cost + h, counter, target))
+                counter += 1
+        return SearchResult(None, INF, expanded, open_peak)
+
+    def _expand(self, node: int, parent: Dict[int, Tuple[int, int, int]], origins: Dict[int, List[int]]) -> List[int]:
+        """把决策点序列展开成逐格路径"""
+        segments = []
+        while node in parent:
+            previous, edge_index, used = parent[node]
+            cells = self.contracted.edges[edge_index][2][:used]
+            segments.append(cells if cells and cells[-1] == node else cells + [node])
+            node = previous
+        path = list(origins[node])
+        for cells in reversed(segments):
+            path.extend(cells)
+        return path
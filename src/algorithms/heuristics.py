@@ -0,0 +1,78 @@
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Set
+from src.models.graph import GridGraph
+from src.algorithms.search import INF
+
+
+class DistanceFieldCache:
+    """目标格子的精确距离场缓存
+
+    距离场在反向的空车有向图上做 BFS 得到，只反映障碍和单向通行方向。
+    满车和车辆占用只会删边，所以它对所有车辆都是一致且可采纳的启发值。
+    入口、出口总是建表；其他目标被请求 hot_threshold 次后才建表。
+    缓存按 LRU 淘汰，地图结构变化时整体清空。
+    """
+
+    def __init__(self, graph: GridGraph, capacity: int = 64, hot_threshold: int = 3):
+        self.graph = graph
+        self.capacity = capacity
+        self.hot_threshold = hot_threshold
+        self.fields: "OrderedDict[int, List[float]]" = OrderedDict()
+        self.request_counts: Dict[int, int] = {}
+        self.terminals: Set[int] = set()
+        self.structure_version = -1
+        self.hits = 0
+        self.misses = 0
+
+    def _sync(self) -> None:
+        """地图结构变化时清空缓存并刷新入口出口集合"""
+        self.graph.ensure_current()
+        if self.structure_version == self.graph.structure_version:
+            return
+        grid = self.graph.grid
+        self.fields.clear()
+        self.request_counts.clear()
+        self.terminals = {grid.node_id(x, y) for x, y in grid.entrances + grid.exits}
+        self.structure_version = self.graph.structure_version
+
+    def build_field(self, goal: int) -> List[float]:
+        """反向 BFS 计算所有节点到 goal 的最短步数"""
+        predecessors = self.graph.predecessors(True)
+        distances = [INF] * len(predecessors)
+        distances[goal] = 0
+        queue = deque([goal])
+        while queue:
+            node = queue.popleft()
+            next_distance = distances[node] + 1
+            for predecessor in predecessors[node]:
+                if distances[predecessor] == INF:
+                    distances[predecessor] = next_distance
+                    queue.append(predecessor)
+        return distances
+
+    def get(self, goal: int) -> Optional[List[float]]:
+        """获取目标的距离场，不满足建表条件时返回 None"""
+        self._sync()
+        field = self.fields.get(goal)
+        if field is not None:
+            self.fields.move_to_end(goal)
+            self.hits += 1
+            return field
+
+        self.misses += 1
+        count = self.request_counts.get(goal, 0) + 1
+        self.request_counts[goal] = count
+        if goal not in self.terminals and count < self.hot_threshold:
+            return None
+
+        field = self.build_field(goal)
+        self.fields[goal] = field
+        if len(self.fields) > self.capacity:
+            self.fields.popitem(last=False)
+        return field
+
+    def clear(self) -> None:
+        """清空缓存"""
+        self.fields.clear()
+        self.request_counts.clear()
+        self.structure_version = -1
@@ -0,0 +1,351 @@
+from collections import deque
+from typing import List, Tuple, Optional, Dict, Callable, Set
+import heapq
+from src.models.grid import Grid
+from src.models.vehicle import Vehicle
+from src.models.constraints import ConstraintManager
+from src.algorithms.a_star import AStarPlanner
+from src.algorithms.search import SearchResult, INF
+
+
+class HierarchicalPlanner(AStarPlanner):
+    """分层 A*（HPA*）
+
+    地图按 cluster_size 划分成方形簇，跨越簇边界的边两端作为出入口。簇内预先
+    算好各出入口之间的最短步数（遵守单向通行），查询时先在出入口组成的抽象图
+    上搜索，再只在选中的簇内细化出实际路径。
+
+    抽象图反映静态约束（障碍、方向、货物）和车辆占用，货物或占用变化时只重建
+    所在簇的簇内代价。其他动态约束在细化时检查，细化失败时退回整图 A*。
+    """
+
+    def __init__(self, grid: Grid, constraint_manager: ConstraintManager, cluster_size: int = 10,
+                 long_entrance: int = 6):
+        super().__init__(grid, constraint_manager)
+        self.cluster_size = cluster_size
+        self.long_entrance = long_entrance  # 连续跨界边达到这个数量时取两端两条
+        self.layout_version = None
+        self.clusters_x = self.clusters_y = 0
+        # 载货状态 -> 选中的跨界边 (簇内出口, 相邻簇入口)
+        self.transitions: Dict[bool, List[Tuple[int, int]]] = {True: [], False: []}
+        self.entrances: Dict[bool, Dict[int, List[int]]] = {True: {}, False: {}}  # 载货状态 -> 簇编号 -> 簇内的抽象节点
+        self.inter_edges: Dict[bool, Dict[int, List[int]]] = {True: {}, False: {}}  # 载货状态 -> 抽象节点 -> 跨界边的终点
+        # 载货状态 -> 簇编号 -> 抽象节点 -> [(同簇抽象节点, 步数)]
+        self.intra_edges: Dict[bool, Dict[int, Dict[int, List[Tuple[int, int]]]]] = {True: {}, False: {}}
+        self.dirty_clusters: Set[int] = set()
+        self.occupied: Set[int] = set()  # 被车辆占用的节点
+        self.abstract_expanded = 0  # 累计抽象图扩展节点数
+        self.cluster_rebuilds = 0  # 累计重建的簇数
+        self.fallbacks = 0  # 退回整图搜索的次数
+        grid.add_cargo_listener(self._on_cargo_changed)
+        constraint_manager.vehicle_conflict_constraint.add_occupancy_listener(self._on_occupancy_changed)
+
+    def cluster_of(self, node: int) -> int:
+        """节点所在簇的编号"""
+        y, x = divmod(node, self.grid.width)
+        return (y // self.cluster_size) * self.clusters_x + x // self.cluster_size
+
+    def _on_cargo_changed(self, node: int) -> None:
+        if self.layout_version is not None:
+            self.dirty_clusters.add(self.cluster_of(node))
+
+    def _on_occupancy_changed(self, position: Tuple[int, int]) -> None:
+        if self.layout_version is None or not self.grid.is_valid_position(*position):
+            return
+        node = self.grid.node_id(*position)
+        if position in self.constraint_manager.vehicle_conflict_constraint.occupied_positions:
+            self.occupied.add(node)
+        else:
+            self.occupied.discard(node)
+        self.dirty_clusters.add(self.cluster_of(node))
+
+    def _sync(self) -> None:
+        """地图结构或约束集合变化时整体重建，否则只重建货物或占用变化过的簇"""
+        version = (self.grid.structure_version, self.constraint_manager.version)
+        if version != self.layout_version:
+            self._build_layout()
+            self.layout_version = version
+            self.dirty_clusters = set(range(self.clusters_x * self.clusters_y))
+        for cluster in sorted(self.dirty_clusters):
+            self._build_cluster(cluster)
+        self.dirty_clusters.clear()
+
+    def _build_layout(self) -> None:
+        """划分簇并选取出入口"""
+        grid = self.grid
+        size = self.cluster_size
+        self.clusters_x = (grid.width + size - 1) // size
+        self.clusters_y = (grid.height + size - 1) // size
+        successors = self.graph.successors(True)
+
+        # 空车：同一对簇之间、沿边界连续的同向跨界边合成一个出入口，只取其中
+        # 一到两条作为抽象图的跨界边；单向通道下相邻的跨界边在簇内未必互通，
+        # 两端在各自簇内不属于同一个强连通分量时不合并。
+        # 满车：簇内连通性随货物变化，合并后可能绕远甚至断开，每条跨界边都保留
+        component = self._cluster_components()
+        borders: Dict[Tuple[int, int], List[Tuple[int, int, int]]] = {}
+        for u in range(grid.num_nodes):
+            cluster_u = self.cluster_of(u)
+            for v in successors[u]:
+                cluster_v = self.cluster_of(v)
+                if cluster_v != cluster_u:
+                    y, x = divmod(u, grid.width)
+                    # 沿边界的坐标：上下穿越时是 x，左右穿越时是 y
+                    along = x if abs(v - u) == grid.width else y
+                    borders.setdefault((cluster_u, cluster_v), []).append((along, u, v))
+        merged = []
+        for edges in borders.values():
+            edges.sort()
+            run = [edges[0]]
+            for edge in edges[1:]:
+                _, last_u, last_v = run[-1]
+                if (edge[0] != run[-1][0] + 1 or component[edge[1]] != component[last_u]
+                        or component[edge[2]] != component[last_v]):
+                    merged.extend(self._representatives(run))
+                    run = []
+                run.append(edge)
+            merged.extend(self._representatives(run))
+        self.transitions = {
+            True: merged,
+            False: [(u, v) for edges in borders.values() for _, u, v in edges],
+        }
+
+        self.entrances = {True: {}, False: {}}
+        self.inter_edges = {True: {}, False: {}}
+        for is_empty, transitions in self.transitions.items():
+            entrances, inter_edges = self.entrances[is_empty], self.inter_edges[is_empty]
+            for u, v in transitions:
+                inter_edges.setdefault(u, []).append(v)
+                for node in (u, v):
+                    nodes = entrances.setdefault(self.cluster_of(node), [])
+                    if node not in nodes:
+                        nodes.append(node)
+        self.intra_edges = {True: {}, False: {}}
+        self.occupied = {grid.node_id(x, y)
+                         for x, y in self.constraint_manager.vehicle_conflict_constraint.occupied_positions
+                         if grid.is_valid_position(x, y)}
+
+    def _cluster_components(self) -> List[int]:
+        """只用簇内的边求强连通分量（Tarjan，迭代实现），返回各节点的分量编号"""
+        successors = self.graph.successors(True)
+        num_nodes = self.grid.num_nodes
+        index = [-1] * num_nodes
+        lowlink = [0] * num_nodes
+        component = [-1] * num_nodes
+        on_stack = [False] * num_nodes
+        stack: List[int] = []
+        counter = 0
+        components = 0
+        for root in range(num_nodes):
+            if index[root] != -1:
+                continue
+            cluster = self.cluster_of(root)
+            index[root] = lowlink[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = True
+            work = [(root, iter(successors[root]))]
+            while work:
+                node, neighbors = work[-1]
+                advanced = False
+                for neighbor in neighbors:
+                    if self.cluster_of(neighbor) != cluster:
+                        continue
+                    if index[neighbor] == -1:
+                        index[neighbor] = lowlink[neighbor] = counter
+                        counter += 1
+                        stack.append(neighbor)
+                        on_stack[neighbor] = True
+                        work.append((neighbor, iter(successors[neighbor])))
+                        advanced = True
+                        break
+                    if on_stack[neighbor]:
+                        lowlink[node] = min(lowlink[node], index[neighbor])
+                if advanced:
+                    continue
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = False
+                        component[member] = components
+                        if member == node:
+                            break
+                    components += 1
+        return component
+
+    def _representatives(self, run: List[Tuple[int, int, int]]) -> List[Tuple[int, int]]:
+        """一段连续跨界边选出的跨界边：较短时取中间一条，较长时取两端"""
+        if len(run) < self.long_entrance:
+            _, u, v = run[len(run) // 2]
+            return [(u, v)]
+        return [(u, v) for _, u, v in (run[0], run[-1])]
+
+    def _in_cluster(self, cluster: int) -> Callable[[int], bool]:
+        width, size = self.grid.width, self.cluster_size
+        cluster_y, cluster_x = divmod(cluster, self.clusters_x)
+        x0, y0 = cluster_x * size, cluster_y * size
+
+        def inside(node: int) -> bool:
+            y, x = divmod(node, width)
+            return x0 <= x < x0 + size and y0 <= y < y0 + size
+
+        return inside
+
+    def _abstract_passability(self, is_empty: bool) -> Callable[[int], bool]:
+        """抽象图使用的通行检查：静态约束掩码且未被车辆占用"""
+        mask = self.constraint_manager.passable_mask(self.grid, is_empty)
+        occupied = self.occupied
+        return lambda node: mask[node] and node not in occupied
+
+    def _cluster_distances(self, source: int, cluster: int, is_empty: bool, reverse: bool = False) -> Dict[int, int]:
+        """簇内 BFS，返回 source 到簇内各节点（reverse 时为各节点到 source）的步数
+
+        与整图搜索一致：进入的每个格子都要可通行，出发格子本身不检查。
+        """
+        neighbors = self.graph.predecessors(is_empty) if reverse else self.graph.successors(is_empty)
+        passable = self._abstract_passability(is_empty)
+        inside = self._in_cluster(cluster)
+        distances = {source: 0}
+        if reverse and not passable(source):
+            return distances
+        queue = deque([source])
+        while queue:
+            node = queue.popleft()
+            next_distance = distances[node] + 1
+            for neighbor in neighbors[node]:
+                if neighbor in distances or not inside(neighbor):
+                    continue
+                if reverse:
+                    # 反向扩展时，被进入的是 node；neighbor 只有可通行时才能继续作为被进入的格子
+                    distances[neighbor] = next_distance
+                    if passable(neighbor):
+                        queue.append(neighbor)
+                elif passable(neighbor):
+                    distances[neighbor] = next_distance
+                    queue.append(neighbor)
+        return distances
+
+    def _build_cluster(self, cluster: int) -> None:
+        """重算簇内出入口之间的步数"""
+        for is_empty in (True, False):
+            nodes = self.entrances[is_empty].get(cluster, [])
+            edges = {}
+            for node in nodes:
+                distances = self._cluster_distances(node, cluster, is_empty)
+                edges[node] = [(other, distances[other]) for other in nodes if other != node and other in distances]
+            self.intra_edges[is_empty][cluster] = edges
+        self.cluster_rebuilds += 1
+
+    def _abstract_search(self, start: int, goal: int, is_empty: bool) -> Optional[List[int]]:
+        """在抽象图上搜索，起点和终点临时接入所在簇的出入口"""
+        passable = self._abstract_passability(is_empty)
+        start_cluster, goal_cluster = self.cluster_of(start), self.cluster_of(goal)
+        start_distances = self._cluster_distances(start, start_cluster, is_empty)
+        goal_distances = self._cluster_distances(goal, goal_cluster, is_empty, reverse=True)
+        entrances = self.entrances[is_empty]
+        start_edges = [(node, start_distances[node]) for node in entrances.get(start_cluster, [])
+                       if node in start_distances and node != start]
+        if start_cluster == goal_cluster and goal in start_distances:
+            start_edges.append((goal, start_distances[goal]))
+        to_goal = {node: goal_distances[node] for node in entrances.get(goal_cluster, [])
+                   if node in goal_distances and node != goal}
+        intra = self.intra_edges[is_empty]
+        inter_edges = self.inter_edges[is_empty]
+        successors = self.graph.successors(is_empty)
+        # 整图距离场的代价与地图大小成正比，抽象图上只用曼哈顿距离
+        heuristic = self.manhattan_heuristic(goal)
+
+        g = {start: 0}
+        parent: Dict[int, int] = {}
+        closed = set()
+        open_set = [(heuristic(start), 0, start)]
+        counter = 1
+        while open_set:
+            _, _, node = heapq.heappop(open_set)
+            if node in closed:
+                continue
+            if node == goal:
+                path = [node]
+                while node in parent:
+                    node = parent[node]
+                    path.append(node)
+                path.reverse()
+                return path
+            closed.add(node)
+            self.abstract_expanded += 1
+
+            if node == start:
+                edges = list(start_edges)
+            else:
+                edges = list(intra.get(self.cluster_of(node), {}).get(node, []))
+                if node in to_goal:
+                    edges.append((goal, to_goal[node]))
+            edges += [(v, 1) for v in inter_edges.get(node, []) if v in successors[node] and passable(v)]
+            for neighbor, cost in edges:
+                if neighbor in closed:
+                    continue
+                tentative = g[node] + cost
+                if tentative >= g.get(neighbor, INF):
+                    continue
+                h = heuristic(neighbor)
+                if h == INF:
+                    continue
+                g[neighbor] = tentative
+                parent[neighbor] = node
+                heapq.heappush(open_set, (tentative + h, counter, neighbor))
+                counter += 1
+        return None
+
+    def _refine(self, vehicle: Vehicle, abstract_path: List[int]) -> Tuple[Optional[List[int]], int, int]:
+        """逐段细化抽象路径，簇内段在该簇内搜索，车辆占用在此时检查
+
+        返回 (路径, 扩展节点数, 各段开放表长度的最大值)
+        """
+        successors = self.graph.successors(vehicle.is_empty())
+        is_passable = self.passability(vehicle)
+        path = [abstract_path[0]]
+        expanded = 0
+        open_peak = 0
+        for source, target in zip(abstract_path, abstract_path[1:]):
+            if self.cluster_of(source) != self.cluster_of(target):
+                # 跨界边
+                if target not in successors[source] or not is_passable(target):
+                    return None, expanded, open_peak
+                path.append(target)
+                continue
+            inside = self._in_cluster(self.cluster_of(source))
+            result = self.search_space.search(
+                source,
+                target,
+                successors,
+                lambda node: inside(node) and is_passable(node),
+                self.manhattan_heuristic(target),
+            )
+            expanded += result.expanded
+            open_peak = max(open_peak, result.open_peak)
+            if result.path is None:
+                return None, expanded, open_peak
+            path.extend(result.path[1:])
+        return path, expanded, open_peak
+
+    def plan(self, vehicle: Vehicle, start: int, goal: int) -> SearchResult:
+        """先搜抽象图再细化，细化失败时退回整图 A*"""
+        if start == goal:
+            return SearchResult([start], 0, 0)
+        self._sync()
+        is_empty = vehicle.is_empty()
+        abstract_path = self._abstract_search(start, goal, is_empty)
+        exact = not is_empty and not self.constraint_manager.dynamic_constraints(include_vehicle_conflict=False)
+        if abstract_path is None and exact:
+            # 满车的抽象图保留了全部跨界边并包含全部约束，抽象图上不可达即整图不可达
+            return SearchResult(None)
+        if abstract_path is not None:
+            path, expanded, open_peak = self._refine(vehicle, abstract_path)
+            if path is not None:
+                return SearchResult(path, len(path) - 1, expanded, open_peak)
+        self.fallbacks += 1
+        return super().plan(vehicle, start, goal)
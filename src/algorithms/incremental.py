@@ -0,0 +1,301 @@
+from collections import OrderedDict, deque
+from typing import List, Tuple, Optional, Dict, Set, Callable
+import heapq
+from src.models.vehicle import Vehicle
+from src.algorithms.a_star import AStarPlanner
+from src.algorithms.search import SearchResult, INF
+
+
+class DStarLiteState:
+    """一个 (车辆, 目标, 载货状态) 的 D* Lite 搜索状态
+
+    从目标反向维护到目标的 g / rhs，代价为单位步长，进入不可通行格子的边代价
+    为无穷，所以某个格子通行性变化时只需重算它的前驱的 rhs，再继续 compute
+    修补受影响的部分。启发函数是空车图上从起点出发的精确距离场，从起点到
+    不了的格子不进队列。起点可以移动：新旧起点的距离累加到 km，队列中已有
+    的键不必重算；新起点能到的格子旧起点也能到，不会漏掉格子。
+    """
+
+    def __init__(self, start: int, goal: int, successors: List[List[int]], predecessors: List[List[int]],
+                 start_field: List[float]):
+        self.start = start
+        self.goal = goal
+        self.successors = successors
+        self.predecessors = predecessors
+        self.start_field = start_field  # 从当前起点出发的距离
+        self.km = 0  # 起点移动累计的启发值偏移
+        self.g: Dict[int, float] = {}
+        self.rhs: Dict[int, float] = {goal: 0}
+        self.queue: List[Tuple[float, float, int]] = []
+        self.queued: Dict[int, Tuple[float, float]] = {}  # 节点当前有效的优先级，用于惰性删除
+        self.changed: Set[int] = set()  # 自上次规划以来通行性变化的格子
+        self.is_passable: Callable[[int], bool] = lambda node: True
+        self.passable: Dict[int, bool] = {}  # is_passable 的结果缓存，变化的格子会被剔除
+        self.result: Optional[SearchResult] = None  # 当前起点上次规划的结果
+        self._push(goal, self._key(goal))
+
+    def _key(self, node: int) -> Tuple[float, float]:
+        g, rhs = self.g.get(node, INF), self.rhs.get(node, INF)
+        value = g if g < rhs else rhs
+        return (value + self.start_field[node] + self.km, value)
+
+    def _push(self, node: int, key: Tuple[float, float]) -> None:
+        self.queued[node] = key
+        heapq.heappush(self.queue, (key[0], key[1], node))
+
+    def _top(self) -> Optional[Tuple[float, float, int]]:
+        """跳过过期条目后的队首"""
+        queue = self.queue
+        while queue:
+            k1, k2, node = queue[0]
+            if self.queued.get(node) == (k1, k2):
+                return queue[0]
+            heapq.heappop(queue)
+        return None
+
+    def _enterable(self, node: int) -> bool:
+        ok = self.passable.get(node)
+        if ok is None:
+            ok = self.passable[node] = self.is_passable(node)
+        return ok
+
+    def _update_vertex(self, node: int) -> None:
+        g = self.g
+        if node != self.goal:
+            best = INF
+            passable = self.passable
+            for successor in self.successors[node]:
+                value = g.get(successor, INF)
+                if value < best:
+                    ok = passable.get(successor)
+                    if ok is None:
+                        ok = passable[successor] = self.is_passable(successor)
+                    if ok:
+                        best = value
+            self.rhs[node] = best + 1
+        self.queued.pop(node, None)
+        if g.get(node, INF) != self.rhs.get(node, INF):
+            key = self._key(node)
+            if key[0] != INF:
+                self._push(node, key)
+
+    def move_start(self, start: int, start_field: List[float]) -> bool:
+        """起点移动到 start；旧起点到不了新起点时返回 False，状态需要重建"""
+        if start == self.start:
+            return True
+        step = self.start_field[start]
+        if step == INF:
+            return False
+        self.km += step
+        self.start = start
+        self.start_field = start_field
+        self.result = None
+        return True
+
+    def apply_changes(self) -> int:
+        """按变化的格子修补其前驱的 rhs，返回变化的格子数"""
+        changed = self.changed
+        self.changed = set()
+        for node in changed:
+            self.passable.pop(node, None)
+        for node in changed:
+            for predecessor in self.predecessors[node]:
+                self._update_vertex(predecessor)
+        return len(changed)
+
+    def compute(self, max_expansions: int) -> Tuple[int, bool]:
+        """推进到起点一致，返回 (扩展的节点数, 是否完成)；未完成的状态下次可继续推进"""
+        g, rhs = self.g, self.rhs
+        start = self.start
+        expanded = 0
+        while expanded < max_expansions:
+            top = self._top()
+            if top is None:
+                return expanded, True
+            old_key = (top[0], top[1])
+            if old_key >= self._key(start) and rhs.get(start, INF) == g.get(start, INF):
+                return expanded, True
+            node = top[2]
+            new_key = self._key(node)
+            if old_key < new_key:
+                # 起点移动后键偏小，按新键重新排队
+                heapq.heappop(self.queue)
+                self._push(node, new_key)
+                continue
+            heapq.heappop(self.queue)
+            del self.queued[node]
+            expanded += 1
+            if g.get(node, INF) > rhs.get(node, INF):
+                g[node] = rhs[node]
+            else:
+                g[node] = INF
+                self._update_vertex(node)
+            if self._enterable(node):
+                for predecessor in self.predecessors[node]:
+                    self._update_vertex(predecessor)
+        return expanded, False
+
+    def extract_path(self) -> Optional[List[int]]:
+        """从起点沿 g 值递减的后继走到目标"""
+        g = self.g
+        node = self.start
+        if g.get(node, INF) == INF:
+            return None
+        path = [node]
+        while node != self.goal:
+            target = g[node] - 1
+            for successor in self.successors[node]:
+                if g.get(successor, INF) == target and self._enterable(successor):
+                    node = successor
+                    break
+            else:
+                return None
+            path.append(node)
+        return path
+
+
+class IncrementalPlanner:
+    """为反复规划到同一目标的车辆保留 D* Lite 搜索状态
+
+    状态按 (车辆, 目标, 载货状态) 保存，车辆换了起点也能复用：在任务起点
+    等待的车辆每次重试、或再次前往同一出口时只修补变化的部分。
+    货物变化由 Grid 的货物监听通知，车辆占用变化由 VehicleConflictConstraint
+    的占用监听通知，变化的格子记入各状态，下次规划时只修补受影响的部分。
+    结果与规划器共用路径缓存，没有格子变化时直接返回上次的结果。
+    地图结构或约束集合变化时丢弃全部状态。时空规划器或存在车辆冲突以外的
+    动态约束时无法跟踪变化，退回普通 find_path。
+    """
+
+    def __init__(self, planner: AStarPlanner, capacity: int = 64, max_expansions: int = 50000):
+        self.planner = planner
+        self.capacity = capacity
+        self.max_expansions = max_expansions
+        self.states: "OrderedDict[Tuple[str, int, bool], DStarLiteState]" = OrderedDict()
+        self.start_fields: "OrderedDict[int, List[float]]" = OrderedDict()  # 起点 -> 出发的距离场
+        self.state_version = None
+        self.repairs = 0  # 复用已有状态的次数
+        self.rebuilds = 0  # 新建状态的次数
+        self.expanded = 0  # 累计扩展节点数
+        planner.grid.add_cargo_listener(self._on_cargo_changed)
+        planner.constraint_manager.vehicle_conflict_constraint.add_occupancy_listener(self._on_occupancy_changed)
+
+    def _on_cargo_changed(self, node: int) -> None:
+        for state in self.states.values():
+            state.changed.add(node)
+
+    def _on_occupancy_changed(self, position: Tuple[int, int]) -> None:
+        grid = self.planner.grid
+        if not grid.is_valid_position(*position):
+            return
+        node = grid.node_id(*position)
+        for state in self.states.values():
+            state.changed.add(node)
+
+    def supported(self) -> bool:
+        """当前规划器和约束能否增量跟踪"""
+        if self.planner.time_dependent:
+            return False
+        return not self.planner.constraint_manager.dynamic_constraints(include_vehicle_conflict=False)
+
+    def passability(self, vehicle: Vehicle) -> Callable[[int], bool]:
+        """规划器的通行检查，再加上载货状态下的货物限制（满车邻接表已隐含的部分）"""
+        grid = self.planner.grid
+        is_empty = vehicle.is_empty()
+        base = self.planner.passability(vehicle)
+        return lambda node: base(node) and grid.can_pass_node(node, is_empty)
+
+    def _sync(self) -> None:
+        """地图结构或约束集合变化时清空状态"""
+        planner = self.planner
+        version = (planner.grid.structure_version, planner.constraint_manager.version)
+        if version != self.state_version:
+            self.states.clear()
+            self.start_fields.clear()
+            self.state_version = version
+
+    def start_field(self, start: int) -> List[float]:
+        """空车图上从 start 出发到各格子的最短步数，按 LRU 缓存"""
+        field = self.start_fields.get(start)
+        if field is not None:
+            self.start_fields.move_to_end(start)
+            return field
+        successors = self.planner.graph.successors(True)
+        field = [INF] * len(successors)
+        field[start] = 0
+        queue = deque([start])
+        while queue:
+            node = queue.popleft()
+            next_distance = field[node] + 1
+            for successor in successors[node]:
+                if field[successor] == INF:
+                    field[successor] = next_distance
+                    queue.append(successor)
+        self.start_fields[start] = field
+        if len(self.start_fields) > self.capacity:
+            self.start_fields.popitem(last=False)
+        return field
+
+    def search(self, vehicle: Vehicle, start: Tuple[int, int], goal: Tuple[int, int]) -> SearchResult:
+        """增量搜索，返回节点编号路径"""
+        planner = self.planner
+        grid = planner.grid
+        if not (grid.is_valid_position(*start) and grid.is_valid_position(*goal)):
+            return SearchResult(None)
+        planner.prepare()
+        self._sync()
+        start_node, goal_node = grid.node_id(*start), grid.node_id(*goal)
+
+        # 与规划器共用路径缓存：占用和货物都没变时不必修补
+        cache_state = planner.cache_state()
+        query = planner.cache_query(vehicle, start_node, goal_node)
+        result = planner.path_cache.get(cache_state, query)
+        if result is not None:
+            return result
+
+        key = (vehicle.id, goal_node, vehicle.is_empty())
+        field = self.start_field(start_node)
+        state = self.states.get(key)
+        if state is not None and state.move_start(start_node, field):
+            self.states.move_to_end(key)
+            self.repairs += 1
+        else:
+            # 邻接用空车表，满车限制体现在通行检查中，货物变化时结构不变
+            state = DStarLiteState(start_node, goal_node, planner.graph.successors(True),
+                                   planner.graph.predecessors(True), field)
+            self.states[key] = state
+            self.states.move_to_end(key)
+            if len(self.states) > self.capacity:
+                self.states.popitem(last=False)
+            self.rebuilds += 1
+        state.is_passable = self.passability(vehicle)
+        if state.result is not None and not state.changed:
+            # 起点和格子都没有变化，结果不变
+            result = SearchResult(state.result.path, state.result.cost, 0)
+        else:
+            state.apply_changes()
+            expanded, done = state.compute(self.max_expansions)
+            self.expanded += expanded
+            path = state.extract_path() if done else None
+            result = SearchResult(None, INF, expanded) if path is None else SearchResult(path, len(path) - 1, expanded)
+            if not done:
+                # 超出扩展上限，下次继续搜索
+                return result
+            state.result = result
+        planner.path_cache.put(cache_state, query, result)
+        return result
+
+    def find_path(
+        self,
+        vehicle: Vehicle,
+        start: Tuple[int, int],
+        goal: Tuple[int, int]
+    ) -> Optional[List[Tuple[int, int]]]:
+        """与 AStarPlanner.find_path 相同的接口，不支持增量时直接转交规划器"""
+        if not self.supported():
+            return self.planner.find_path(vehicle, start, goal)
+        return self.planner.to_positions(self.search(vehicle, start, goal).path)
+
+    def forget(self, vehicle: Vehicle) -> None:
+        """丢弃车辆的全部搜索状态，例如任务完成后"""
+        for key in [key for key in self.states if key[0] == vehicle.id]:
+            del self.states[key]
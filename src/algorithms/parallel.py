@@ -0,0 +1,327 @@
+from typing import List, Tuple, Optional, Dict, Sequence
+import multiprocessing
+import weakref
+from multiprocessing import shared_memory, resource_tracker
+import numpy as np
+from src.models.vehicle import Vehicle
+from src.algorithms.a_star import AStarPlanner
+from src.algorithms.search import SearchSpace, SearchResult
+from src.utils.events import events
+
+# 共享内存中邻接表各数组的排列顺序
+GRAPH_FIELDS = (
+    "offsets",
+    "reverse_offsets",
+    "targets_empty",
+    "degrees_empty",
+    "targets_loaded",
+    "degrees_loaded",
+    "reverse_targets",
+    "reverse_degrees_empty",
+    "reverse_degrees_loaded",
+)
+
+# 通行状态块：空车掩码、满车掩码、车辆占用，各 num_nodes 字节
+STATE_ROWS = 3
+
+
+class SharedGridSnapshot:
+    """把邻接表和通行状态放进共享内存，工作进程按名字只读挂载
+
+    邻接表按地图版本整块发布，版本变化时换新块；通行状态块在每批查询
+    分发前原地改写，此时工作进程空闲，不会读到一半的数据。
+    """
+
+    def __init__(self):
+        self.graph_block: Optional[shared_memory.SharedMemory] = None
+        self.graph_version = None
+        self.layout: Tuple[Tuple[int, int], ...] = ()
+        self.state_block: Optional[shared_memory.SharedMemory] = None
+        self.state_key = None
+        self.state_serial = 0
+        self.num_nodes = 0
+
+    def publish(self, planner: AStarPlanner) -> tuple:
+        """同步共享内存并返回工作进程挂载所需的描述"""
+        graph = planner.graph
+        grid = planner.grid
+        if self.graph_version != graph.version:
+            self._publish_graph(planner)
+        manager = planner.constraint_manager
+        state_key = (grid.version, manager.version, manager.vehicle_conflict_constraint.version)
+        if self.state_key != state_key:
+            self._publish_state(planner)
+            self.state_key = state_key
+        return (
+            self.graph_block.name,
+            self.layout,
+            self.state_block.name,
+            self.state_serial,
+            self.num_nodes,
+            grid.width,
+        )
+
+    def _publish_graph(self, planner: AStarPlanner) -> None:
+        graph = planner.graph
+        arrays = [
+            graph.offsets,
+            graph.reverse_offsets,
+            graph.targets[True],
+            graph.degrees[True],
+            graph.targets[False],
+            graph.degrees[False],
+            graph.reverse_targets[True],
+            graph.reverse_degrees[True],
+            graph.reverse_degrees[False],
+        ]
+        total = sum(len(array) for array in arrays)
+        block = shared_memory.SharedMemory(create=True, size=max(1, total) * 4)
+        buffer = np.ndarray((total,), dtype=np.int32, buffer=block.buf)
+        layout = []
+        position = 0
+        for array in arrays:
+            buffer[position:position + len(array)] = array
+            layout.append((position, len(array)))
+            position += len(array)
+        del buffer
+
+        self._release(self.graph_block)
+        self.graph_block = block
+        self.layout = tuple(layout)
+        self.graph_version = graph.version
+
+        if self.num_nodes != planner.grid.num_nodes or self.state_block is None:
+            self.num_nodes = planner.grid.num_nodes
+            self._release(self.state_block)
+            self.state_block = shared_memory.SharedMemory(create=True, size=max(1, STATE_ROWS * self.num_nodes))
+            self.state_key = None
+
+    def _publish_state(self, planner: AStarPlanner) -> None:
+        grid = planner.grid
+        manager = planner.constraint_manager
+        state = np.ndarray((STATE_ROWS, self.num_nodes), dtype=np.uint8, buffer=self.state_block.buf)
+        state[0] = manager.passable_array(grid, True)
+        state[1] = manager.passable_array(grid, False)
+        state[2] = 0
+        occupied = [grid.node_id(x, y) for x, y in manager.vehicle_conflict_constraint.occupied_positions
+                    if grid.is_valid_position(x, y)]
+        state[2][occupied] = 1
+        del state
+        self.state_serial += 1
+
+    @staticmethod
+    def _release(block: Optional[shared_memory.SharedMemory]) -> None:
+        if block is None:
+            return
+        block.close()
+        block.unlink()
+
+    def close(self) -> None:
+        """释放全部共享内存"""
+        self._release(self.graph_block)
+        self._release(self.state_block)
+        self.graph_block = self.state_block = None
+        self.graph_version = self.state_key = None
+
+
+# 工作进程内缓存：当前挂载的邻接表和通行状态
+_worker_graph: Dict[str, object] = {}
+_worker_state: Dict[str, object] = {}
+_worker_search_space = SearchSpace()
+
+
+def _rows(offsets: List[int], targets: List[int], degrees: List[int]) -> List[List[int]]:
+    return [targets[start:start + degree] for start, degree in zip(offsets, degrees)]
+
+
+def _attach(descriptor: tuple):
+    """按描述挂载共享内存，返回 (后继表, 前驱表, 通行表)，同一版本只构建一次"""
+    graph_name, layout, state_name, state_serial, num_nodes, _ = descriptor
+    if _worker_graph.get("name") != graph_name:
+        block = shared_memory.SharedMemory(name=graph_name)
+        total = sum(length for _, length in layout)
+        buffer = np.ndarray((total,), dtype=np.int32, buffer=block.buf)
+        fields = {name: buffer[start:start + length].tolist() for name, (start, length) in zip(GRAPH_FIELDS, layout)}
+        del buffer
+        block.close()
+        _worker_graph.clear()
+        _worker_graph.update(
+            name=graph_name,
+            successors={
+                True: _rows(fields["offsets"], fields["targets_empty"], fields["degrees_empty"]),
+                False: _rows(fields["offsets"], fields["targets_loaded"], fields["degrees_loaded"]),
+            },
+            predecessors={
+                True: _rows(fields["reverse_offsets"], fields["reverse_targets"], fields["reverse_degrees_empty"]),
+                False: _rows(fields["reverse_offsets"], fields["reverse_targets"], fields["reverse_degrees_loaded"]),
+            },
+        )
+    if _worker_state.get("key") != (state_name, state_serial):
+        block = shared_memory.SharedMemory(name=state_name)
+        state = np.ndarray((STATE_ROWS, num_nodes), dtype=np.uint8, buffer=block.buf)
+        free = state[2] == 0
+        passable = {True: (state[0].astype(bool) & free).tolist(), False: (state[1].astype(bool) & free).tolist()}
+        del state, free
+        block.close()
+        _worker_state.clear()
+        _worker_state.update(key=(state_name, state_serial), passable=passable)
+    if _worker_search_space.num_nodes != num_nodes:
+        _worker_search_space.resize(num_nodes)
+    return _worker_graph["successors"], _worker_graph["predecessors"], _worker_state["passable"]
+
+
+def _run_query(job: tuple):
+    """工作进程入口：("path", 描述, (起点, 终点, 是否空车)) 或 ("many", 描述, (终点, 是否空车, 起点列表))"""
+    kind, descriptor, payload = job
+    successors, predecessors, passable = _attach(descriptor)
+    width = descriptor[5]
+    if kind == "path":
+        start, goal, is_empty = payload
+        goal_y, goal_x = divmod(goal, width)
+
+        def heuristic(node: int) -> float:
+            y, x = divmod(node, width)
+            return abs(x - goal_x) + abs(y - goal_y)
+
+        return _worker_search_space.search(
+            start, goal, successors[is_empty], passable[is_empty].__getitem__, heuristic
+        )
+    goal, is_empty, sources = payload
+    return _worker_search_space.reverse_search(
+        goal, sources, predecessors[is_empty], passable[is_empty].__getitem__
+    )
+
+
+class ParallelPlanner:
+    """把一批互不依赖的路径查询分发到进程池
+
+    地图和占用状态通过 SharedGridSnapshot 共享，结果按查询顺序返回，与工作进程
+    完成的先后无关。workers 为 0、规划结果依赖时刻（时空规划），或存在车辆冲突
+    以外的动态约束时，直接在本进程内逐个规划。
+    """
+
+    def __init__(self, planner: AStarPlanner, workers: int = 0, min_batch: int = 2):
+        self.planner = planner
+        self.workers = workers
+        self.min_batch = min_batch  # 少于该数量的查询不值得分发
+        self.snapshot = SharedGridSnapshot()
+        weakref.finalize(self, self.snapshot.close)  # 未调用 close 时在回收或退出时释放共享内存
+        self.pool = None
+        self.dispatched = 0  # 分发到进程池的查询数
+
+    def enabled(self) -> bool:
+        """当前是否可以并行规划"""
+        if self.workers <= 0 or self.planner.time_dependent:
+            return False
+        return not self.planner.constraint_manager.dynamic_constraints(include_vehicle_conflict=False)
+
+    def _ensure_pool(self) -> bool:
+        """按需启动进程池，无法启动时关闭并行"""
+        if self.pool is not None:
+            return True
+        try:
+            # 先启动资源跟踪进程，工作进程与本进程共用它，挂载共享内存不会被当作泄漏清理
+            resource_tracker.ensure_running()
+            self.pool = multiprocessing.Pool(self.workers)
+        except (OSError, ValueError) as e:
+            events.warning("parallel.pool_failed", "进程池启动失败，改为进程内规划: {error}", error=str(e))
+            self.workers = 0
+            return False
+        return True
+
+    def _dispatch(self, jobs: List[tuple]) -> list:
+        """发布共享状态并按顺序收集结果"""
+        descriptor = self.snapshot.publish(self.planner)
+        self.dispatched += len(jobs)
+        return self.pool.map(_run_query, [(kind, descriptor, payload) for kind, payload in jobs])
+
+    def find_paths(
+        self,
+        queries: Sequence[Tuple[Vehicle, Tuple[int, int], Tuple[int, int]]]
+    ) -> List[Optional[List[Tuple[int, int]]]]:
+        """批量执行 find_path，返回与 queries 顺序一致的坐标路径"""
+        planner = self.planner
+        grid = planner.grid
+        if len(queries) < self.min_batch or not self.enabled() or not self._ensure_pool():
+            return [planner.find_path(vehicle, start, goal) for vehicle, start, goal in queries]
+
+        planner.prepare()
+        state = planner.cache_state()
+        results: List[Optional[SearchResult]] = [None] * len(queries)
+        jobs, pending = [], []
+        for index, (vehicle, start, goal) in enumerate(queries):
+            if not (grid.is_valid_position(*start) and grid.is_valid_position(*goal)):
+                results[index] = SearchResult(None)
+                continue
+            start_node, goal_node = grid.node_id(*start), grid.node_id(*goal)
+            query = planner.cache_query(vehicle, start_node, goal_node)
+            hit = planner.path_cache.get(state, query)
+            if hit is not None:
+                results[index] = hit
+                continue
+            jobs.append(("path", (start_node, goal_node, vehicle.is_empty())))
+            pending.append((index, query))
+
+        if jobs:
+            for (index, query), result in zip(pending, self._dispatch(jobs)):
+                planner.path_cache.put(state, query, result)
+                results[index] = result
+        return [planner.to_positions(result.path) for result in results]
+
+    def search_many_batch(
+        self,
+        vehicles: List[Vehicle],
+        goals: Sequence[Tuple[int, int]]
+    ) -> List[Dict[str, SearchResult]]:
+        """对每个目标执行 search_many，返回与 goals 顺序一致的结果"""
+        planner = self.planner
+        grid = planner.grid
+        if len(goals) < self.min_batch or not self.enabled() or not self._ensure_pool():
+            return [planner.search_many(vehicles, goal) for goal in goals]
+
+        planner.prepare()
+        state = planner.cache_state()
+        groups = []
+        for is_empty in (True, False):
+            group = [v for v in vehicles
+                     if v.is_empty() == is_empty and grid.is_valid_position(*v.current_position)]
+            if group:
+                groups.append((is_empty, group, {v.id: grid.node_id(*v.current_position) for v in group}))
+
+        results: List[Dict[str, SearchResult]] = [{} for _ in goals]
+        jobs, pending = [], []
+        for index, goal in enumerate(goals):
+            if not grid.is_valid_position(*goal):
+                continue
+            goal_node = grid.node_id(*goal)
+            for is_empty, group, sources in groups:
+                # 与 search_many 一致：组内全部命中缓存时不用搜索
+                cached = {}
+                for vehicle in group:
+                    hit = planner.path_cache.get(state, planner.cache_query(vehicle, sources[vehicle.id], goal_node))
+                    if hit is None:
+                        break
+                    cached[vehicle.id] = hit
+                if len(cached) == len(group):
+                    results[index].update((vid, result) for vid, result in cached.items() if result.path is not None)
+                    continue
+                jobs.append(("many", (goal_node, is_empty, list(sources.values()))))
+                pending.append((index, goal_node, group, sources))
+
+        if jobs:
+            for (index, goal_node, group, sources), found in zip(pending, self._dispatch(jobs)):
+                for vehicle in group:
+                    source = sources[vehicle.id]
+                    result = found.get(source, SearchResult(None))
+                    planner.path_cache.put(state, planner.cache_query(vehicle, source, goal_node), result)
+                    if result.path is not None:
+                        results[index][vehicle.id] = result
+        return results
+
+    def close(self) -> None:
+        """关闭进程池并释放共享内存"""
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+        self.snapshot.close()
@@ -0,0 +1,60 @@
+from collections import OrderedDict
+from typing import Hashable, Optional
+from src.algorithms.search import SearchResult
+
+
+class PathCache:
+    """路径结果 LRU 缓存
+
+    键分两部分：state 是地图、约束、占用等版本号的组合，query 是起终点和
+    载货状态。state 一旦变化，旧条目全部不可能再命中，直接整体清空。
+    """
+
+    def __init__(self, capacity: int = 256):
+        self.capacity = capacity
+        self.entries: "OrderedDict[Hashable, SearchResult]" = OrderedDict()
+        self.state: Optional[Hashable] = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _sync(self, state: Hashable) -> None:
+        if state != self.state:
+            self.invalidations += len(self.entries)
+            self.entries.clear()
+            self.state = state
+
+    def get(self, state: Hashable, query: Hashable) -> Optional[SearchResult]:
+        """命中时返回结果副本，扩展节点数记为 0"""
+        self._sync(state)
+        result = self.entries.get(query)
+        if result is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(query)
+        self.hits += 1
+        path = list(result.path) if result.path is not None else None
+        return SearchResult(path, result.cost, 0)
+
+    def put(self, state: Hashable, query: Hashable, result: SearchResult) -> None:
+        """写入结果，超出容量时淘汰最久未使用的条目"""
+        self._sync(state)
+        path = list(result.path) if result.path is not None else None
+        self.entries[query] = SearchResult(path, result.cost, result.expanded)
+        self.entries.move_to_end(query)
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """清空缓存"""
+        self.entries.clear()
+        self.state = None
+
+    def stats(self) -> dict:
+        """命中统计"""
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+        }
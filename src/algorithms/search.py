@@ -0,0 +1,164 @@
+from dataclasses import dataclass
+from typing import List, Optional, Callable, Dict, Iterable
+from collections import deque
+import heapq
+
+INF = float("inf")
+
+
+@dataclass
+class SearchResult:
+    """一次搜索的结果"""
+    path: Optional[List[int]]  # 节点编号序列，找不到时为 None
+    cost: float = INF  # 路径代价
+    expanded: int = 0  # 扩展的节点数
+    open_peak: int = 0  # 扩展节点时开放表的最大长度
+
+
+class SearchSpace:
+    """按节点编号索引的 A* 搜索状态
+
+    g、parent、closed 都是扁平列表，用代数戳标记当前搜索写过的槽位，
+    新搜索只需把代数加一，无需清空数组。开放表采用惰性删除：
+    节点 g 值变小时直接重复入堆，出堆时跳过过期条目。
+    """
+
+    def __init__(self, num_nodes: int = 0):
+        self.resize(num_nodes)
+
+    def resize(self, num_nodes: int) -> None:
+        """按节点数重新分配数组"""
+        self.num_nodes = num_nodes
+        self.g: List[float] = [INF] * num_nodes
+        self.parent: List[int] = [-1] * num_nodes
+        self.seen: List[int] = [0] * num_nodes  # 等于 generation 时 g/parent 有效
+        self.closed: List[int] = [0] * num_nodes  # 等于 generation 时已关闭
+        self.generation = 0
+
+    def _next_generation(self) -> int:
+        self.generation += 1
+        return self.generation
+
+    def reconstruct_path(self, node: int) -> List[int]:
+        """沿 parent 回溯路径"""
+        path = [node]
+        parent = self.parent
+        while parent[node] != -1:
+            node = parent[node]
+            path.append(node)
+        path.reverse()
+        return path
+
+    def search(
+        self,
+        start: int,
+        goal: int,
+        successors: List[List[int]],
+        is_passable: Callable[[int], bool],
+        heuristic: Callable[[int], float],
+    ) -> SearchResult:
+        """单位代价 A*，is_passable 对每个节点在一次搜索中至多调用一次"""
+        generation = self._next_generation()
+        g, parent, seen, closed = self.g, self.parent, self.seen, self.closed
+
+        g[start] = 0
+        parent[start] = -1
+        seen[start] = generation
+        h_start = heuristic(start)
+        if h_start == INF:
+            return SearchResult(None)
+
+        open_set = [(h_start, 0, start)]
+        counter = 1
+        expanded = 0
+        open_peak = 0
+        push, pop = heapq.heappush, heapq.heappop
+
+        while open_set:
+            f, _, current = pop(open_set)
+            if closed[current] == generation:
+                continue  # 过期条目
+            if current == goal:
+                return SearchResult(self.reconstruct_path(current), g[current], expanded, open_peak)
+            closed[current] = generation
+            expanded += 1
+            if len(open_set) >= open_peak:
+                open_peak = len(open_set) + 1
+
+            tentative_g = g[current] + 1
+            for neighbor in successors[current]:
+                if closed[neighbor] == generation:
+                    continue
+                if seen[neighbor] != generation:
+                    seen[neighbor] = generation
+                    if not is_passable(neighbor):
+                        closed[neighbor] = generation
+                        continue
+                elif tentative_g >= g[neighbor]:
+                    continue
+                h = heuristic(neighbor)
+                if h == INF:
+                    closed[neighbor] = generation
+                    continue
+                g[neighbor] = tentative_g
+                parent[neighbor] = current
+                push(open_set, (tentative_g + h, counter, neighbor))
+                counter += 1
+        return SearchResult(None, INF, expanded, open_peak)
+
+    def reverse_search(
+        self,
+        goal: int,
+        sources: Iterable[int],
+        predecessors: List[List[int]],
+        is_passable: Callable[[int], bool],
+    ) -> Dict[int, SearchResult]:
+        """从 goal 沿反向边做一次 BFS，求出所有 sources 到 goal 的最短路径
+
+        与正向搜索一致：除起点外，路径上每个格子都要通过 is_passable。
+        起点本身不检查，但只有可通行的起点才会继续向外扩展。
+        """
+        generation = self._next_generation()
+        dist, parent, seen = self.g, self.parent, self.seen
+        remaining = set(sources)
+        found: Dict[int, int] = {}
+
+        dist[goal] = 0
+        parent[goal] = -1
+        seen[goal] = generation
+        if goal in remaining:
+            found[goal] = 0
+            remaining.discard(goal)
+
+        expanded = 0
+        open_peak = 0
+        queue = deque()
+        if is_passable(goal):
+            queue.append(goal)
+        while queue and remaining:
+            if len(queue) > open_peak:
+                open_peak = len(queue)
+            node = queue.popleft()
+            expanded += 1
+            next_distance = dist[node] + 1
+            for predecessor in predecessors[node]:
+                if seen[predecessor] == generation:
+                    continue
+                seen[predecessor] = generation
+                dist[predecessor] = next_distance
+                parent[predecessor] = node  # 反向树中 parent 指向离目标更近的节点
+                if predecessor in remaining:
+                    found[predecessor] = next_distance
+                    remaining.discard(predecessor)
+                if is_passable(predecessor):
+                    queue.append(predecessor)
+
+        results: Dict[int, SearchResult] = {}
+        for source, distance in found.items():
+            path = [source]
+            node = source
+            while parent[node] != -1:
+                node = parent[node]
+                path.append(node)
+            results[source] = SearchResult(path, distance, expanded, open_peak)
+        return results
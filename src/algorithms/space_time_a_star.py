@@ -0,0 +1,252 @@
+from typing import List, Tuple, Optional, Dict, Callable, Container, Set
+import heapq
+from src.models.grid import Grid
+from src.models.vehicle import Vehicle
+from src.models.constraints import ConstraintManager
+from src.algorithms.a_star import AStarPlanner
+from src.algorithms.search import SearchResult, INF
+
+
+class ReservationTable:
+    """时空预约表
+
+    vertices[node][t] 记录 t 时刻占用格子的车辆，edges[(u, v, t)] 记录 t 到 t+1
+    从 u 移动到 v 的车辆，用于检测对穿冲突；parked[node] 记录到达终点后从某一
+    时刻起一直停在该格子的车辆。
+    """
+
+    def __init__(self):
+        self.vertices: Dict[int, Dict[int, str]] = {}
+        self.edges: Dict[Tuple[int, int, int], str] = {}
+        self.parked: Dict[int, Tuple[str, int]] = {}
+        self._owned: Dict[str, Tuple[List[Tuple[int, int]], List[Tuple[int, int, int]], Optional[int]]] = {}
+        self.version = 0
+
+    def reserve_path(self, vehicle_id: str, path: List[int], start_time: int) -> None:
+        """预约路径，path[i] 在 start_time + i 时刻占用，终点之后长期停靠"""
+        self.release(vehicle_id)
+        vertices, edges = [], []
+        for offset, node in enumerate(path):
+            t = start_time + offset
+            self.vertices.setdefault(node, {})[t] = vehicle_id
+            vertices.append((node, t))
+            if offset > 0 and path[offset - 1] != node:
+                key = (path[offset - 1], node, t - 1)
+                self.edges[key] = vehicle_id
+                edges.append(key)
+        self._owned[vehicle_id] = (vertices, edges, None)
+        if path:
+            self._park(vehicle_id, path[-1], start_time + len(path) - 1)
+        self.version += 1
+
+    def park(self, vehicle_id: str, node: int, time: int) -> None:
+        """车辆从 time 起停在 node，替换该车已有的预约"""
+        self.release(vehicle_id)
+        self._owned[vehicle_id] = ([], [], None)
+        self._park(vehicle_id, node, time)
+        self.version += 1
+
+    def _park(self, vehicle_id: str, node: int, time: int) -> None:
+        self.parked[node] = (vehicle_id, time)
+        vertices, edges, _ = self._owned[vehicle_id]
+        self._owned[vehicle_id] = (vertices, edges, node)
+
+    def release(self, vehicle_id: str) -> None:
+        """释放车辆的全部预约"""
+        owned = self._owned.pop(vehicle_id, None)
+        if owned is None:
+            return
+        vertices, edges, parked_node = owned
+        for node, t in vertices:
+            reserved = self.vertices.get(node)
+            if reserved and reserved.get(t) == vehicle_id:
+                del reserved[t]
+                if not reserved:
+                    del self.vertices[node]
+        for key in edges:
+            if self.edges.get(key) == vehicle_id:
+                del self.edges[key]
+        if parked_node is not None and self.parked.get(parked_node, (None,))[0] == vehicle_id:
+            del self.parked[parked_node]
+        self.version += 1
+
+    def is_vertex_free(self, node: int, t: int, ignore: Container[str]) -> bool:
+        """t 时刻格子是否未被 ignore 以外的车辆占用"""
+        owner = self.vertices.get(node, {}).get(t)
+        if owner is not None and owner not in ignore:
+            return False
+        parked = self.parked.get(node)
+        if parked is not None and parked[0] not in ignore and parked[1] <= t:
+            return False
+        return True
+
+    def is_move_free(self, from_node: int, to_node: int, t: int, ignore: Container[str]) -> bool:
+        """t 到 t+1 从 from_node 移到 to_node 是否与 ignore 以外的车辆对穿"""
+        owner = self.edges.get((to_node, from_node, t))
+        return owner is None or owner in ignore
+
+    def can_stay_from(self, node: int, t: int, ignore: Container[str]) -> bool:
+        """从 t 起能否一直停在 node"""
+        parked = self.parked.get(node)
+        if parked is not None and parked[0] not in ignore:
+            return False
+        reserved = self.vertices.get(node)
+        if reserved:
+            return all(owner in ignore for time, owner in reserved.items() if time >= t)
+        return True
+
+
+class SpaceTimeAStarPlanner(AStarPlanner):
+    """在 (格子, 时刻) 空间上搜索的 A*，允许原地等待
+
+    其他车辆的路径通过 ReservationTable 按时刻预约，不再整条路径封锁；
+    仍沿用 AStarPlanner 的接口，Scheduler 可以直接替换。
+    """
+
+    time_dependent = True
+
+    def __init__(self, grid: Grid, constraint_manager: ConstraintManager,
+                 horizon: Optional[int] = None, max_expansions: int = 20000):
+        super().__init__(grid, constraint_manager)
+        self.reservations = ReservationTable()
+        self.horizon = horizon
+        self.max_expansions = max_expansions
+
+    def passability(self, vehicle: Vehicle, include_vehicle_conflict: bool = False) -> Callable[[int], bool]:
+        """车辆间冲突由预约表处理，这里不检查整条路径占用"""
+        return super().passability(vehicle, include_vehicle_conflict)
+
+    def cache_state(self):
+        """时空规划还依赖预约表和当前时刻"""
+        return super().cache_state() + (self.reservations.version, self.current_time)
+
+    def cache_query(self, vehicle: Vehicle, start: int, goal: int):
+        """预约表会忽略车辆自身的预约，所以查询要区分车辆"""
+        return super().cache_query(vehicle, start, goal) + (vehicle.id,)
+
+    def plan(self, vehicle: Vehicle, start: int, goal: int) -> SearchResult:
+        """时空 A*，路径中重复的格子表示等待"""
+        successors = self.graph.successors(vehicle.is_empty())
+        is_passable = self.passability(vehicle)
+        heuristic = self.heuristic(goal)
+
+        # 先在静态地图上确认可达，避免在时空空间里耗尽预算
+        static_result = self.search_space.search(start, goal, successors, is_passable, heuristic)
+        if static_result.path is None:
+            return static_result
+
+        result = self._search(vehicle.id, start, goal, self.current_time, successors, is_passable, heuristic)
+        result.expanded += static_result.expanded
+        result.open_peak = max(result.open_peak, static_result.open_peak)
+        return result
+
+    def _search(
+        self,
+        vehicle_id: str,
+        start: int,
+        goal: int,
+        start_time: int,
+        successors: List[List[int]],
+        is_passable: Callable[[int], bool],
+        heuristic: Callable[[int], float],
+        ignore: Optional[Container[str]] = None,
+        blocked_vertices: Optional[Set[Tuple[int, int]]] = None,
+        blocked_moves: Optional[Set[Tuple[int, int, int]]] = None,
+    ) -> SearchResult:
+        """以 start_time 为起始时刻搜索到 goal 并能长期停靠的最早路径
+
+        ignore 为预约表中视而不见的车辆，默认只有自身；blocked_vertices 中的
+        (格子, 时刻) 和 blocked_moves 中的 (起点, 终点, 时刻) 额外禁止，
+        供多车联合规划添加约束。
+        """
+        reservations = self.reservations
+        horizon = self.horizon if self.horizon is not None else 2 * (self.grid.width + self.grid.height)
+        deadline = start_time + horizon
+        if ignore is None:
+            ignore = {vehicle_id}
+        blocked_vertices = blocked_vertices or set()
+        blocked_moves = blocked_moves or set()
+        # 终点在某时刻被禁止时，只能在此之后到达并停靠
+        goal_free_from = max((t for node, t in blocked_vertices if node == goal), default=start_time - 1) + 1
+        parked = reservations.parked.get(goal)
+        if parked is not None and parked[0] not in ignore:
+            return SearchResult(None)
+        h_start = heuristic(start)
+        if h_start == INF:
+            return SearchResult(None)
+
+        passable: Dict[int, bool] = {}
+        parent: Dict[Tuple[int, int], Tuple[int, int]] = {}
+        closed = set()
+        open_set = [(h_start, 0, start, start_time)]
+        counter = 1
+        expanded = 0
+        open_peak = 0
+
+        while open_set:
+            _, _, node, t = heapq.heappop(open_set)
+            state = (node, t)
+            if state in closed:
+                continue
+            if node == goal and t >= goal_free_from and reservations.can_stay_from(goal, t, ignore):
+                path = [node]
+                while state in parent:
+                    state = parent[state]
+                    path.append(state[0])
+                path.reverse()
+                return SearchResult(path, t - start_time, expanded, open_peak)
+            if expanded >= self.max_expansions:
+                break
+            closed.add(state)
+            expanded += 1
+            if len(open_set) >= open_peak:
+                open_peak = len(open_set) + 1
+            if t >= deadline:
+                continue
+
+            next_t = t + 1
+            for neighbor in [node] + successors[node]:
+                next_state = (neighbor, next_t)
+                if next_state in closed:
+                    continue
+                if neighbor != node:
+                    ok = passable.get(neighbor)
+                    if ok is None:
+                        ok = passable[neighbor] = is_passable(neighbor)
+                    if not ok or not reservations.is_move_free(node, neighbor, t, ignore):
+                        continue
+                    if (node, neighbor, t) in blocked_moves:
+                        continue
+                if not reservations.is_vertex_free(neighbor, next_t, ignore) or next_state in blocked_vertices:
+                    continue
+                h = heuristic(neighbor)
+                if h == INF:
+                    continue
+                if next_state not in parent:
+                    parent[next_state] = state
+                    heapq.heappush(open_set, (next_t - start_time + h, counter, neighbor, next_t))
+                    counter += 1
+        return SearchResult(None, INF, expanded, open_peak)
+
+    def register_vehicle(self, vehicle: Vehicle) -> None:
+        """注册车辆，并让其停在当前位置"""
+        super().register_vehicle(vehicle)
+        self.reservations.park(vehicle.id, self.grid.node_id(*vehicle.current_position), self.current_time)
+
+    def reserve_path(self, vehicle: Vehicle, path: List[Tuple[int, int]]) -> None:
+        """提交路径，并按时刻预约"""
+        super().reserve_path(vehicle, path)
+        nodes = [self.grid.node_id(x, y) for x, y in path]
+        self.reservations.reserve_path(vehicle.id, nodes, self.current_time)
+
+    def release_path(self, vehicle: Vehicle) -> None:
+        """撤销路径预约，车辆停在当前位置"""
+        super().release_path(vehicle)
+        self.reservations.park(vehicle.id, self.grid.node_id(*vehicle.current_position), self.current_time)
+
+    def reserve_paths(self, assignments: List[Tuple[Vehicle, List[Tuple[int, int]]]]) -> None:
+        """批量提交路径，并逐条按时刻预约"""
+        super().reserve_paths(assignments)
+        for vehicle, path in assignments:
+            nodes = [self.grid.node_id(x, y) for x, y in path]
+            self.reservations.reserve_path(vehicle.id, nodes, self.current_time)
@@ -1,21 +1,43 @@
 from abc import ABC, abstractmethod
-from typing import List, Tuple, Dict
+from typing import List, Tuple, Dict, Set, Optional, Callable
+import numpy as np
 from .grid import Grid, GRID_TYPE_OBSTACLE, GRID_TYPE_MAIN_CHANNEL, GRID_TYPE_NORMAL_CHANNEL
-from .vehicle import Vehicle, VEHICLE_STATUS_WAITING
+from .vehicle import Vehicle, VEHICLE_STATUS_WAITING, VEHICLE_TYPE_EMPTY, VEHICLE_TYPE_LOADED
+from ..utils.events import events
+
+# 编译静态约束时代表空车/满车的探测车辆
+PROBE_VEHICLES = {
+    True: Vehicle(id="__probe_empty__", vehicle_type=VEHICLE_TYPE_EMPTY, current_position=(0, 0)),
+    False: Vehicle(id="__probe_loaded__", vehicle_type=VEHICLE_TYPE_LOADED, current_position=(0, 0)),
+}
 
 
 class Constraint(ABC):
     """约束条件基类"""
 
+    # 静态约束只依赖地图和货物以及车辆是否空载，可以预先编译成通行掩码
+    is_static = False
+
     @abstractmethod
     def check(self, grid: Grid, vehicle: Vehicle, position: Tuple[int, int]) -> bool:
         """检查约束条件是否满足"""
         pass
 
+    def compile(self, grid: Grid, is_empty: bool) -> np.ndarray:
+        """按节点编号计算整张地图上的约束结果"""
+        vehicle = PROBE_VEHICLES[is_empty]
+        return np.fromiter(
+            (self.check(grid, vehicle, position) for position in grid.cells),
+            dtype=np.bool_,
+            count=grid.num_nodes,
+        )
+
 
 class PhysicalConstraint(Constraint):
     """物理约束"""
 
+    is_static = True
+
     def __init__(self, restricted_positions: List[Tuple[int, int]]):
         self.restricted_positions = set(restricted_positions)
 
@@ -23,10 +45,19 @@ class PhysicalConstraint(Constraint):
         """检查位置是否在物理限制区域内"""
         return position not in self.restricted_positions
 
+    def compile(self, grid: Grid, is_empty: bool) -> np.ndarray:
+        mask = np.ones(grid.num_nodes, dtype=np.bool_)
+        for x, y in self.restricted_positions:
+            if grid.is_valid_position(x, y):
+                mask[grid.node_id(x, y)] = False
+        return mask
+
 
 class DirectionConstraint(Constraint):
     """方向约束"""
 
+    is_static = True
+
     def __init__(self, position: Tuple[int, int], allowed_directions: List[str]):
         self.position = position
         self.allowed_directions = allowed_directions
@@ -42,10 +73,18 @@ class DirectionConstraint(Constraint):
 
         return all(direction in self.allowed_directions for direction in cell.allowed_directions)
 
+    def compile(self, grid: Grid, is_empty: bool) -> np.ndarray:
+        mask = np.ones(grid.num_nodes, dtype=np.bool_)
+        if grid.is_valid_position(*self.position):
+            mask[grid.node_id(*self.position)] = self.check(grid, PROBE_VEHICLES[is_empty], self.position)
+        return mask
+
 
 class CargoConstraint(Constraint):
     """货物约束"""
 
+    is_static = True
+
     def check(self, grid: Grid, vehicle: Vehicle, position: Tuple[int, int]) -> bool:
         """检查货物约束是否满足"""
         cell = grid.get_cell(*position)
@@ -58,10 +97,17 @@ class CargoConstraint(Constraint):
 
         return True
 
+    def compile(self, grid: Grid, is_empty: bool) -> np.ndarray:
+        if is_empty:
+            return np.ones(grid.num_nodes, dtype=np.bool_)
+        return ~grid.cargo
+
 
 class ChannelConstraint(Constraint):
     """通道约束"""
 
+    is_static = True
+
     def check(self, grid: Grid, vehicle: Vehicle, position: Tuple[int, int]) -> bool:
         """检查通道约束是否满足"""
         cell = grid.get_cell(*position)
@@ -84,36 +130,101 @@ class ChannelConstraint(Constraint):
 
         return False
 
+    def compile(self, grid: Grid, is_empty: bool) -> np.ndarray:
+        return grid.passable_mask(is_empty)
+
 
 class VehicleConflictConstraint(Constraint):
-    """车辆冲突约束"""
+    """车辆冲突约束
+
+    占用索引增量维护：每辆车记录自己声明的格子，格子记录所有声明者，
+    车辆路径变化时只更新新旧声明的差集。格子在占用与空闲之间切换时
+    通知监听者，供增量规划修补搜索状态。
+    """
 
     def __init__(self):
         self.vehicles: Dict[str, Vehicle] = {}  # 车辆ID到车辆对象的映射
         self.occupied_positions: Dict[Tuple[int, int], str] = {}  # 位置到车辆ID的映射
         self.active_paths: Dict[str, List[Tuple[int, int]]] = {}  # 车辆ID到活动路径的映射
+        self.owned_positions: Dict[str, Set[Tuple[int, int]]] = {}  # 车辆ID到其声明格子的映射
+        self.position_claims: Dict[Tuple[int, int], List[str]] = {}  # 位置到声明车辆列表（引用计数）
+        self.version = 0  # 占用变化计数
+        self._occupancy_listeners: List[Callable[[Tuple[int, int]], None]] = []
+
+    def add_occupancy_listener(self, listener: Callable[[Tuple[int, int]], None]) -> None:
+        """注册格子占用状态变化的回调，参数为位置"""
+        if listener not in self._occupancy_listeners:
+            self._occupancy_listeners.append(listener)
+
+    def remove_occupancy_listener(self, listener: Callable[[Tuple[int, int]], None]) -> None:
+        """注销占用变化回调"""
+        if listener in self._occupancy_listeners:
+            self._occupancy_listeners.remove(listener)
+
+    def _notify(self, positions) -> None:
+        for listener in list(self._occupancy_listeners):
+            for pos in positions:
+                listener(pos)
 
     def add_vehicle(self, vehicle: Vehicle) -> None:
         """添加车辆到约束系统"""
         self.vehicles[vehicle.id] = vehicle
-        self._update_occupied_positions()
+        self._claim(vehicle.id, vehicle.path if vehicle.path else [vehicle.current_position])
 
     def remove_vehicle(self, vehicle_id: str) -> None:
         """从约束系统中移除车辆"""
         if vehicle_id in self.vehicles:
             del self.vehicles[vehicle_id]
-            self._update_occupied_positions()
+            self.active_paths.pop(vehicle_id, None)
+            self._claim(vehicle_id, [])
+
+    def _claim(self, vehicle_id: str, positions: List[Tuple[int, int]]) -> bool:
+        """把车辆的声明替换为 positions，只处理变化的格子"""
+        new_positions = set(positions)
+        old_positions = self.owned_positions.get(vehicle_id, set())
+        released = old_positions - new_positions
+        acquired = new_positions - old_positions
+        if not released and not acquired:
+            return False
+
+        changed = []  # 在占用与空闲之间切换的格子
+        for pos in released:
+            claimants = self.position_claims[pos]
+            claimants.remove(vehicle_id)
+            if claimants:
+                self.occupied_positions[pos] = claimants[-1]
+            else:
+                del self.position_claims[pos]
+                del self.occupied_positions[pos]
+                changed.append(pos)
+        for pos in acquired:
+            if pos not in self.position_claims:
+                changed.append(pos)
+            self.position_claims.setdefault(pos, []).append(vehicle_id)
+            self.occupied_positions[pos] = vehicle_id
+
+        if new_positions:
+            self.owned_positions[vehicle_id] = new_positions
+        else:
+            self.owned_positions.pop(vehicle_id, None)
+        self.version += 1
+        if changed and self._occupancy_listeners:
+            self._notify(changed)
+        return True
+
+    def claim_count(self, position: Tuple[int, int]) -> int:
+        """声明该位置的车辆数"""
+        return len(self.position_claims.get(position, ()))
 
     def _update_occupied_positions(self) -> None:
-        """更新被占用的位置：将所有车辆的整条路径都视为占用"""
+        """全量重建占用索引：有路径的车辆占整条路径，否则只占当前位置"""
+        self._notify(list(self.occupied_positions))
         self.occupied_positions.clear()
+        self.owned_positions.clear()
+        self.position_claims.clear()
         for vehicle in self.vehicles.values():
-            if vehicle.path:
-                for pos in vehicle.path:
-                    self.occupied_positions[pos] = vehicle.id
-            else:
-                # 如果没有路径，只占当前位置
-                self.occupied_positions[vehicle.current_position] = vehicle.id
+            path = self.active_paths.get(vehicle.id)
+            self._claim(vehicle.id, path if path else [vehicle.current_position])
 
     def check(self, grid: Grid, vehicle: Vehicle, position: Tuple[int, int]) -> bool:
         """检查位置是否会发生冲突"""
@@ -121,45 +232,129 @@ class VehicleConflictConstraint(Constraint):
 
     def add_path(self, vehicle: Vehicle, path: List[Tuple[int, int]]) -> None:
         """为指定车辆添加路径"""
-        if vehicle.id in self.vehicles.keys():
-            self.active_paths[vehicle.id] = path
-        else:
-            print(f"车辆 {vehicle.id} 不在约束系统中，无法添加路径")
-        self._update_occupied_positions()
+        self.update_paths([(vehicle, path)])
 
     def remove_path(self, vehicle: Vehicle) -> None:
         """从约束系统中移除指定车辆的路径"""
-        if vehicle.id in self.active_paths:
-            del self.active_paths[vehicle.id]
-        else:
-            print(f"车辆 {vehicle.id} 没有活动路径，无法移除路径")
-        self._update_occupied_positions()
+        self.update_paths([(vehicle, None)])
+
+    def update_paths(self, updates: List[Tuple[Vehicle, Optional[List[Tuple[int, int]]]]]) -> None:
+        """批量更新路径，path 为 None 表示移除该车路径"""
+        for vehicle, path in updates:
+            if path is not None:
+                if vehicle.id not in self.vehicles:
+                    events.warning("constraints.unknown_vehicle", "车辆 {vehicle} 不在约束系统中，无法添加路径",
+                                   vehicle=vehicle.id)
+                    continue
+                self.active_paths[vehicle.id] = path
+                self._claim(vehicle.id, path)
+                continue
+
+            if vehicle.id in self.active_paths:
+                del self.active_paths[vehicle.id]
+            else:
+                events.debug("constraints.no_active_path", "车辆 {vehicle} 没有活动路径，无法移除路径",
+                             vehicle=vehicle.id)
+            if vehicle.id in self.vehicles:
+                self._claim(vehicle.id, [vehicle.current_position])
 
 class ConstraintManager:
-    """约束管理器"""
+    """约束管理器
+
+    静态约束按车辆是否空载编译成两份通行掩码，搜索时只需查表，
+    只有动态约束（如车辆冲突）逐个位置检查。增删约束或地图结构变化时
+    重新编译，货物变化时只重算变化的格子。
+    """
 
     def __init__(self):
         self.constraints: List[Constraint] = []
+        self.version = 0  # 约束集合变化计数
         self.vehicle_conflict_constraint = VehicleConflictConstraint()
         self.add_constraint(self.vehicle_conflict_constraint)
         self.vehicles = []
+        self._mask_grid: Optional[Grid] = None
+        self._mask_key = None
+        self._mask_arrays: Dict[bool, np.ndarray] = {}
+        self._masks: Dict[bool, List[bool]] = {}
 
     def add_constraint(self, constraint: Constraint) -> None:
         """添加约束"""
         self.constraints.append(constraint)
+        self.version += 1
 
     def remove_constraint(self, constraint: Constraint) -> None:
         """移除约束"""
         if constraint in self.constraints:
             self.constraints.remove(constraint)
+            self.version += 1
+
+    @property
+    def static_constraints(self) -> List[Constraint]:
+        return [c for c in self.constraints if c.is_static]
+
+    def dynamic_constraints(self, include_vehicle_conflict: bool = True) -> List[Constraint]:
+        """需要逐个位置检查的约束；车辆冲突约束即使被移除也总会检查"""
+        dynamic = [c for c in self.constraints if not c.is_static and c is not self.vehicle_conflict_constraint]
+        if include_vehicle_conflict:
+            dynamic.append(self.vehicle_conflict_constraint)
+        return dynamic
+
+    def _bind_grid(self, grid: Grid) -> None:
+        if self._mask_grid is grid:
+            return
+        if self._mask_grid is not None:
+            self._mask_grid.remove_cargo_listener(self._on_cargo_changed)
+        self._mask_grid = grid
+        self._mask_key = None
+        grid.add_cargo_listener(self._on_cargo_changed)
+
+    def compile(self, grid: Grid) -> None:
+        """把静态约束编译成空车、满车两份通行掩码"""
+        self._bind_grid(grid)
+        static = self.static_constraints
+        for is_empty in (True, False):
+            mask = np.ones(grid.num_nodes, dtype=np.bool_)
+            for constraint in static:
+                mask &= constraint.compile(grid, is_empty)
+            self._mask_arrays[is_empty] = mask
+            self._masks[is_empty] = mask.tolist()
+        self._mask_key = (self.version, grid.structure_version, grid.cargo_version)
+
+    def _on_cargo_changed(self, node: int) -> None:
+        """货物变化时只重算该格子的掩码"""
+        grid = self._mask_grid
+        if self._mask_key != (self.version, grid.structure_version, grid.cargo_version - 1):
+            return  # 掩码已过期，等下次使用时整体重编译
+        position = grid.node_position(node)
+        static = self.static_constraints
+        for is_empty, vehicle in PROBE_VEHICLES.items():
+            passable = all(c.check(grid, vehicle, position) for c in static)
+            self._mask_arrays[is_empty][node] = passable
+            self._masks[is_empty][node] = passable
+        self._mask_key = (self.version, grid.structure_version, grid.cargo_version)
+
+    def passable_mask(self, grid: Grid, is_empty: bool) -> List[bool]:
+        """静态约束编译后的通行掩码，按节点编号索引"""
+        self._bind_grid(grid)
+        if self._mask_key != (self.version, grid.structure_version, grid.cargo_version):
+            self.compile(grid)
+        return self._masks[is_empty]
+
+    def passable_array(self, grid: Grid, is_empty: bool) -> np.ndarray:
+        """passable_mask 的 NumPy 版本"""
+        self.passable_mask(grid, is_empty)
+        return self._mask_arrays[is_empty]
 
     def check_all_constraints(self, grid: Grid, vehicle: Vehicle, position: Tuple[int, int]) -> bool:
         """检查所有约束条件，包括车辆冲突约束"""
-        # 先检查所有通用约束
-        basic_ok = all(constraint.check(grid, vehicle, position) for constraint in self.constraints)
-        # 再单独检查车辆冲突约束（可选，防止被遗漏或被移除）
-        vehicle_ok = self.vehicle_conflict_constraint.check(grid, vehicle, position)
-        return basic_ok and vehicle_ok
+        if not grid.is_valid_position(*position):
+            # 地图外的位置没有编译结果，逐个检查
+            return all(c.check(grid, vehicle, position) for c in self.constraints) and \
+                self.vehicle_conflict_constraint.check(grid, vehicle, position)
+        # 先查静态约束掩码，再检查动态约束（车辆冲突约束总会检查）
+        if not self.passable_mask(grid, vehicle.is_empty())[grid.node_id(*position)]:
+            return False
+        return all(c.check(grid, vehicle, position) for c in self.dynamic_constraints())
 
     def add_vehicle(self, vehicle: Vehicle) -> None:
         """添加车辆到约束系统"""
@@ -179,3 +374,7 @@ class ConstraintManager:
     def remove_path(self, vehicle: Vehicle) -> None:
         """从约束系统中移除指定车辆的路径"""
         self.vehicle_conflict_constraint.remove_path(vehicle)
+
+    def update_paths(self, updates: List[Tuple[Vehicle, Optional[List[Tuple[int, int]]]]]) -> None:
+        """批量提交或移除多辆车的路径，path 为 None 表示移除"""
+        self.vehicle_conflict_constraint.update_paths(updates)
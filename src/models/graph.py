@@ -0,0 +1,162 @@
+from typing import Dict, List
+import numpy as np
+from .grid import Grid, DIRECTION_STEPS, CELL_OBSTACLE, CELL_NORMAL_CHANNEL
+
+
+class GridGraph:
+    """网格的压缩邻接表（CSR），空车和满车各一份
+
+    offsets 只由地图结构决定，每行的容量等于该格子按方向能到达的非障碍格子数；
+    满车状态下有货物的普通通道不可进入，行内只有前 degrees[u] 个目标有效。
+    货物变化时只重写受影响的几行，不整体重建。
+    """
+
+    def __init__(self, grid: Grid):
+        self.grid = grid
+        self.structure_version = -1
+        self.cargo_version = -1
+        self.offsets = np.zeros(1, dtype=np.int32)
+        self.targets: Dict[bool, np.ndarray] = {}
+        self.degrees: Dict[bool, np.ndarray] = {}
+        self.reverse_offsets = np.zeros(1, dtype=np.int32)
+        self.reverse_targets: Dict[bool, np.ndarray] = {}
+        self.reverse_degrees: Dict[bool, np.ndarray] = {}
+        # 供搜索内循环使用的 Python 列表镜像
+        self._successors: Dict[bool, List[List[int]]] = {}
+        self._predecessors: Dict[bool, List[List[int]]] = {}
+        grid.add_cargo_listener(self._on_cargo_changed)
+        self.rebuild()
+
+    @property
+    def version(self):
+        """邻接表对应的地图版本"""
+        return (self.structure_version, self.cargo_version)
+
+    def is_current(self) -> bool:
+        """检查是否与地图同步"""
+        return self.version == self.grid.version
+
+    def ensure_current(self) -> None:
+        """地图结构变化时整体重建，货物版本落后时重建满车部分"""
+        if self.structure_version != self.grid.structure_version:
+            self.rebuild()
+        elif self.cargo_version != self.grid.cargo_version:
+            self._build_loaded()
+
+    def rebuild(self) -> None:
+        """从网格数组构建邻接表"""
+        grid = self.grid
+        width, height = grid.width, grid.height
+        num_nodes = width * height
+        nodes = np.arange(num_nodes)
+        xs = nodes % width
+        ys = nodes // width
+        masks = grid.direction_masks
+
+        sources, targets, order = [], [], []
+        for index, (bit, dx, dy) in enumerate(DIRECTION_STEPS):
+            new_x = xs + dx
+            new_y = ys + dy
+            ok = ((masks & bit) != 0) & (new_x >= 0) & (new_x < width) & (new_y >= 0) & (new_y < height)
+            src = nodes[ok]
+            tgt = new_y[ok] * width + new_x[ok]
+            keep = grid.cell_types[tgt] != CELL_OBSTACLE
+            sources.append(src[keep])
+            targets.append(tgt[keep])
+            order.append(np.full(int(keep.sum()), index))
+        sources = np.concatenate(sources) if sources else np.zeros(0, dtype=np.int64)
+        targets = np.concatenate(targets) if targets else np.zeros(0, dtype=np.int64)
+        order = np.concatenate(order) if order else np.zeros(0, dtype=np.int64)
+
+        # 正向：按起点、方向顺序排列，与 Grid.get_neighbors 的顺序一致
+        forward = np.lexsort((order, sources))
+        self._edge_sources = sources[forward].astype(np.int32)
+        self._edge_targets = targets[forward].astype(np.int32)
+        counts = np.bincount(self._edge_sources, minlength=num_nodes)
+        self.offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int32)
+
+        # 反向：按终点、起点排列
+        backward = np.lexsort((sources, targets))
+        self._reverse_sources = targets[backward].astype(np.int32)
+        self._reverse_targets = sources[backward].astype(np.int32)
+        reverse_counts = np.bincount(self._reverse_sources, minlength=num_nodes)
+        self.reverse_offsets = np.concatenate(([0], np.cumsum(reverse_counts))).astype(np.int32)
+
+        self.targets[True] = self._edge_targets.copy()
+        self.degrees[True] = counts.astype(np.int32)
+        self.reverse_targets[True] = self._reverse_targets.copy()
+        self.reverse_degrees[True] = reverse_counts.astype(np.int32)
+        self._successors[True] = self._rows(self.offsets, self.targets[True], self.degrees[True])
+        self._predecessors[True] = self._rows(
+            self.reverse_offsets, self.reverse_targets[True], self.reverse_degrees[True]
+        )
+        self.structure_version = grid.structure_version
+        self._build_loaded()
+
+    def _build_loaded(self) -> None:
+        """构建满车邻接表：每行把可进入的目标稳定地排到前面"""
+        passable = self.grid.passable_mask(False)
+        num_nodes = self.grid.num_nodes
+
+        blocked = ~passable[self._edge_targets]
+        order = np.lexsort((np.arange(len(self._edge_targets)), blocked, self._edge_sources))
+        self.targets[False] = self._edge_targets[order]
+        self.degrees[False] = np.bincount(
+            self._edge_sources[~blocked], minlength=num_nodes
+        ).astype(np.int32)
+
+        # 反向表中，目标格子不可进入时整行失效
+        self.reverse_targets[False] = self._reverse_targets.copy()
+        self.reverse_degrees[False] = (self.reverse_degrees[True] * passable).astype(np.int32)
+
+        self._successors[False] = self._rows(self.offsets, self.targets[False], self.degrees[False])
+        self._predecessors[False] = self._rows(
+            self.reverse_offsets, self.reverse_targets[False], self.reverse_degrees[False]
+        )
+        self.cargo_version = self.grid.cargo_version
+
+    @staticmethod
+    def _rows(offsets: np.ndarray, targets: np.ndarray, degrees: np.ndarray) -> List[List[int]]:
+        offsets = offsets.tolist()
+        targets = targets.tolist()
+        degrees = degrees.tolist()
+        return [targets[start:start + degree] for start, degree in zip(offsets, degrees)]
+
+    def _on_cargo_changed(self, node: int) -> None:
+        """货物变化时只修补满车表中进入该格子的边"""
+        if self.structure_version != self.grid.structure_version:
+            return
+        if self.cargo_version + 1 != self.grid.cargo_version:
+            # 中间有未收到的变化，交给 ensure_current 重建
+            return
+        if self.grid.cell_types[node] != CELL_NORMAL_CHANNEL:
+            self.cargo_version = self.grid.cargo_version
+            return
+
+        passable = not self.grid.cargo[node]
+        start, end = int(self.reverse_offsets[node]), int(self.reverse_offsets[node + 1])
+        self.reverse_degrees[False][node] = (end - start) if passable else 0
+        self._predecessors[False][node] = self._reverse_targets[start:end].tolist() if passable else []
+
+        targets = self.targets[False]
+        for predecessor in self._predecessors[True][node]:
+            row_start, row_end = int(self.offsets[predecessor]), int(self.offsets[predecessor + 1])
+            full_row = self._edge_targets[row_start:row_end].tolist()
+            row_passable = [t for t in full_row if self.grid.can_pass_node(t, False)]
+            row_blocked = [t for t in full_row if not self.grid.can_pass_node(t, False)]
+            targets[row_start:row_end] = row_passable + row_blocked
+            self.degrees[False][predecessor] = len(row_passable)
+            self._successors[False][predecessor] = row_passable
+        self.cargo_version = self.grid.cargo_version
+
+    def successors(self, is_empty: bool) -> List[List[int]]:
+        """节点 -> 可进入的后继节点列表"""
+        return self._successors[is_empty]
+
+    def predecessors(self, is_empty: bool) -> List[List[int]]:
+        """节点 -> 可由之进入该节点的前驱节点列表"""
+        return self._predecessors[is_empty]
+
+    def neighbors(self, node: int, is_empty: bool) -> List[int]:
+        """获取后继节点"""
+        return self._successors[is_empty][node]
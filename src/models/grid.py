@@ -1,69 +1,206 @@
-from typing import List, Tuple, Optional, Dict
-from dataclasses import dataclass
+from typing import List, Tuple, Optional, Dict, Iterator, Callable
+from collections.abc import Mapping
+import hashlib
 import json
-import pandas as pd
+import os
+import struct
+import numpy as np
 
 # 使用字典替代枚举
 DIRECTION_MAP = {"up": (0, -1), "down": (0, 1), "left": (-1, 0), "right": (1, 0)}
 
+# 方向位掩码，顺序与 DIRECTION_MAP 一致
+DIRECTION_BITS = {"up": 1, "down": 2, "left": 4, "right": 8}
+DIRECTION_STEPS = [(DIRECTION_BITS[d], dx, dy) for d, (dx, dy) in DIRECTION_MAP.items()]
+
 # 使用字符串常量替代枚举
 GRID_TYPE_NORMAL_CHANNEL = "normal_channel"
 GRID_TYPE_MAIN_CHANNEL = "main_channel"
 GRID_TYPE_OBSTACLE = "obstacle"
 
+# 格子类型在数组中的编码
+CELL_NORMAL_CHANNEL = 0
+CELL_MAIN_CHANNEL = 1
+CELL_OBSTACLE = 2
+GRID_TYPE_CODES = {
+    GRID_TYPE_NORMAL_CHANNEL: CELL_NORMAL_CHANNEL,
+    GRID_TYPE_MAIN_CHANNEL: CELL_MAIN_CHANNEL,
+    GRID_TYPE_OBSTACLE: CELL_OBSTACLE,
+}
+GRID_TYPES = [GRID_TYPE_NORMAL_CHANNEL, GRID_TYPE_MAIN_CHANNEL, GRID_TYPE_OBSTACLE]
+
+# 地图文件格式
+MAP_FORMAT_JSON = "json"  # 每个格子一个对象，便于阅读和手工修改
+MAP_FORMAT_BINARY = "binary"  # 头部加原始数组，可以内存映射加载
+
+# 二进制地图：魔数、格式版本、头部长度，随后是 JSON 头部，再之后是按对齐填充的数组
+MAP_BINARY_MAGIC = b"GRIDMAP\0"
+MAP_BINARY_VERSION = 1
+MAP_BINARY_PREFIX = struct.Struct("<8sII")
+MAP_BINARY_ALIGNMENT = 64
+MAP_BINARY_ARRAYS = (("cell_types", np.uint8), ("direction_masks", np.uint8), ("cargo", np.bool_))
+
+# Excel 地图中的方向文字
+EXCEL_DIRECTIONS = {"上": "up", "下": "down", "左": "left", "右": "right"}
+# Excel 解析规则变化时递增，使旧的编译缓存失效
+EXCEL_COMPILER_VERSION = 1
+
+
+def directions_to_mask(directions: List[str]) -> int:
+    """方向列表转位掩码"""
+    mask = 0
+    for direction in directions:
+        mask |= DIRECTION_BITS[direction]
+    return mask
+
+
+def mask_to_directions(mask: int) -> List[str]:
+    """位掩码转方向列表"""
+    return [d for d, bit in DIRECTION_BITS.items() if mask & bit]
+
 
-@dataclass
 class GridCell:
-    x: int
-    y: int
-    grid_type: str = GRID_TYPE_NORMAL_CHANNEL
-    allowed_directions: List[str] = None
-    has_cargo: bool = False
+    """格子视图，属性直接读写所属 Grid 的数组"""
+
+    __slots__ = ("grid", "x", "y", "node")
+
+    def __init__(self, grid: "Grid", x: int, y: int):
+        self.grid = grid
+        self.x = x
+        self.y = y
+        self.node = y * grid.width + x
+
+    @property
+    def grid_type(self) -> str:
+        return GRID_TYPES[self.grid.cell_types[self.node]]
+
+    @grid_type.setter
+    def grid_type(self, grid_type: str) -> None:
+        self.grid.set_cell_type(self.x, self.y, grid_type)
 
-    def __post_init__(self):
-        if self.allowed_directions is None:
-            self.allowed_directions = []
+    @property
+    def allowed_directions(self) -> List[str]:
+        return mask_to_directions(int(self.grid.direction_masks[self.node]))
+
+    @allowed_directions.setter
+    def allowed_directions(self, directions: List[str]) -> None:
+        self.grid.set_cell_directions(self.x, self.y, directions)
+
+    @property
+    def has_cargo(self) -> bool:
+        return bool(self.grid.cargo[self.node])
+
+    @has_cargo.setter
+    def has_cargo(self, has_cargo: bool) -> None:
+        self.grid.set_cargo(self.x, self.y, has_cargo)
 
     def can_pass(self, is_empty: bool) -> bool:
         """检查是否可以通行"""
-        if self.grid_type == GRID_TYPE_OBSTACLE:
-            return False
+        return self.grid.can_pass_node(self.node, is_empty)
+
+    def __repr__(self) -> str:
+        return (f"GridCell(x={self.x}, y={self.y}, grid_type={self.grid_type!r}, "
+                f"allowed_directions={self.allowed_directions}, has_cargo={self.has_cargo})")
 
-        if self.grid_type == GRID_TYPE_MAIN_CHANNEL:
-            return True
 
-        if self.grid_type == GRID_TYPE_NORMAL_CHANNEL:
-            if is_empty:
-                return True
-            return not self.has_cargo
+class GridCells(Mapping):
+    """(x, y) -> GridCell 的只读映射，按需生成格子视图"""
 
-        return False
+    def __init__(self, grid: "Grid"):
+        self.grid = grid
+
+    def __getitem__(self, position: Tuple[int, int]) -> GridCell:
+        x, y = position
+        if not self.grid.is_valid_position(x, y):
+            raise KeyError(position)
+        return GridCell(self.grid, x, y)
+
+    def __contains__(self, position) -> bool:
+        try:
+            x, y = position
+        except (TypeError, ValueError):
+            return False
+        return self.grid.is_valid_position(x, y)
+
+    def __iter__(self) -> Iterator[Tuple[int, int]]:
+        for y in range(self.grid.height):
+            for x in range(self.grid.width):
+                yield (x, y)
+
+    def __len__(self) -> int:
+        return self.grid.width * self.grid.height
 
 
 class Grid:
     def __init__(self, width: int, height: int):
-        self.width = width
-        self.height = height
-        self.cells: Dict[Tuple[int, int], GridCell] = {}
         self.entrances: List[Tuple[int, int]] = []
         self.exits: List[Tuple[int, int]] = []
         self.main_channel_rows: List[int] = []
         self.main_channel_columns: List[int] = []
+        self.cells = GridCells(self)
+
+        # 版本号：结构（尺寸、类型、方向）变化和货物变化分别计数
+        self.structure_version = 0
+        self.cargo_version = 0
+        self._cargo_listeners: List[Callable[[int], None]] = []
 
         # 初始化网格
-        for y in range(height):
-            for x in range(width):
-                self.cells[(x, y)] = GridCell(x, y)
+        self._allocate(width, height)
+
+    def _allocate(self, width: int, height: int, arrays: Optional[Dict[str, np.ndarray]] = None) -> None:
+        """按尺寸分配底层数组：格子类型、方向掩码、货物位；arrays 给出时直接采用"""
+        self.width = width
+        self.height = height
+        size = width * height
+        if arrays is None:
+            self.cell_types = np.full(size, CELL_NORMAL_CHANNEL, dtype=np.uint8)
+            self.direction_masks = np.zeros(size, dtype=np.uint8)
+            self.cargo = np.zeros(size, dtype=np.bool_)
+        else:
+            self.cell_types = arrays["cell_types"]
+            self.direction_masks = arrays["direction_masks"]
+            self.cargo = arrays["cargo"]
+        self.structure_version += 1
+
+    @property
+    def version(self) -> Tuple[int, int]:
+        """地图整体版本，任一部分变化都会改变"""
+        return (self.structure_version, self.cargo_version)
+
+    def add_cargo_listener(self, listener: Callable[[int], None]) -> None:
+        """注册货物变化回调，参数为发生变化的节点编号"""
+        if listener not in self._cargo_listeners:
+            self._cargo_listeners.append(listener)
+
+    def remove_cargo_listener(self, listener: Callable[[int], None]) -> None:
+        """注销货物变化回调"""
+        if listener in self._cargo_listeners:
+            self._cargo_listeners.remove(listener)
+
+    @property
+    def num_nodes(self) -> int:
+        return self.width * self.height
+
+    def node_id(self, x: int, y: int) -> int:
+        """坐标转节点编号"""
+        return y * self.width + x
+
+    def node_position(self, node: int) -> Tuple[int, int]:
+        """节点编号转坐标"""
+        y, x = divmod(node, self.width)
+        return (x, y)
 
     def set_cell_type(self, x: int, y: int, grid_type: str) -> None:
         """设置格子类型"""
-        if (x, y) in self.cells:
-            self.cells[(x, y)].grid_type = grid_type
+        if self.is_valid_position(x, y):
+            self.cell_types[y * self.width + x] = GRID_TYPE_CODES[grid_type]
+            self.structure_version += 1
 
     def set_cell_directions(self, x: int, y: int, directions: List[str]) -> None:
         """设置格子允许的方向"""
-        if (x, y) in self.cells:
-            self.cells[(x, y)].allowed_directions = directions
+        if self.is_valid_position(x, y):
+            self.direction_masks[y * self.width + x] = directions_to_mask(directions)
+            self.structure_version += 1
 
     def add_entrance(self, x: int, y: int) -> None:
         """添加入口"""
@@ -77,31 +214,57 @@ class Grid:
 
     def get_cell(self, x: int, y: int) -> Optional[GridCell]:
         """获取格子"""
-        return self.cells.get((x, y))
-
-    def get_neighbors(self, x: int, y: int, is_empty: bool) -> List[Tuple[int, int]]:
-        """获取相邻格子"""
+        if not self.is_valid_position(x, y):
+            return None
+        return GridCell(self, x, y)
+
+    def get_positions_by_type(self, grid_type: str) -> List[Tuple[int, int]]:
+        """按行优先顺序返回指定类型的所有格子坐标"""
+        nodes = np.flatnonzero(self.cell_types == GRID_TYPE_CODES[grid_type])
+        return [self.node_position(int(node)) for node in nodes]
+
+    def can_pass_node(self, node: int, is_empty: bool) -> bool:
+        """检查节点是否可以通行"""
+        cell_type = self.cell_types[node]
+        if cell_type == CELL_OBSTACLE:
+            return False
+        if cell_type == CELL_MAIN_CHANNEL:
+            return True
+        # 普通通道，空车可以穿行，满车不能通过有货物的格子
+        return is_empty or not self.cargo[node]
+
+    def passable_mask(self, is_empty: bool) -> np.ndarray:
+        """整张地图的可通行掩码"""
+        passable = self.cell_types != CELL_OBSTACLE
+        if not is_empty:
+            passable &= ~((self.cell_types == CELL_NORMAL_CHANNEL) & self.cargo)
+        return passable
+
+    def get_neighbor_nodes(self, node: int, is_empty: bool) -> List[int]:
+        """获取相邻节点编号"""
+        width = self.width
+        y, x = divmod(node, width)
+        mask = int(self.direction_masks[node])
         neighbors = []
-        current_cell = self.get_cell(x, y)
-        if not current_cell:
-            return neighbors
-
-        for direction in current_cell.allowed_directions:
-            dx, dy = DIRECTION_MAP[direction]
+        for bit, dx, dy in DIRECTION_STEPS:
+            if not mask & bit:
+                continue
             new_x = x + dx
             new_y = y + dy
-
             # 检查边界
-            if not (0 <= new_x < self.width and 0 <= new_y < self.height):
+            if not (0 <= new_x < width and 0 <= new_y < self.height):
                 continue
-
-            # 检查是否可以通行
-            neighbor_cell = self.get_cell(new_x, new_y)
-            if neighbor_cell and neighbor_cell.can_pass(is_empty):
-                neighbors.append((new_x, new_y))
-
+            neighbor = new_y * width + new_x
+            if self.can_pass_node(neighbor, is_empty):
+                neighbors.append(neighbor)
         return neighbors
 
+    def get_neighbors(self, x: int, y: int, is_empty: bool) -> List[Tuple[int, int]]:
+        """获取相邻格子"""
+        if not self.is_valid_position(x, y):
+            return []
+        return [self.node_position(n) for n in self.get_neighbor_nodes(y * self.width + x, is_empty)]
+
     def is_valid_position(self, x: int, y: int) -> bool:
         """检查位置是否有效"""
         return 0 <= x < self.width and 0 <= y < self.height
@@ -116,28 +279,39 @@ class Grid:
 
     def has_cargo(self, x: int, y: int) -> bool:
         """检查格子是否有货物"""
-        cell = self.get_cell(x, y)
-        return cell.has_cargo if cell else False
+        if not self.is_valid_position(x, y):
+            return False
+        return bool(self.cargo[y * self.width + x])
 
     def set_cargo(self, x: int, y: int, has_cargo: bool) -> None:
         """设置格子是否有货物"""
-        if (x, y) in self.cells:
-            self.cells[(x, y)].has_cargo = has_cargo
+        if not self.is_valid_position(x, y):
+            return
+        node = y * self.width + x
+        if bool(self.cargo[node]) == bool(has_cargo):
+            return
+        self.cargo[node] = has_cargo
+        self.cargo_version += 1
+        for listener in list(self._cargo_listeners):
+            listener(node)
 
     def save_to_json(self, filename: str) -> None:
         """将地图保存为 JSON 文件"""
+        cell_types = self.cell_types.tolist()
+        direction_masks = self.direction_masks.tolist()
+        cargo = self.cargo.tolist()
         map_data = {
             "width": self.width,
             "height": self.height,
             "cells": [
                 {
-                    "x": x,
-                    "y": y,
-                    "grid_type": cell.grid_type,
-                    "allowed_directions": cell.allowed_directions,
-                    "has_cargo": cell.has_cargo,
+                    "x": node % self.width,
+                    "y": node // self.width,
+                    "grid_type": GRID_TYPES[cell_types[node]],
+                    "allowed_directions": mask_to_directions(direction_masks[node]),
+                    "has_cargo": cargo[node],
                 }
-                for (x, y), cell in self.cells.items()
+                for node in range(self.num_nodes)
             ],
             "entrances": self.entrances,
             "exits": self.exits,
@@ -152,69 +326,166 @@ class Grid:
             map_data = json.load(f)
 
         # 初始化网格
-        self.width = map_data["width"]
-        self.height = map_data["height"]
-        self.cells.clear()
+        self._allocate(map_data["width"], map_data["height"])
         for cell_data in map_data["cells"]:
-            x, y = cell_data["x"], cell_data["y"]
-            grid_type = cell_data["grid_type"]
-            allowed_directions = cell_data["allowed_directions"]
-            has_cargo = cell_data["has_cargo"]
-            self.cells[(x, y)] = GridCell(x, y, grid_type, allowed_directions, has_cargo)
+            node = self.node_id(cell_data["x"], cell_data["y"])
+            self.cell_types[node] = GRID_TYPE_CODES[cell_data["grid_type"]]
+            self.direction_masks[node] = directions_to_mask(cell_data["allowed_directions"])
+            self.cargo[node] = cell_data["has_cargo"]
 
         # 设置入口和出口
         self.entrances = [tuple(pos) for pos in map_data["entrances"]]
         self.exits = [tuple(pos) for pos in map_data["exits"]]
 
-    def load_map_from_excel(self, path: str) -> None:
+    def save_to_binary(self, filename: str) -> None:
+        """将地图保存为二进制格式
+
+        先写临时文件再替换，正在内存映射旧文件的地图不受影响。
+        """
+        size = self.num_nodes
+        arrays = []
+        offset = 0
+        for name, dtype in MAP_BINARY_ARRAYS:
+            arrays.append({"name": name, "dtype": np.dtype(dtype).str, "offset": offset, "count": size})
+            offset += size * np.dtype(dtype).itemsize
+            offset = -(-offset // MAP_BINARY_ALIGNMENT) * MAP_BINARY_ALIGNMENT
+        header = json.dumps({
+            "width": self.width,
+            "height": self.height,
+            "entrances": self.entrances,
+            "exits": self.exits,
+            "arrays": arrays,
+        }).encode("utf-8")
+        data_start = -(-(MAP_BINARY_PREFIX.size + len(header)) // MAP_BINARY_ALIGNMENT) * MAP_BINARY_ALIGNMENT
+        header = header.ljust(data_start - MAP_BINARY_PREFIX.size, b" ")
+
+        temp_filename = f"{filename}.tmp{os.getpid()}"
+        with open(temp_filename, "wb") as f:
+            f.write(MAP_BINARY_PREFIX.pack(MAP_BINARY_MAGIC, MAP_BINARY_VERSION, len(header)))
+            f.write(header)
+            for descriptor, (name, dtype) in zip(arrays, MAP_BINARY_ARRAYS):
+                f.seek(data_start + descriptor["offset"])
+                f.write(np.ascontiguousarray(getattr(self, name), dtype=dtype).tobytes())
+        os.replace(temp_filename, filename)
+
+    def load_from_binary(self, filename: str, mmap: bool = True) -> None:
+        """从二进制文件加载地图
+
+        mmap 为 True 时数组以写时复制方式映射文件，加载不逐格处理，修改货物等
+        只影响内存中的副本，不会写回文件。
+        """
+        with open(filename, "rb") as f:
+            prefix = f.read(MAP_BINARY_PREFIX.size)
+            if len(prefix) != MAP_BINARY_PREFIX.size:
+                raise ValueError(f"不是二进制地图文件: {filename}")
+            magic, version, header_length = MAP_BINARY_PREFIX.unpack(prefix)
+            if magic != MAP_BINARY_MAGIC:
+                raise ValueError(f"不是二进制地图文件: {filename}")
+            if version > MAP_BINARY_VERSION:
+                raise ValueError(f"不支持的地图格式版本 {version}: {filename}")
+            header = json.loads(f.read(header_length).decode("utf-8"))
+        data_start = MAP_BINARY_PREFIX.size + header_length
+        width, height = header["width"], header["height"]
+        descriptors = {descriptor["name"]: descriptor for descriptor in header["arrays"]}
+
+        arrays = {}
+        for name, dtype in MAP_BINARY_ARRAYS:
+            descriptor = descriptors[name]
+            if descriptor["count"] != width * height or np.dtype(descriptor["dtype"]) != np.dtype(dtype):
+                raise ValueError(f"地图文件中的数组 {name} 与尺寸或类型不符: {filename}")
+            if mmap:
+                array = np.memmap(filename, dtype=dtype, mode="c", offset=data_start + descriptor["offset"],
+                                  shape=(descriptor["count"],)).view(np.ndarray)
+            else:
+                array = np.fromfile(filename, dtype=dtype, count=descriptor["count"],
+                                    offset=data_start + descriptor["offset"])
+            arrays[name] = array
+
+        self._allocate(width, height, arrays)
+        self.entrances = [tuple(pos) for pos in header["entrances"]]
+        self.exits = [tuple(pos) for pos in header["exits"]]
+
+    def save(self, filename: str, map_format: str = MAP_FORMAT_JSON) -> None:
+        """按指定格式保存地图"""
+        if map_format == MAP_FORMAT_JSON:
+            self.save_to_json(filename)
+        elif map_format == MAP_FORMAT_BINARY:
+            self.save_to_binary(filename)
+        else:
+            raise ValueError(f"未知的地图格式: {map_format}")
+
+    def load(self, filename: str) -> None:
+        """按文件内容识别格式并加载地图"""
+        with open(filename, "rb") as f:
+            magic = f.read(len(MAP_BINARY_MAGIC))
+        if magic == MAP_BINARY_MAGIC:
+            self.load_from_binary(filename)
+        else:
+            self.load_from_json(filename)
+
+    def load_map_from_excel(self, path: str, cache_dir: Optional[str] = None) -> None:
+        """从 Excel 加载地图
+
+        cache_dir 给出时，编译结果按源文件内容的哈希以二进制格式缓存在该目录，
+        源文件未变化时直接加载缓存，不再读取 Excel。
+        """
+        cache_filename = None
+        if cache_dir is not None:
+            with open(path, "rb") as f:
+                digest = hashlib.sha256(f.read())
+            digest.update(f"excel-map-v{EXCEL_COMPILER_VERSION}".encode("utf-8"))
+            stem = os.path.splitext(os.path.basename(path))[0]
+            cache_filename = os.path.join(cache_dir, f"{stem}-{digest.hexdigest()[:16]}.bin")
+            if os.path.exists(cache_filename):
+                try:
+                    self.load_from_binary(cache_filename)
+                    self.main_channel_rows.clear()
+                    self.main_channel_columns.clear()
+                    return
+                except (ValueError, KeyError, OSError):
+                    pass  # 缓存损坏或格式过旧时重新编译
+
+        self._compile_excel(path)
+        if cache_filename is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            self.save_to_binary(cache_filename)
+
+    def _compile_excel(self, path: str) -> None:
+        """对整张表做向量化的字符串匹配，得到格子类型、方向和入口出口"""
+        import pandas as pd  # 只有编译 Excel 时才需要，缓存命中时不导入
+
         df = pd.read_excel(path, header=None)
         df = df.iloc[1:, 1:]  # 跳过第一行和第一列
-
         rows, cols = df.shape
-        self.width = cols
-        self.height = rows
-        self.cells.clear()
-        self.entrances.clear()
-        self.exits.clear()
+
+        values = pd.Series(df.to_numpy(dtype=object).ravel())
+        text = values.where(values.notna(), "").astype(str)
+
+        def contains(keyword: str) -> np.ndarray:
+            return text.str.contains(keyword, regex=False).to_numpy()
+
+        filled = (text != "").to_numpy()
+        disabled = contains("禁用")
+        port = filled & ~disabled & contains("接驳口")
+        road = contains("道")
+        storage = contains("货")
+        # 与逐格判断的优先级一致：禁用 > 接驳口 > 道 > 货，其余为障碍
+        cell_types = np.select(
+            [~filled | disabled, port | road, storage],
+            [CELL_OBSTACLE, CELL_MAIN_CHANNEL, CELL_NORMAL_CHANNEL],
+            default=CELL_OBSTACLE,
+        ).astype(np.uint8)
+        direction_masks = np.zeros(rows * cols, dtype=np.uint8)
+        for zh_dir, en_dir in EXCEL_DIRECTIONS.items():
+            direction_masks[filled & contains(zh_dir)] |= DIRECTION_BITS[en_dir]
+
+        self._allocate(cols, rows, {
+            "cell_types": cell_types,
+            "direction_masks": direction_masks,
+            "cargo": np.zeros(rows * cols, dtype=np.bool_),
+        })
+        ports = [(int(node % cols), int(node // cols)) for node in np.flatnonzero(port)]
+        self.entrances = list(ports)
+        self.exits = list(ports)
         self.main_channel_rows.clear()
         self.main_channel_columns.clear()
-
-        direction_map = {"上": "up", "下": "down", "左": "left", "右": "right"}
-
-        for y in range(rows):
-            for x in range(cols):
-                cell_text = str(df.iat[y, x]) if pd.notna(df.iat[y, x]) else ""
-                grid_type = GRID_TYPE_OBSTACLE
-                allowed_directions = []
-
-                if cell_text == "":
-                    cell = GridCell(
-                        x=x,
-                        y=y,
-                        grid_type=grid_type,
-                        allowed_directions=allowed_directions,
-                    )
-                    self.cells[(x, y)] = cell
-                    continue  # 跳过空格子
-
-                # 判断类型
-                if "禁用" in cell_text:
-                    grid_type = GRID_TYPE_OBSTACLE
-                elif "接驳口" in cell_text:
-                    grid_type = GRID_TYPE_MAIN_CHANNEL
-                    self.add_entrance(x, y)
-                    self.add_exit(x, y)
-                elif "道" in cell_text:
-                    grid_type = GRID_TYPE_MAIN_CHANNEL
-                elif "货" in cell_text:
-                    grid_type = GRID_TYPE_NORMAL_CHANNEL
-
-                # 解析方向
-                for zh_dir, en_dir in direction_map.items():
-                    if zh_dir in cell_text:
-                        allowed_directions.append(en_dir)
-
-                cell = GridCell(
-                    x=x, y=y, grid_type=grid_type, allowed_directions=allowed_directions
-                )
-                self.cells[(x, y)] = cell
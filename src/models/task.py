@@ -1,6 +1,9 @@
 from dataclasses import dataclass
-from typing import List, Tuple, Optional
+from typing import List, Tuple, Optional, Dict, Any, Iterator
 from datetime import datetime
+import heapq
+import itertools
+from ..utils.events import events
 
 # 使用字符串常量替代枚举
 TASK_TYPE_INBOUND = "inbound"
@@ -12,6 +15,17 @@ TASK_STATUS_IN_PROGRESS = "in_progress"
 TASK_STATUS_COMPLETED = "completed"
 TASK_STATUS_FAILED = "failed"
 
+TASK_STATUSES = (
+    TASK_STATUS_PENDING,
+    TASK_STATUS_ASSIGNED,
+    TASK_STATUS_IN_PROGRESS,
+    TASK_STATUS_COMPLETED,
+    TASK_STATUS_FAILED,
+)
+
+# Fields whose changes are reported to the owning TaskManager's indexes
+INDEXED_FIELDS = frozenset(("status", "priority", "created_at", "assigned_vehicle"))
+
 
 @dataclass
 class TransportTask:
@@ -30,6 +44,31 @@ class TransportTask:
         if self.created_at is None:
             self.created_at = datetime.now()
 
+    def __setattr__(self, name: str, value: Any) -> None:
+        if name in INDEXED_FIELDS:
+            listener = self.__dict__.get("_listener")
+            if listener is not None:
+                old = self.__dict__.get(name)
+                object.__setattr__(self, name, value)
+                if old != value:
+                    listener(self, name, old)
+                return
+        object.__setattr__(self, name, value)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "TransportTask":
+        """Build a task from a saved record (the format written by Scheduler.save_tasks)"""
+        created_at = data.get("created_at")
+        return cls(
+            id=data["id"],
+            task_type=data["task_type"],
+            start_position=tuple(data["start_position"]),
+            end_position=tuple(data["end_position"]),
+            priority=data.get("priority", 0),
+            created_at=datetime.fromisoformat(created_at) if created_at else None,
+            status=data.get("status", TASK_STATUS_PENDING),
+        )
+
     def assign_to_vehicle(self, vehicle_id: str) -> None:
         """Assign task to a vehicle"""
         self.assigned_vehicle = vehicle_id
@@ -56,12 +95,52 @@ class TransportTask:
 
 
 class TaskManager:
-    """Task queue manager"""
+    """Task queue manager
+
+    Tasks are indexed by id, by status and by assigned vehicle, and pending
+    tasks are kept in a (priority, created_at) heap. Tasks report changes to
+    indexed fields through a listener, so the indexes stay current however
+    the status is changed.
+    """
 
     def __init__(self):
-        self.tasks: List[TransportTask] = []
+        self._tasks: Dict[str, TransportTask] = {}
+        self._by_status: Dict[str, Dict[str, TransportTask]] = {status: {} for status in TASK_STATUSES}
+        self._by_vehicle: Dict[str, Dict[str, TransportTask]] = {}
+        # Pending heap entries: (-priority, created_at, sequence, task id); stale entries are skipped lazily
+        self._pending_heap: List[Tuple[int, datetime, int, str]] = []
+        self._stale_entries = 0  # heap entries that no longer describe a pending task
+        self._sequence = itertools.count()
         self._next_task_id = 1
 
+    @property
+    def tasks(self) -> Tuple[TransportTask, ...]:
+        """All tasks in insertion order, as a read-only snapshot
+
+        Use add_task / insert_task / remove_task to modify the queue, and
+        iter_tasks() or len() when a copy is not needed.
+        """
+        return tuple(self._tasks.values())
+
+    @tasks.setter
+    def tasks(self, tasks: List[TransportTask]) -> None:
+        for task in self._tasks.values():
+            task._listener = None
+        self._tasks = {}
+        self._by_status = {status: {} for status in TASK_STATUSES}
+        self._by_vehicle = {}
+        self._pending_heap = []
+        self._stale_entries = 0
+        for task in tasks:
+            self.insert_task(task)
+
+    def iter_tasks(self) -> Iterator[TransportTask]:
+        """Iterate over all tasks in insertion order without copying; do not modify the queue meanwhile"""
+        return iter(self._tasks.values())
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
     def add_task(self, task_type: str, start_pos: Tuple[int, int],
                  end_pos: Tuple[int, int], priority: int = 0) -> TransportTask:
         """Add a new task to the queue"""
@@ -75,64 +154,131 @@ class TaskManager:
             end_position=end_pos,
             priority=priority
         )
-        self.tasks.append(task)
+        self.insert_task(task)
+        return task
+
+    def insert_task(self, task: TransportTask) -> TransportTask:
+        """Add an existing task (e.g. loaded from a file) to the queue"""
+        if task.id in self._tasks:
+            raise ValueError(f"Duplicate task id: {task.id}")
+        self._tasks[task.id] = task
+        self._index(task)
+        task._listener = self._on_task_changed
+        # Keep generated ids clear of ids that came from outside
+        if task.id.startswith("T") and task.id[1:].isdigit():
+            self._next_task_id = max(self._next_task_id, int(task.id[1:]) + 1)
         return task
 
+    def _index(self, task: TransportTask) -> None:
+        self._by_status.setdefault(task.status, {})[task.id] = task
+        if task.assigned_vehicle is not None:
+            self._by_vehicle.setdefault(task.assigned_vehicle, {})[task.id] = task
+        if task.status == TASK_STATUS_PENDING:
+            self._push_pending(task)
+
+    def _unindex(self, task: TransportTask) -> None:
+        self._by_status.get(task.status, {}).pop(task.id, None)
+        if task.assigned_vehicle is not None:
+            self._drop_vehicle_entry(task.assigned_vehicle, task.id)
+
+    def _drop_vehicle_entry(self, vehicle_id: str, task_id: str) -> None:
+        tasks = self._by_vehicle.get(vehicle_id)
+        if tasks is not None:
+            tasks.pop(task_id, None)
+            if not tasks:
+                del self._by_vehicle[vehicle_id]
+
+    def _push_pending(self, task: TransportTask) -> None:
+        heapq.heappush(self._pending_heap, (-task.priority, task.created_at, next(self._sequence), task.id))
+
+    def _discard_pending(self) -> None:
+        """Count one heap entry as stale; rebuild the heap once stale entries outnumber live ones"""
+        self._stale_entries += 1
+        pending = self._by_status[TASK_STATUS_PENDING]
+        if self._stale_entries > len(pending):
+            self._pending_heap = [(-task.priority, task.created_at, next(self._sequence), task.id)
+                                  for task in pending.values()]
+            heapq.heapify(self._pending_heap)
+            self._stale_entries = 0
+
+    def _on_task_changed(self, task: TransportTask, name: str, old: Any) -> None:
+        """Keep the indexes in step with a change to one of the task's indexed fields"""
+        if name == "status":
+            self._by_status.get(old, {}).pop(task.id, None)
+            self._by_status.setdefault(task.status, {})[task.id] = task
+            if task.status == TASK_STATUS_PENDING:
+                self._push_pending(task)
+            elif old == TASK_STATUS_PENDING:
+                self._discard_pending()
+        elif name == "assigned_vehicle":
+            if old is not None:
+                self._drop_vehicle_entry(old, task.id)
+            if task.assigned_vehicle is not None:
+                self._by_vehicle.setdefault(task.assigned_vehicle, {})[task.id] = task
+        elif task.status == TASK_STATUS_PENDING:
+            # Priority or creation time changed: the old heap entry becomes stale
+            self._push_pending(task)
+            self._discard_pending()
+
+    def _is_current(self, entry: Tuple[int, datetime, int, str]) -> bool:
+        """Whether a heap entry still describes a pending task"""
+        neg_priority, created_at, _, task_id = entry
+        task = self._tasks.get(task_id)
+        return (task is not None and task.status == TASK_STATUS_PENDING
+                and task.priority == -neg_priority and task.created_at == created_at)
+
     def get_next_task(self) -> Optional[TransportTask]:
         """Get the next available task based on priority and creation time"""
-        available_tasks = [t for t in self.tasks
-                           if t.status == TASK_STATUS_PENDING]
-        if not available_tasks:
-            return None
-
-        # Sort by priority (descending) and creation time (ascending)
-        return sorted(available_tasks,
-                      key=lambda t: (-t.priority, t.created_at))[0]
+        heap = self._pending_heap
+        while heap:
+            if self._is_current(heap[0]):
+                return self._tasks[heap[0][3]]
+            heapq.heappop(heap)
+            self._stale_entries = max(0, self._stale_entries - 1)
+        return None
 
     def get_tasks_by_status(self, status: str) -> List[TransportTask]:
         """Get all tasks with specified status"""
-        print(f"\n=== 获取状态为 {status} 的任务 ===")
-        print(f"当前所有任务:")
-        for task in self.tasks:
-            print(f"任务 {task.id}: 类型={task.task_type}, 状态={task.status}")
-
-        matching_tasks = [t for t in self.tasks if t.status == status]
-        print(f"找到 {len(matching_tasks)} 个匹配的任务")
-        for task in matching_tasks:
-            print(f"匹配任务 {task.id}: 类型={task.task_type}, 状态={task.status}")
-
+        matching_tasks = list(self._by_status.get(status, {}).values())
+        events.debug("tasks.by_status", "状态为 {status} 的任务 {count}/{total} 个",
+                     status=status, count=len(matching_tasks), total=len(self._tasks))
         return matching_tasks
 
+    def count_by_status(self, status: str) -> int:
+        """Number of tasks with specified status"""
+        return len(self._by_status.get(status, ()))
+
     def get_tasks_by_vehicle(self, vehicle_id: str) -> List[TransportTask]:
         """Get all tasks assigned to a specific vehicle"""
-        return [t for t in self.tasks if t.assigned_vehicle == vehicle_id]
+        return list(self._by_vehicle.get(vehicle_id, {}).values())
 
     def get_task_by_id(self, task_id: str) -> Optional[TransportTask]:
         """Get task by ID"""
-        for task in self.tasks:
-            if task.id == task_id:
-                return task
-        return None
+        return self._tasks.get(task_id)
 
     def remove_task(self, task_id: str) -> bool:
         """Remove a task from the queue"""
-        task = self.get_task_by_id(task_id)
-        if task:
-            self.tasks.remove(task)
-            return True
-        return False
+        task = self._tasks.pop(task_id, None)
+        if task is None:
+            return False
+        self._unindex(task)
+        task._listener = None
+        if task.status == TASK_STATUS_PENDING:
+            self._discard_pending()
+        return True
 
     def clear_completed_tasks(self) -> None:
         """Remove all completed tasks from the queue"""
-        self.tasks = [t for t in self.tasks if t.status != TASK_STATUS_COMPLETED]
+        for task_id in list(self._by_status[TASK_STATUS_COMPLETED]):
+            self.remove_task(task_id)
 
     def get_queue_status(self) -> dict:
         """Get current queue status"""
         return {
-            "total_tasks": len(self.tasks),
-            "pending": len(self.get_tasks_by_status(TASK_STATUS_PENDING)),
-            "assigned": len(self.get_tasks_by_status(TASK_STATUS_ASSIGNED)),
-            "in_progress": len(self.get_tasks_by_status(TASK_STATUS_IN_PROGRESS)),
-            "completed": len(self.get_tasks_by_status(TASK_STATUS_COMPLETED)),
-            "failed": len(self.get_tasks_by_status(TASK_STATUS_FAILED))
+            "total_tasks": len(self._tasks),
+            "pending": self.count_by_status(TASK_STATUS_PENDING),
+            "assigned": self.count_by_status(TASK_STATUS_ASSIGNED),
+            "in_progress": self.count_by_status(TASK_STATUS_IN_PROGRESS),
+            "completed": self.count_by_status(TASK_STATUS_COMPLETED),
+            "failed": self.count_by_status(TASK_STATUS_FAILED)
         }
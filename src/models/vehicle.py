@@ -2,6 +2,7 @@ from typing import Optional, Tuple, List
 from dataclasses import dataclass
 from datetime import datetime
 from .task import TransportTask
+from ..utils.events import events, LEVEL_DEBUG
 
 # 使用字符串常量替代枚举
 VEHICLE_TYPE_EMPTY = "empty"
@@ -36,32 +37,29 @@ class Vehicle:
 
     def assign_task(self, task: TransportTask) -> bool:
         """Assign a task to the vehicle"""
-        print(f"\n=== 分配任务 ===")
-        print(f"车辆 {self.id} 当前状态: {self.status}")
-        print(f"任务 {task.id} 当前状态: {task.status}")
-        
+        events.debug("vehicle.assign", "车辆 {vehicle} ({status}) 分配任务 {task} ({task_status})",
+                     vehicle=self.id, status=self.status, task=task.id, task_status=task.status)
+
         # 检查车辆状态
         if self.status != VEHICLE_STATUS_IDLE:
-            print(f"错误：车辆状态不是空闲状态，当前状态: {self.status}")
+            events.warning("vehicle.assign_rejected", "错误：车辆 {vehicle} 不是空闲状态，当前状态: {status}",
+                           vehicle=self.id, status=self.status)
             return False
-        
+
         if self.current_task:
-            print(f"错误：车辆已有任务 {self.current_task.id}")
+            events.warning("vehicle.assign_rejected", "错误：车辆 {vehicle} 已有任务 {task}",
+                           vehicle=self.id, task=self.current_task.id)
             return False
-        
-        print(f"开始分配任务")
+
         try:
             # 更新任务状态
             task.assign_to_vehicle(self.id)
             # 更新车辆状态
             self.current_task = task
             self.target_position = task.end_position
-            print(f"任务分配完成")
-            print(f"车辆状态: {self.status}")
-            print(f"任务状态: {task.status}")
             return True
         except Exception as e:
-            print(f"分配任务时发生错误: {str(e)}")
+            events.error("vehicle.assign_failed", "分配任务时发生错误: {error}", vehicle=self.id, error=str(e))
             # 发生错误时恢复状态
             self.current_task = None
             self.target_position = None
@@ -69,38 +67,36 @@ class Vehicle:
 
     def start_task(self) -> None:
         """Start executing the current task"""
-        print(f"\n=== 启动任务 ===")
-        print(f"车辆 {self.id} 当前状态: {self.status}")
-        print(f"任务 {self.current_task.id if self.current_task else 'None'} 当前状态: {self.current_task.status if self.current_task else 'None'}")
-        
         # 检查车辆和任务状态
         if not self.current_task:
-            print(f"错误：车辆没有当前任务")
+            events.warning("vehicle.start_rejected", "错误：车辆 {vehicle} 没有当前任务", vehicle=self.id)
             return
-        
+
+        events.debug("vehicle.start", "车辆 {vehicle} ({status}) 启动任务 {task} ({task_status})",
+                     vehicle=self.id, status=self.status, task=self.current_task.id,
+                     task_status=self.current_task.status)
+
         if self.status != VEHICLE_STATUS_IDLE:
-            print(f"错误：车辆状态不是空闲状态，当前状态: {self.status}")
+            events.warning("vehicle.start_rejected", "错误：车辆 {vehicle} 不是空闲状态，当前状态: {status}",
+                           vehicle=self.id, status=self.status)
             return
-        
+
         if self.current_task.status != "assigned":
-            print(f"错误：任务状态不是已分配状态，当前状态: {self.current_task.status}")
+            events.warning("vehicle.start_rejected", "错误：任务 {task} 不是已分配状态，当前状态: {task_status}",
+                           task=self.current_task.id, task_status=self.current_task.status)
             return
-        
+
         if not self.path:
-            print(f"错误：没有设置路径")
+            events.warning("vehicle.start_rejected", "错误：车辆 {vehicle} 没有设置路径", vehicle=self.id)
             return
-        
-        print(f"开始执行任务")
+
         try:
             # 更新任务状态
             self.current_task.start_execution()
             # 更新车辆状态
             self.status = VEHICLE_STATUS_MOVING
-            print(f"任务启动完成")
-            print(f"车辆状态: {self.status}")
-            print(f"任务状态: {self.current_task.status}")
         except Exception as e:
-            print(f"启动任务时发生错误: {str(e)}")
+            events.error("vehicle.start_failed", "启动任务时发生错误: {error}", vehicle=self.id, error=str(e))
             # 发生错误时恢复状态
             self.status = VEHICLE_STATUS_IDLE
             if self.current_task:
@@ -108,53 +104,37 @@ class Vehicle:
 
     def complete_task(self) -> None:
         """Complete the current task"""
-        print(f"\n=== 完成任务 ===")
-        print(f"车辆 {self.id} 当前状态: {self.status}")
-        print(f"任务 {self.current_task.id if self.current_task else 'None'} 当前状态: {self.current_task.status if self.current_task else 'None'}")
-        
         if self.current_task:
-            print(f"开始完成任务")
+            events.debug("vehicle.complete", "车辆 {vehicle} ({status}) 完成任务 {task}",
+                         vehicle=self.id, status=self.status, task=self.current_task.id)
             # 先完成当前任务
             self.current_task.complete()
-            print(f"任务状态更新为: {self.current_task.status}")
-            
+
             # 将任务添加到历史记录
             self.task_history.append(self.current_task)
-            print(f"任务添加到历史记录")
-            
+
             # 清除当前任务相关状态
             self.current_task = None
             self.status = VEHICLE_STATUS_IDLE
             self.target_position = None
             self.path = []
-            print(f"清除任务相关状态")
-            
+
             # 更新最后更新时间
             self.last_update_time = datetime.now()
-            print(f"任务完成处理完成")
-            print(f"车辆状态: {self.status}")
 
     def update_position(self, new_position: Tuple[int, int]) -> None:
         """更新车辆位置 - 仅用于内部状态更新，不用于移动"""
-        print(f"\n=== 更新位置 ===")
-        print(f"车辆 {self.id} 当前位置: {self.current_position}")
-        print(f"新位置: {new_position}")
-        print(f"当前状态: {self.status}")
-        
+        events.debug("vehicle.move", "车辆 {vehicle} ({status}) 位置 {old} -> {new}",
+                     vehicle=self.id, status=self.status, old=self.current_position, new=new_position)
+
         # 直接更新位置
         self.current_position = new_position
         self.last_update_time = datetime.now()
-        print(f"位置已更新")
 
     def set_path(self, path: List[Tuple[int, int]]) -> None:
         """设置路径"""
-        print(f"\n=== 设置路径 ===")
-        print(f"车辆 {self.id} 当前状态: {self.status}")
-        print(f"当前路径长度: {len(self.path) if self.path else 0}")
-        print(f"新路径长度: {len(path) if path else 0}")
-        
         if not path:
-            print(f"路径为空，清除路径")
+            events.debug("vehicle.path_cleared", "车辆 {vehicle} 路径已清除", vehicle=self.id)
             self.path = []
             self.target_position = None
             self.current_path_index = 0
@@ -163,9 +143,11 @@ class Vehicle:
         self.path = path
         self.target_position = path[-1]
         self.current_path_index = 0
-        print(f"路径已设置")
-        print(f"目标位置: {self.target_position}")
-        print(f"完整路径: {' -> '.join(str(p) for p in path)}")
+        if events.enabled(LEVEL_DEBUG):
+            # 完整路径只在调试时拼接
+            events.debug("vehicle.path_set", "车辆 {vehicle} 路径长度 {length}，目标 {target}: {path}",
+                         vehicle=self.id, length=len(path), target=self.target_position,
+                         path=" -> ".join(str(p) for p in path))
 
     def set_waiting(self) -> None:
         """设置等待状态"""
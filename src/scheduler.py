@@ -1,15 +1,17 @@
-from typing import List, Dict, Optional
-from datetime import datetime
+from typing import List, Dict, Optional, Tuple
+import heapq
+import itertools
 import random
 import json
 import os
-from .models.grid import Grid, GridCell, GRID_TYPE_MAIN_CHANNEL, GRID_TYPE_OBSTACLE
+from .models.grid import Grid, GridCell, GRID_TYPE_MAIN_CHANNEL, GRID_TYPE_OBSTACLE, MAP_FORMAT_JSON, MAP_FORMAT_BINARY
 from .models.task import (
     TaskManager,
     TransportTask,
     TASK_TYPE_INBOUND,
     TASK_TYPE_OUTBOUND,
     TASK_STATUS_PENDING,
+    TASK_STATUS_COMPLETED,
 )
 from .models.vehicle import (
     Vehicle,
@@ -23,37 +25,136 @@ from .models.vehicle import (
 )
 from .models.constraints import ConstraintManager, PhysicalConstraint
 from .algorithms.a_star import AStarPlanner
+from .algorithms.space_time_a_star import SpaceTimeAStarPlanner
+from .algorithms.hierarchical import HierarchicalPlanner
+from .algorithms.contraction import CorridorPlanner
+from .algorithms.assignment import hungarian
+from .algorithms.cbs import ConflictBasedSearch
+from .algorithms.parallel import ParallelPlanner
+from .algorithms.incremental import IncrementalPlanner
+from .algorithms.search import INF
 from .utils.visualizer import GridVisualizer
+from .utils.frame_exporter import FrameExporter, FRAME_POLICY_DROP_OLDEST
+from .utils.task_stream import TaskStream
+from .utils.metrics import SchedulerMetrics, PHASE_ASSIGN, PHASE_FIND_PATH, PHASE_OCCUPANCY, PHASE_VISUALIZE
+from .utils.events import events, LEVEL_DEBUG, LEVEL_WARNING
 
 SYSTEM_STATUS_COMPLETED = "completed"
 SYSTEM_STATUS_BUSY = "busy"
 SYSTEM_STATUS_WORKING = "working"
 
+# 路径规划模式
+PLANNER_MODE_ASTAR = "astar"  # 整条路径占用
+PLANNER_MODE_SPACE_TIME = "space_time"  # 时空预约表
+PLANNER_MODE_HIERARCHICAL = "hierarchical"  # 分簇的分层 A*，适合大地图
+PLANNER_MODE_CONTRACTED = "contracted"  # 通道收缩成带权边后的 A*
+
+# 模拟方式
+SIMULATION_MODE_TICK = "tick"  # 逐步推进
+SIMULATION_MODE_EVENT = "event"  # 离散事件，直接跳到下一个会改变状态的时刻
+
+# 离散事件类型
+EVENT_VEHICLE_ARRIVAL = "vehicle_arrival"  # 车辆走完路径，到达任务起点或终点
+EVENT_TASK_ARRIVAL = "task_arrival"  # 预定的任务到达
+EVENT_RETRY = "retry"  # 重试等待中的车辆和未分配的任务
+
+# 各格式地图文件的默认文件名
+MAP_FILENAMES = {MAP_FORMAT_JSON: "map.json", MAP_FORMAT_BINARY: "map.bin"}
+# 输出目录下存放 Excel 地图编译缓存的子目录
+MAP_CACHE_DIR = "map_cache"
+
+# 启用统计前对象上没有该实例属性
+_MISSING = object()
+
+# 任务分配策略
+ASSIGNMENT_POLICY_GREEDY = "greedy"  # 按任务顺序逐个分配最近的车辆
+ASSIGNMENT_POLICY_OPTIMAL = "optimal"  # 按真实距离做最小代价二分匹配
+
 
 class Scheduler:
     """调度器类，管理任务分配和路径规划"""
 
-    def __init__(self, num_vehicles: int, width: int = 11, height: int = 11):
+    def __init__(self, num_vehicles: int, width: int = 11, height: int = 11,
+                 planner_mode: str = PLANNER_MODE_ASTAR,
+                 assignment_policy: str = ASSIGNMENT_POLICY_GREEDY,
+                 assignment_window: int = 4,
+                 joint_planning: bool = False,
+                 parallel_workers: int = 0,
+                 incremental_replanning: bool = False,
+                 async_frames: bool = False,
+                 frame_policy: str = FRAME_POLICY_DROP_OLDEST,
+                 frame_max_queue: int = 8,
+                 frame_animation: Optional[str] = None):
         self.grid = Grid(width, height)
         self.task_manager = TaskManager()
         self.constraint_manager = ConstraintManager()
-        self.path_planner = AStarPlanner(self.grid, self.constraint_manager)
+        self.planner_mode = planner_mode
+        self.path_planner = self.create_planner(planner_mode)
+        self.assignment_policy = assignment_policy
+        self.assignment_window = assignment_window  # 批量分配时每辆空闲车最多考虑的任务数
+        self.multi_agent_planner = self.create_multi_agent_planner() if joint_planning else None
+        self.parallel_planner = ParallelPlanner(self.path_planner, parallel_workers)  # 0 表示进程内规划
+        # 车辆在任务起点规划和等待重试时复用到同一终点的搜索状态，只修补变化的格子；
+        # 占用频繁变化、路径很短时修补不比带精确距离场的 A* 快
+        self.replanner = IncrementalPlanner(self.path_planner) if incremental_replanning else None
+        self.current_step = 0
+        self.task_arrivals: List[Tuple[int, int, dict]] = []  # 预定到达的任务 (步骤, 序号, add_task 参数)
+        self._arrival_counter = itertools.count()
+        # 统计指标，两种模拟方式结果一致
+        self.assignment_steps: Dict[str, int] = {}  # 任务编号 -> 分配的步骤
+        self.completion_steps: Dict[str, int] = {}  # 任务编号 -> 完成的步骤
+        self.distance_travelled = 0  # 车辆累计移动格数
+        self.waiting_vehicle_steps = 0  # 每步结束时处于等待状态的车辆数之和
+        self._state_changed = False  # 本步是否有车辆到达任务起点或终点
+        # 流式读入任务时，已完成的任务移出任务队列，统计折算到下面的累计值
+        self.task_stream: Optional[TaskStream] = None
+        self.prune_completed = False
+        self.pruned_tasks = 0  # 移出任务队列的任务数
+        self.pruned_completed = 0  # 其中带有完成统计的任务数
+        self.pruned_completion_sum = 0  # 这些任务的完成步骤之和
+        self.pruned_makespan = 0  # 这些任务中最晚的完成步骤
+        self.pruned_lead_time_sum = 0  # 这些任务从分配到完成的步数之和
+        self.pruned_lead_time_count = 0
+        self.metrics: Optional[SchedulerMetrics] = None  # 启用时记录每步的耗时和规划统计
+        self._instrumented: List[tuple] = []  # 启用统计时替换的 (对象, 属性名, 原实例属性)
         self.vehicles: List[Vehicle] = []
         self.num_vehicles = num_vehicles
         self.grid_visualizer = GridVisualizer(self.grid)
         self.output_dir = "output"
         os.makedirs(self.output_dir, exist_ok=True)
+        # 图片在后台线程绘制和保存，规划不等待写盘
+        self.async_frames = async_frames
+        self.frame_options = {"policy": frame_policy, "max_queue": frame_max_queue, "animation": frame_animation}
+        self.frame_exporter = self.create_frame_exporter() if async_frames else None
+
+    def create_planner(self, planner_mode: str) -> AStarPlanner:
+        """按模式创建路径规划器"""
+        if planner_mode == PLANNER_MODE_ASTAR:
+            return AStarPlanner(self.grid, self.constraint_manager)
+        if planner_mode == PLANNER_MODE_SPACE_TIME:
+            return SpaceTimeAStarPlanner(self.grid, self.constraint_manager)
+        if planner_mode == PLANNER_MODE_HIERARCHICAL:
+            return HierarchicalPlanner(self.grid, self.constraint_manager)
+        if planner_mode == PLANNER_MODE_CONTRACTED:
+            return CorridorPlanner(self.grid, self.constraint_manager)
+        raise ValueError(f"未知的规划模式: {planner_mode}")
+
+    def create_multi_agent_planner(self) -> ConflictBasedSearch:
+        """创建多车联合规划器，只支持时空规划模式"""
+        if not isinstance(self.path_planner, SpaceTimeAStarPlanner):
+            raise ValueError("多车联合规划需要时空规划模式")
+        return ConflictBasedSearch(self.path_planner)
 
     def initialize(self) -> None:
         """初始化车辆和约束"""
 
         # 添加障碍物约束
-        obstacle_positions = [(x, y) for (x, y), cell in self.grid.cells.items() if cell.grid_type == GRID_TYPE_OBSTACLE]
+        obstacle_positions = self.grid.get_positions_by_type(GRID_TYPE_OBSTACLE)
         physical_constraint = PhysicalConstraint(obstacle_positions)
         self.constraint_manager.add_constraint(physical_constraint)
 
         # 获取主干道位置
-        main_channel_positions = [(x, y) for (x, y), cell in self.grid.cells.items() if cell.grid_type == GRID_TYPE_MAIN_CHANNEL]
+        main_channel_positions = self.grid.get_positions_by_type(GRID_TYPE_MAIN_CHANNEL)
 
         # 随机生成车辆
         self.vehicles.clear()
@@ -64,13 +165,13 @@ class Scheduler:
             x, y = main_channel_positions[i]
             vehicle = Vehicle(id=f"V{i + 1:03d}", vehicle_type=VEHICLE_TYPE_EMPTY, current_position=(x, y))
             self.vehicles.append(vehicle)
-            self.constraint_manager.add_vehicle(vehicle)
+            self.path_planner.register_vehicle(vehicle)
             self.grid_visualizer.add_vehicle(vehicle)
         
     def genarate_cargo(self) -> None:
         """随机生成货物"""
-        obstacle_positions = [(x, y) for (x, y), cell in self.grid.cells.items() if cell.grid_type == GRID_TYPE_OBSTACLE]
-        main_channel_positions = [(x, y) for (x, y), cell in self.grid.cells.items() if cell.grid_type == GRID_TYPE_MAIN_CHANNEL]
+        obstacle_positions = self.grid.get_positions_by_type(GRID_TYPE_OBSTACLE)
+        main_channel_positions = self.grid.get_positions_by_type(GRID_TYPE_MAIN_CHANNEL)
 
         # 随机生成货物
         all_positions = [(x, y) for x in range(self.grid.width) for y in range(self.grid.height)]
@@ -107,75 +208,228 @@ class Scheduler:
                         break
                 self.task_manager.add_task(task_type=TASK_TYPE_OUTBOUND, start_pos=(src_x, src_y), end_pos=exit_pos)
 
-    def save_tasks(self, tasks_filename: str, save_tasks: bool = True, save_map: bool = True) -> None:
-        """保存任务和地图到JSON文件"""
+    @staticmethod
+    def map_filename(tasks_filename: str, map_format: str) -> str:
+        """任务文件旁边对应格式的地图文件名"""
+        return tasks_filename.replace("tasks.json", MAP_FILENAMES[map_format])
+
+    def save_tasks(self, tasks_filename: str, save_tasks: bool = True, save_map: bool = True,
+                   map_format: str = MAP_FORMAT_JSON) -> None:
+        """保存任务到JSON文件，地图按 map_format 保存"""
         if save_tasks:
-            tasks_data = [{"id": task.id, "task_type": task.task_type, "start_position": task.start_position, "end_position": task.end_position, "priority": task.priority, "created_at": task.created_at.isoformat(), "status": task.status} for task in self.task_manager.tasks]
+            tasks_data = [{"id": task.id, "task_type": task.task_type, "start_position": task.start_position, "end_position": task.end_position, "priority": task.priority, "created_at": task.created_at.isoformat(), "status": task.status} for task in self.task_manager.iter_tasks()]
             with open(tasks_filename, "w", encoding="utf-8") as f:
                 json.dump(tasks_data, f, indent=2, ensure_ascii=False)
 
         if save_map:
-            map_filename = tasks_filename.replace("tasks.json", "map.json")
-            self.grid.save_to_json(map_filename)
+            self.grid.save(self.map_filename(tasks_filename, map_format), map_format)
 
-    def load_tasks(self, tasks_filename: str, load_map: bool = True) -> None:
-        """从JSON文件加载任务和地图"""
+    def load_tasks(self, tasks_filename: str, load_map: bool = True, map_format: Optional[str] = None) -> None:
+        """从JSON文件加载任务和地图；map_format 为 None 时使用两种格式中较新的地图文件"""
         try:
             with open(tasks_filename, "r", encoding="utf-8") as f:
                 tasks_data = json.load(f)
             for task_data in tasks_data:
-                self.task_manager.tasks.append(TransportTask(id=task_data["id"], task_type=task_data["task_type"], start_position=tuple(task_data["start_position"]), end_position=tuple(task_data["end_position"]), priority=task_data["priority"], created_at=datetime.fromisoformat(task_data["created_at"]), status=task_data["status"]))
+                self.task_manager.insert_task(TransportTask.from_dict(task_data))
         except FileNotFoundError:
-            print(f"任务文件 {tasks_filename} 未找到。开始时没有任务。")
+            events.warning("scheduler.tasks_missing", "任务文件 {filename} 未找到。开始时没有任务。", filename=tasks_filename)
 
         if load_map:
-            map_filename = tasks_filename.replace("tasks.json", "map.json")
+            if map_format is None:
+                candidates = [self.map_filename(tasks_filename, fmt) for fmt in (MAP_FORMAT_BINARY, MAP_FORMAT_JSON)]
+                existing = [name for name in candidates if os.path.exists(name)]
+                map_filename = max(existing, key=os.path.getmtime) if existing else candidates[-1]
+            else:
+                map_filename = self.map_filename(tasks_filename, map_format)
             try:
-                self.grid.load_from_json(map_filename)
+                self.grid.load(map_filename)
             except FileNotFoundError:
-                print(f"地图文件 {map_filename} 未找到。无法加载地图。")
+                events.error("scheduler.map_missing", "地图文件 {filename} 未找到。无法加载地图。", filename=map_filename)
 
     def assign_and_plan(self) -> str:
         """分配任务并规划路径"""
         pending_tasks = self.task_manager.get_tasks_by_status(TASK_STATUS_PENDING)
-        if not pending_tasks: print("无可分配任务"); return SYSTEM_STATUS_WORKING
+        if not pending_tasks: events.debug("scheduler.no_pending", "无可分配任务"); return SYSTEM_STATUS_WORKING
 
         idle_vehicles = [vehicle for vehicle in self.vehicles if vehicle.status == VEHICLE_STATUS_IDLE]
-        if not idle_vehicles: print("无空闲车辆"); return SYSTEM_STATUS_BUSY
+        if not idle_vehicles: events.debug("scheduler.no_idle", "无空闲车辆"); return SYSTEM_STATUS_BUSY
+
+        self.path_planner.current_time = self.current_step
+        if self.multi_agent_planner is not None and len(idle_vehicles) > 1:
+            assigned_any = self._assign_joint(pending_tasks, idle_vehicles)
+        elif self.assignment_policy == ASSIGNMENT_POLICY_OPTIMAL:
+            assigned_any = self._assign_optimal(pending_tasks, idle_vehicles)
+        elif self.assignment_policy == ASSIGNMENT_POLICY_GREEDY:
+            assigned_any = self._assign_greedy(pending_tasks, idle_vehicles)
+        else:
+            raise ValueError(f"未知的分配策略: {self.assignment_policy}")
+        return SYSTEM_STATUS_WORKING if assigned_any else SYSTEM_STATUS_BUSY
 
+    def _start_assignment(self, vehicle: Vehicle, task: TransportTask, path_to_start: List) -> bool:
+        """把任务交给车辆并设置前往起点的路径，路径由调用方提交"""
+        if not vehicle.assign_task(task):
+            return False
+        vehicle.set_path(path_to_start)
+        vehicle.start_task()
+        vehicle.status = VEHICLE_STATUS_LOADING
+        self.assignment_steps[task.id] = self.current_step
+        return True
+
+    def _log_assignment(self, task: TransportTask, vehicle: Vehicle) -> None:
+        """记录分配结果，完整路径只在调试级别拼接"""
+        events.info("scheduler.task_assigned", "任务 {task} 已分配给车辆 {vehicle}, 路径长度: {length}",
+                    task=task.id, vehicle=vehicle.id, length=len(vehicle.path), step=self.current_step)
+        if events.enabled(LEVEL_DEBUG):
+            events.debug("scheduler.assigned_path", "车辆 {vehicle} 路径: {path}",
+                         vehicle=vehicle.id, path=vehicle.get_path_str())
+
+    @staticmethod
+    def _log_unassigned(task: TransportTask) -> None:
+        events.debug("scheduler.task_unassigned", "任务 {task} 暂无可用车辆或所有车辆均无法到达", task=task.id)
+
+    def _assign_greedy(self, pending_tasks: List[TransportTask], idle_vehicles: List[Vehicle]) -> bool:
+        """按任务顺序逐个分配，每个任务选真实距离最近的空闲车辆"""
         assigned_any = False
         for task in pending_tasks:
-            sorted_vehicles = sorted(idle_vehicles, key=lambda v: abs(v.current_position[0] - task.start_position[0]) + abs(v.current_position[1] - task.start_position[1]))
+            # 一次反向搜索得到所有空闲车辆到任务起点的真实距离
+            candidates = self.path_planner.search_many(idle_vehicles, task.start_position)
+            sorted_vehicles = sorted((v for v in idle_vehicles if v.id in candidates), key=lambda v: candidates[v.id].cost)
             for vehicle in sorted_vehicles:
-                path_to_start = self.path_planner.find_path(vehicle, vehicle.current_position, task.start_position)
+                if self.path_planner.time_dependent:
+                    path_to_start = self.path_planner.find_path(vehicle, vehicle.current_position, task.start_position)
+                else:
+                    path_to_start = self.path_planner.to_positions(candidates[vehicle.id].path)
                 if path_to_start is None: continue
-                if vehicle.assign_task(task):
-                    vehicle.set_path(path_to_start)
-                    vehicle.start_task()
-                    vehicle.status = VEHICLE_STATUS_LOADING
+                if self._start_assignment(vehicle, task, path_to_start):
                     idle_vehicles.remove(vehicle)
-                    self.constraint_manager.add_path(vehicle, path_to_start)
+                    self.path_planner.reserve_path(vehicle, path_to_start)
                     assigned_any = True
-                    print(f"任务 {task.id} 已分配给车辆 {vehicle.id}, 路径: {vehicle.get_path_str()}")
+                    self._log_assignment(task, vehicle)
                     self.visualize(f"assign_{task.id}_part_1.png")
                     break
-            else: print(f"任务 {task.id} 暂无可用车辆或所有车辆均无法到达")
-        return SYSTEM_STATUS_WORKING if assigned_any else SYSTEM_STATUS_BUSY
+            else: self._log_unassigned(task)
+        return assigned_any
+
+    def _optimal_matching(self, pending_tasks: List[TransportTask], idle_vehicles: List[Vehicle]):
+        """按真实距离和优先级做二分匹配，返回 (候选任务, 各任务的搜索结果, (任务下标, 车辆下标) 列表)"""
+        tasks = sorted(pending_tasks, key=lambda t: (-t.priority, t.created_at))
+        tasks = tasks[:max(1, self.assignment_window * len(idle_vehicles))]
+        top_priority = max(t.priority for t in tasks)
+        priority_weight = self.grid.num_nodes + 1  # 大于任何一条路径的长度
+
+        candidates = self.parallel_planner.search_many_batch(idle_vehicles, [task.start_position for task in tasks])
+        cost = [
+            [
+                found[v.id].cost + (top_priority - task.priority) * priority_weight if v.id in found else INF
+                for v in idle_vehicles
+            ]
+            for task, found in zip(tasks, candidates)
+        ]
+        return tasks, candidates, hungarian(cost)
+
+    def _assign_optimal(self, pending_tasks: List[TransportTask], idle_vehicles: List[Vehicle]) -> bool:
+        """把空闲车辆和待分配任务做最小代价二分匹配
+
+        代价为车辆到任务起点的真实路程，再按优先级加上足够大的偏置，
+        使高优先级任务总是先于低优先级任务得到车辆。
+        """
+        tasks, candidates, matching = self._optimal_matching(pending_tasks, idle_vehicles)
+
+        # 匹配结果基于同一份占用快照，逐条提交前检查是否与本批已提交的路径冲突
+        assigned_tasks = []
+        pending_commits = []
+        claimed = set()
+        for task_index, vehicle_index in matching:
+            task, vehicle = tasks[task_index], idle_vehicles[vehicle_index]
+            path_to_start = None
+            if not self.path_planner.time_dependent:
+                path_to_start = self.path_planner.to_positions(candidates[task_index][vehicle.id].path)
+                if any(p in claimed or not self.constraint_manager.check_all_constraints(self.grid, vehicle, p)
+                       for p in path_to_start[1:]):
+                    path_to_start = None
+            if path_to_start is None:
+                self.path_planner.reserve_paths(pending_commits)
+                pending_commits, claimed = [], set()
+                path_to_start = self.path_planner.find_path(vehicle, vehicle.current_position, task.start_position)
+            if path_to_start is None or not self._start_assignment(vehicle, task, path_to_start):
+                continue
+            if self.path_planner.time_dependent:
+                self.path_planner.reserve_path(vehicle, path_to_start)
+            else:
+                pending_commits.append((vehicle, path_to_start))
+                claimed.update(path_to_start)
+            assigned_tasks.append(task)
+            self._log_assignment(task, vehicle)
+        self.path_planner.reserve_paths(pending_commits)
+
+        for task in assigned_tasks:
+            self.visualize(f"assign_{task.id}_part_1.png")
+        for task in tasks:
+            if task not in assigned_tasks:
+                self._log_unassigned(task)
+        return bool(assigned_tasks)
+
+    def _assign_joint(self, pending_tasks: List[TransportTask], idle_vehicles: List[Vehicle]) -> bool:
+        """先按分配策略为空闲车辆选定任务，再联合规划前往起点的路径，避免先规划的车辆挡住后规划的"""
+        pairs: List[Tuple[TransportTask, Vehicle]] = []
+        if self.assignment_policy == ASSIGNMENT_POLICY_OPTIMAL:
+            tasks, _, matching = self._optimal_matching(pending_tasks, idle_vehicles)
+            pairs = [(tasks[task_index], idle_vehicles[vehicle_index]) for task_index, vehicle_index in matching]
+        elif self.assignment_policy == ASSIGNMENT_POLICY_GREEDY:
+            remaining = list(idle_vehicles)
+            for task in pending_tasks:
+                if not remaining:
+                    break
+                candidates = self.path_planner.search_many(remaining, task.start_position)
+                if not candidates:
+                    continue
+                vehicle = min((v for v in remaining if v.id in candidates), key=lambda v: candidates[v.id].cost)
+                remaining.remove(vehicle)
+                pairs.append((task, vehicle))
+        else:
+            raise ValueError(f"未知的分配策略: {self.assignment_policy}")
+
+        legs = [(vehicle, vehicle.current_position, task.start_position) for task, vehicle in pairs]
+        paths = self.multi_agent_planner.plan(legs)
+        assigned_tasks = []
+        commits = []
+        for task, vehicle in pairs:
+            path_to_start = paths.get(vehicle.id)
+            if path_to_start is None or not self._start_assignment(vehicle, task, path_to_start):
+                continue
+            commits.append((vehicle, path_to_start))
+            assigned_tasks.append(task)
+            self._log_assignment(task, vehicle)
+        self.path_planner.reserve_paths(commits)
+
+        for task in assigned_tasks:
+            self.visualize(f"assign_{task.id}_part_1.png")
+        for task in pending_tasks:
+            if task not in assigned_tasks:
+                self._log_unassigned(task)
+        return bool(assigned_tasks)
 
     def simulate_step(self) -> bool:
         """模拟一步，更新车辆位置"""
         active_vehicles = [v for v in self.vehicles if v.status in (VEHICLE_STATUS_WAITING, VEHICLE_STATUS_MOVING, VEHICLE_STATUS_LOADING, VEHICLE_STATUS_UNLOADING)]
         if not active_vehicles: return False
 
+        # 本步中重新规划的路径从下一步开始执行
+        self.path_planner.current_time = self.current_step + 1
         for vehicle in active_vehicles:
             next_pos = vehicle.get_next_position()
             if next_pos:
                 vehicle.current_path_index += 1
+                if next_pos != vehicle.current_position:
+                    self.distance_travelled += 1
                 vehicle.update_position(next_pos)
                 continue
 
             task = vehicle.current_task
             if not task: continue
+            # 等待中的车辆重试失败时状态不变，其余情况都改变了地图、占用或任务状态
+            if vehicle.status != VEHICLE_STATUS_WAITING:
+                self._state_changed = True
 
             if vehicle.current_position == task.start_position:
                 if task.task_type == TASK_TYPE_OUTBOUND:
@@ -183,14 +437,20 @@ class Scheduler:
                     vehicle.vehicle_type = VEHICLE_TYPE_LOADED
                 elif task.task_type == TASK_TYPE_INBOUND:
                     vehicle.vehicle_type = VEHICLE_TYPE_LOADED
-                self.constraint_manager.remove_path(vehicle)
-                path_to_end = self.path_planner.find_path(vehicle, vehicle.current_position, task.end_position)
+                self.path_planner.release_path(vehicle)
+                planner = self.replanner if self.replanner is not None else self.path_planner
+                path_to_end = planner.find_path(vehicle, vehicle.current_position, task.end_position)
                 if path_to_end:
+                    self._state_changed = True
                     vehicle.set_path(path_to_end)
                     vehicle.status = VEHICLE_STATUS_UNLOADING
-                    self.constraint_manager.add_path(vehicle, path_to_end)
+                    self.path_planner.reserve_path(vehicle, path_to_end)
                 else:
-                    print(f"车辆 {vehicle.id} 无法从起点{vehicle.current_position}到终点{task.end_position}，任务无法完成")
+                    # 等待中的车辆每步都会重试，只在开始等待时警告一次
+                    level = LEVEL_DEBUG if vehicle.status == VEHICLE_STATUS_WAITING else LEVEL_WARNING
+                    events.emit(level, "scheduler.unreachable",
+                                "车辆 {vehicle} 无法从起点{start}到终点{goal}，任务无法完成",
+                                vehicle=vehicle.id, start=vehicle.current_position, goal=task.end_position)
                     vehicle.set_waiting()
                     vehicle.status = VEHICLE_STATUS_WAITING
 
@@ -200,20 +460,35 @@ class Scheduler:
                     self.grid.set_cargo(*task.end_position, True)
                     vehicle.vehicle_type = VEHICLE_TYPE_EMPTY
                 vehicle.complete_task()
-                self.constraint_manager.remove_path(vehicle)
+                self.path_planner.release_path(vehicle)
                 vehicle.status = VEHICLE_STATUS_IDLE
-                print(f"车辆 {vehicle.id} 已完成任务")
+                self.completion_steps[task.id] = self.current_step
+                events.info("scheduler.task_completed", "车辆 {vehicle} 已完成任务 {task}",
+                            vehicle=vehicle.id, task=task.id, step=self.current_step)
+        self.waiting_vehicle_steps += sum(1 for v in self.vehicles if v.status == VEHICLE_STATUS_WAITING)
         return True
 
+    def create_frame_exporter(self) -> FrameExporter:
+        """按 frame_options 创建输出到当前 output_dir 的后台帧输出"""
+        return FrameExporter(self.output_dir, self.grid_visualizer.grid_type_colors,
+                             self.grid_visualizer.vehicle_colors, **self.frame_options)
+
     def visualize(self, filename: str) -> None:
         """可视化当前状态，保存到output目录"""
-        self.grid_visualizer.draw_grid(self.constraint_manager)
-        self.grid_visualizer.draw_vehicles()
+        if self.async_frames:
+            if self.frame_exporter is None or self.frame_exporter.closed:
+                # run 结束时关闭了上一个，之后的帧由新的后台线程输出
+                self.frame_exporter = self.create_frame_exporter()
+            if self.frame_exporter.wants_frame(filename):
+                self.frame_exporter.submit(self.grid_visualizer.snapshot(self.constraint_manager), filename)
+            return
+        self.grid_visualizer.render(self.constraint_manager)
         full_path = os.path.join(self.output_dir, filename)
         self.grid_visualizer.save(full_path)
 
-    def run(self, num_tasks: int, max_steps: int, load: bool = True) -> None:
-        """运行调度模拟，每一步都生成图片"""
+    def run(self, num_tasks: int, max_steps: int, load: bool = True,
+            mode: str = SIMULATION_MODE_TICK) -> None:
+        """运行调度模拟，mode 为逐步推进或离散事件"""
         tasks_filename = os.path.join(self.output_dir, "tasks.json")
 
         if load:
@@ -226,23 +501,275 @@ class Scheduler:
 
         self.initialize()
 
-        step = 0
-        print(f"\n=== 初始状态（步骤 {step}） ===")
+        events.info("scheduler.start", "\n=== 初始状态（步骤 {step}） ===", step=0)
+        # self.visualize(f"step_{step}.png")
+
+        try:
+            if mode == SIMULATION_MODE_TICK:
+                self.run_ticks(max_steps)
+            elif mode == SIMULATION_MODE_EVENT:
+                self.run_events(max_steps)
+            else:
+                raise ValueError(f"未知的模拟方式: {mode}")
+        finally:
+            self.parallel_planner.close()
+            if self.task_stream is not None:
+                self.task_stream.close()
+            if self.frame_exporter is not None:
+                self.frame_exporter.close()
+
+    def schedule_task(self, step: int, task_type: str, start_pos: Tuple[int, int],
+                      end_pos: Tuple[int, int], priority: int = 0) -> None:
+        """预定一个在 step 步开始时到达的任务"""
+        arrival = dict(task_type=task_type, start_pos=start_pos, end_pos=end_pos, priority=priority)
+        heapq.heappush(self.task_arrivals, (step, next(self._arrival_counter), arrival))
+
+    def _release_arrivals(self) -> None:
+        """把到达时刻不晚于当前步骤的预定任务加入任务队列"""
+        while self.task_arrivals and self.task_arrivals[0][0] <= self.current_step:
+            _, _, arrival = heapq.heappop(self.task_arrivals)
+            self.task_manager.add_task(**arrival)
+
+    def enable_metrics(self, history: int = 1000, profile_phases: Tuple[str, ...] = ()) -> SchedulerMetrics:
+        """开始记录每步的耗时和规划统计，profile_phases 中的阶段另用 cProfile 采样
+
+        计时包装只在启用期间装在实例上，未启用时调用路径不变。并行规划的
+        工作进程内部不计入，联合规划整体计入 find_path；离散事件模式下只记录
+        实际执行的步骤。
+        """
+        self.disable_metrics()
+        metrics = SchedulerMetrics(history, profile_phases)
+        planner = self.path_planner
+
+        def install(owner, name: str, phase: str, observe=None) -> None:
+            self._replace_attribute(owner, name, metrics.timed(phase, getattr(owner, name), observe))
+
+        install(self, "assign_and_plan", PHASE_ASSIGN)
+        install(self, "visualize", PHASE_VISUALIZE)
+        install(planner, "search", PHASE_FIND_PATH, metrics.record_search)
+        search_many = planner.search_many
+
+        def observed_search_many(vehicles, goal):
+            # 返回值只含可达的车辆，请求的车辆数要从参数取
+            results = search_many(vehicles, goal)
+            metrics.record_searches(results, len(vehicles))
+            return results
+
+        self._replace_attribute(planner, "search_many", metrics.timed(PHASE_FIND_PATH, observed_search_many))
+        if self.replanner is not None:
+            install(self.replanner, "search", PHASE_FIND_PATH, metrics.record_search)
+        if self.multi_agent_planner is not None:
+            install(self.multi_agent_planner, "plan", PHASE_FIND_PATH)
+        for name in ("reserve_path", "release_path", "reserve_paths"):
+            install(planner, name, PHASE_OCCUPANCY)
+
+        tick = self._tick
+
+        def timed_tick(step: int) -> bool:
+            metrics.begin_tick(step)
+            try:
+                return tick(step)
+            finally:
+                metrics.end_tick(sum(1 for v in self.vehicles if v.status == VEHICLE_STATUS_WAITING))
+
+        self._replace_attribute(self, "_tick", timed_tick)
+        self.metrics = metrics
+        return metrics
+
+    def _replace_attribute(self, owner, name: str, value) -> None:
+        """替换实例属性，记下原值供 disable_metrics 还原"""
+        self._instrumented.append((owner, name, owner.__dict__.get(name, _MISSING)))
+        setattr(owner, name, value)
+
+    def disable_metrics(self) -> None:
+        """移除计时包装，已记录的统计保留在返回过的 SchedulerMetrics 中"""
+        for owner, name, previous in reversed(self._instrumented):
+            if previous is _MISSING:
+                owner.__dict__.pop(name, None)
+            else:
+                setattr(owner, name, previous)
+        self._instrumented = []
+        self.metrics = None
+
+    def get_metrics(self) -> dict:
+        """每步统计的快照，未启用时为空"""
+        return self.metrics.snapshot() if self.metrics is not None else {}
+
+    def attach_task_stream(self, stream: TaskStream, prune_completed: bool = True) -> None:
+        """运行中每步开始时从 stream 读入一批任务
+
+        prune_completed 为 True 时已完成的任务在每步结束后移出任务队列，统计指标
+        折算成累计值，长时间运行的内存占用不随任务总数增长。
+        """
+        self.task_stream = stream
+        self.prune_completed = prune_completed
+
+    def _streaming(self) -> bool:
+        """任务流是否还可能有新任务"""
+        return self.task_stream is not None and not self.task_stream.exhausted
+
+    def prune_completed_tasks(self) -> int:
+        """把已完成的任务移出任务队列，返回移出的数量"""
+        pruned = 0
+        owners: Dict[str, set] = {}  # 车辆编号 -> 移出的任务编号
+        for task in self.task_manager.get_tasks_by_status(TASK_STATUS_COMPLETED):
+            self.task_manager.remove_task(task.id)
+            pruned += 1
+            if task.assigned_vehicle is not None:
+                owners.setdefault(task.assigned_vehicle, set()).add(task.id)
+            completed_at = self.completion_steps.pop(task.id, None)
+            assigned_at = self.assignment_steps.pop(task.id, None)
+            if completed_at is None:
+                continue
+            self.pruned_completed += 1
+            self.pruned_completion_sum += completed_at
+            self.pruned_makespan = max(self.pruned_makespan, completed_at)
+            if assigned_at is not None:
+                self.pruned_lead_time_sum += completed_at - assigned_at
+                self.pruned_lead_time_count += 1
+        # 车辆的任务历史同样会随任务总数增长，只去掉移出的任务
+        for vehicle in self.vehicles:
+            removed = owners.get(vehicle.id)
+            if removed:
+                vehicle.task_history = [task for task in vehicle.task_history if task.id not in removed]
+        self.pruned_tasks += pruned
+        return pruned
+
+    def _tick(self, step: int) -> bool:
+        """执行一步：任务到达、分配规划、车辆移动；没有活动车辆且没有更多任务时返回 False"""
+        self.current_step = step
+        events.debug("scheduler.step", "\n=== 模拟步骤 {step} ===", step=step)
+        self._release_arrivals()
+        if self.task_stream is not None:
+            self.task_stream.poll(self.task_manager)
+        self.assign_and_plan()
+        active = self.simulate_step()
+        if self.prune_completed:
+            self.prune_completed_tasks()
+        if not active and not self._streaming():
+            events.info("scheduler.finished", "没有活动车辆，模拟结束", step=step)
+            return False
         # self.visualize(f"step_{step}.png")
-        step += 1
+        return True
 
-        while step <= max_steps:
-            print(f"\n=== 模拟步骤 {step} ===")
-            self.assign_and_plan()
-            if not self.simulate_step():
-                print("没有活动车辆，模拟结束")
+    def run_ticks(self, max_steps: int) -> None:
+        """逐步推进到 max_steps 或没有活动车辆"""
+        for step in range(self.current_step + 1, max_steps + 1):
+            if not self._tick(step):
                 break
-            # self.visualize(f"step_{step}.png")
-            step += 1
 
-    def load_from_xlsx(self, filename: str) -> None:
-        """从Excel文件加载地图和任务"""
-        self.grid.load_map_from_excel(filename)
+    def run_events(self, max_steps: int) -> None:
+        """离散事件模拟，结果与 run_ticks 相同
+
+        事件队列中是车辆走完路径、预定任务到达和重试三类事件。两个事件之间
+        没有车辆到达路径终点，地图、占用和任务队列都不变，分配和等待车辆的
+        重试结果也不变，只需要把车辆沿路径平移；事件发生的步骤按逐步推进的
+        方式完整执行。时空规划器的结果随时刻变化，有车辆等待或任务待分配时
+        每步都重试。
+        """
+        queue: List[Tuple[int, int, str, Optional[str]]] = []  # (步骤, 序号, 事件类型, 车辆编号)
+        counter = itertools.count()
+        arrival_at: Dict[str, int] = {}  # 车辆编号 -> 当前有效的到达事件步骤
+        for step, _, _ in self.task_arrivals:
+            heapq.heappush(queue, (step, next(counter), EVENT_TASK_ARRIVAL, None))
+        heapq.heappush(queue, (self.current_step + 1, next(counter), EVENT_RETRY, None))
+        scheduled_arrivals = len(self.task_arrivals)
+
+        while queue:
+            step, _, kind, vehicle_id = heapq.heappop(queue)
+            if kind == EVENT_VEHICLE_ARRIVAL and arrival_at.get(vehicle_id) != step:
+                continue  # 车辆换了路径，事件已过期
+            if step <= self.current_step:
+                continue  # 同一步的多个事件只执行一次
+            if step > max_steps:
+                break
+            self._advance_vehicles(step - self.current_step - 1)
+
+            pending_before = self.task_manager.count_by_status(TASK_STATUS_PENDING)
+            self._state_changed = False
+            if not self._tick(step):
+                return
+            assigned = self.task_manager.count_by_status(TASK_STATUS_PENDING) < pending_before
+
+            # 新预定的任务
+            for arrival_step, _, _ in self.task_arrivals[scheduled_arrivals:]:
+                heapq.heappush(queue, (arrival_step, next(counter), EVENT_TASK_ARRIVAL, None))
+            scheduled_arrivals = len(self.task_arrivals)
+
+            # 走完当前路径的车辆在下一个无路可走的步骤处理到达
+            for vehicle in self.vehicles:
+                if vehicle.path and vehicle.current_task:
+                    arrival = step + len(vehicle.path) - vehicle.current_path_index + 1
+                    if arrival_at.get(vehicle.id) != arrival:
+                        arrival_at[vehicle.id] = arrival
+                        heapq.heappush(queue, (arrival, next(counter), EVENT_VEHICLE_ARRIVAL, vehicle.id))
+
+            # 状态变化后下一步的分配和重试结果可能不同；没有活动车辆时下一步结束模拟
+            waiting = any(v.status == VEHICLE_STATUS_WAITING for v in self.vehicles)
+            idle = any(v.status == VEHICLE_STATUS_IDLE for v in self.vehicles)
+            pending = self.task_manager.count_by_status(TASK_STATUS_PENDING) > 0
+            active = any(v.status != VEHICLE_STATUS_IDLE for v in self.vehicles)
+            retry = (self._state_changed or assigned or not active or self._streaming()
+                     or (self.path_planner.time_dependent and (waiting or (pending and idle))))
+            if retry:
+                heapq.heappush(queue, (step + 1, next(counter), EVENT_RETRY, None))
+
+        # 没有更多事件：剩余的步骤中车辆只沿路径移动或保持等待
+        if self.current_step < max_steps:
+            self._advance_vehicles(max_steps - self.current_step)
+            self.current_step = max_steps
+
+    def _advance_vehicles(self, steps: int) -> None:
+        """在没有事件的 steps 步内把车辆沿路径平移，并累计移动和等待的统计"""
+        if steps <= 0:
+            return
+        waiting = 0
+        for vehicle in self.vehicles:
+            if vehicle.status == VEHICLE_STATUS_WAITING:
+                waiting += 1
+            path = vehicle.path
+            if not path or vehicle.status == VEHICLE_STATUS_IDLE:
+                continue
+            index = vehicle.current_path_index
+            end = min(index + steps, len(path))
+            position = vehicle.current_position
+            for next_pos in path[index:end]:
+                if next_pos != position:
+                    self.distance_travelled += 1
+                    position = next_pos
+            vehicle.current_path_index = end
+            if position != vehicle.current_position:
+                vehicle.update_position(position)
+        self.waiting_vehicle_steps += waiting * steps
+        self.current_step += steps
+
+    def get_kpis(self) -> dict:
+        """模拟的统计指标"""
+        queue_status = self.task_manager.get_queue_status()
+        lead_times = [step - self.assignment_steps[task_id]
+                      for task_id, step in self.completion_steps.items() if task_id in self.assignment_steps]
+        completion = list(self.completion_steps.values())
+        # 加上已移出任务队列的任务
+        completed = len(completion) + self.pruned_completed
+        completion_sum = sum(completion) + self.pruned_completion_sum
+        lead_time_count = len(lead_times) + self.pruned_lead_time_count
+        lead_time_sum = sum(lead_times) + self.pruned_lead_time_sum
+        return {
+            "steps": self.current_step,
+            "tasks_total": queue_status["total_tasks"] + self.pruned_tasks,
+            "tasks_completed": completed,
+            "tasks_pending": queue_status["pending"],
+            "makespan": max(completion + [self.pruned_makespan]),
+            "mean_completion_step": completion_sum / completed if completed else 0.0,
+            "mean_lead_time": lead_time_sum / lead_time_count if lead_time_count else 0.0,
+            "distance_travelled": self.distance_travelled,
+            "waiting_vehicle_steps": self.waiting_vehicle_steps,
+        }
+
+    def load_from_xlsx(self, filename: str, use_cache: bool = True) -> None:
+        """从Excel文件加载地图和任务，编译结果缓存在输出目录下"""
+        cache_dir = os.path.join(self.output_dir, MAP_CACHE_DIR) if use_cache else None
+        self.grid.load_map_from_excel(filename, cache_dir=cache_dir)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,108 @@
+from collections import deque
+from typing import Optional, Tuple, List, Dict, Any, Deque
+import time
+
+# 事件级别，数值越大越重要
+LEVEL_DEBUG = 10
+LEVEL_INFO = 20
+LEVEL_WARNING = 30
+LEVEL_ERROR = 40
+LEVEL_OFF = 100  # 关闭全部事件
+
+LEVEL_NAMES = {
+    LEVEL_DEBUG: "DEBUG",
+    LEVEL_INFO: "INFO",
+    LEVEL_WARNING: "WARNING",
+    LEVEL_ERROR: "ERROR",
+}
+
+# 环形缓冲中的一条事件：(时间戳, 级别, 事件名, 消息模板, 字段)
+Event = Tuple[float, int, str, str, Dict[str, Any]]
+
+
+class EventLog:
+    """分级的结构化事件记录
+
+    事件由名称、消息模板和字段组成，低于当前级别的事件在格式化之前就被丢弃，
+    开销只有一次整数比较。达到级别的事件可以打印到标准输出，也可以原样存入
+    内存中的环形缓冲供调试查看，缓冲中的事件只在读取时才格式化。
+    """
+
+    def __init__(self, level: int = LEVEL_INFO, echo: bool = True, buffer_size: int = 0):
+        self.level = level
+        self.echo = echo  # 是否打印到标准输出
+        self.buffer: Optional[Deque[Event]] = deque(maxlen=buffer_size) if buffer_size > 0 else None
+        self._threshold = level
+
+    def configure(self, level: Optional[int] = None, echo: Optional[bool] = None,
+                  buffer_size: Optional[int] = None) -> None:
+        """修改级别、是否打印以及环形缓冲大小（0 表示不缓冲）"""
+        if level is not None:
+            self.level = level
+        if echo is not None:
+            self.echo = echo
+        if buffer_size is not None:
+            self.buffer = deque(self.buffer or (), maxlen=buffer_size) if buffer_size > 0 else None
+        # 既不打印也不缓冲时任何事件都不需要处理
+        self._threshold = self.level if (self.echo or self.buffer is not None) else LEVEL_OFF
+
+    def enabled(self, level: int) -> bool:
+        """该级别的事件是否会被处理，用于跳过代价高的字段计算"""
+        return level >= self._threshold
+
+    def emit(self, level: int, name: str, message: str = "", **fields: Any) -> None:
+        """记录一条事件，message 为 str.format 模板，字段按名称填入"""
+        if level < self._threshold:
+            return
+        if self.buffer is not None:
+            self.buffer.append((time.time(), level, name, message, fields))
+        if self.echo:
+            print(self._format(message, name, fields))
+
+    def debug(self, name: str, message: str = "", **fields: Any) -> None:
+        if LEVEL_DEBUG >= self._threshold:
+            self.emit(LEVEL_DEBUG, name, message, **fields)
+
+    def info(self, name: str, message: str = "", **fields: Any) -> None:
+        if LEVEL_INFO >= self._threshold:
+            self.emit(LEVEL_INFO, name, message, **fields)
+
+    def warning(self, name: str, message: str = "", **fields: Any) -> None:
+        if LEVEL_WARNING >= self._threshold:
+            self.emit(LEVEL_WARNING, name, message, **fields)
+
+    def error(self, name: str, message: str = "", **fields: Any) -> None:
+        if LEVEL_ERROR >= self._threshold:
+            self.emit(LEVEL_ERROR, name, message, **fields)
+
+    @staticmethod
+    def _format(message: str, name: str, fields: Dict[str, Any]) -> str:
+        if not message:
+            return f"{name} {fields}" if fields else name
+        return message.format(**fields)
+
+    def recent(self, count: Optional[int] = None, min_level: int = LEVEL_DEBUG,
+               name: Optional[str] = None) -> List[Event]:
+        """环形缓冲中最近的事件，可按级别和名称过滤"""
+        if self.buffer is None:
+            return []
+        events = [event for event in self.buffer
+                  if event[1] >= min_level and (name is None or event[2] == name)]
+        return events if count is None else events[-count:]
+
+    def dump(self, count: Optional[int] = None, min_level: int = LEVEL_DEBUG) -> List[str]:
+        """把环形缓冲中的事件格式化成文本行"""
+        lines = []
+        for timestamp, level, name, message, fields in self.recent(count, min_level):
+            clock = time.strftime("%H:%M:%S", time.localtime(timestamp))
+            lines.append(f"{clock} {LEVEL_NAMES.get(level, level)} {name}: {self._format(message, name, fields)}")
+        return lines
+
+    def clear(self) -> None:
+        """清空环形缓冲"""
+        if self.buffer is not None:
+            self.buffer.clear()
+
+
+# 全局事件记录，各模块通过它上报事件
+events = EventLog()
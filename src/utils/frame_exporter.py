@@ -0,0 +1,173 @@
+from collections import deque
+from typing import Optional, Tuple, List, Deque
+import os
+import threading
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from src.utils.visualizer import FrameSnapshot, RasterRenderer
+from src.utils.events import events
+
+# 队列满时的处理方式
+FRAME_POLICY_BLOCK = "block"  # 等待后台线程腾出位置，不丢帧
+FRAME_POLICY_DROP_NEWEST = "drop_newest"  # 丢弃新提交的帧
+FRAME_POLICY_DROP_OLDEST = "drop_oldest"  # 丢弃队列中最旧的帧
+FRAME_POLICY_SAMPLE = "sample"  # 落后时加大抽样间隔，追上后恢复逐帧
+
+# 动画文件的扩展名，其余情况每帧保存为单独的图片
+ANIMATION_EXTENSIONS = (".gif",)
+
+
+class FrameExporter:
+    """后台线程绘制并保存帧
+
+    主线程只提交不可变的 FrameSnapshot，绘制和写盘在后台线程完成，使用独立的
+    Agg Figure，不经过 pyplot。队列有上限，绘制跟不上时按 policy 丢帧或抽样。
+    animation 为 .gif 文件名时所有帧合成一个动画，在 close 时写出。
+    """
+
+    def __init__(self, output_dir: str, grid_type_colors: dict, vehicle_colors: dict,
+                 max_queue: int = 8, policy: str = FRAME_POLICY_DROP_OLDEST,
+                 animation: Optional[str] = None, cell_inches: float = 0.15, dpi: int = 100,
+                 max_sample_stride: int = 64):
+        if policy not in (FRAME_POLICY_BLOCK, FRAME_POLICY_DROP_NEWEST, FRAME_POLICY_DROP_OLDEST, FRAME_POLICY_SAMPLE):
+            raise ValueError(f"未知的丢帧策略: {policy}")
+        if animation is not None and not animation.lower().endswith(ANIMATION_EXTENSIONS):
+            raise ValueError(f"不支持的动画格式: {animation}")
+        self.output_dir = output_dir
+        self.grid_type_colors = grid_type_colors
+        self.vehicle_colors = vehicle_colors
+        self.max_queue = max_queue
+        self.policy = policy
+        self.animation = animation
+        self.cell_inches = cell_inches
+        self.dpi = dpi
+        self.max_sample_stride = max_sample_stride
+        self.queue: Deque[Tuple[FrameSnapshot, str]] = deque()
+        self.condition = threading.Condition()
+        self.closed = False
+        self.busy = False  # 后台线程是否正在绘制
+        self.thread: Optional[threading.Thread] = None
+        self.frames: List = []  # 动画的帧（PIL 调色板图像）
+        self.stride = 1  # 抽样间隔
+        self._since_sample = 0
+        self.submitted = 0  # 提交的帧数
+        self.written = 0  # 写出的帧数
+        self.dropped = 0  # 丢弃的帧数
+        self.failed = 0  # 绘制或写盘失败的帧数
+
+    def wants_frame(self, filename: str = "") -> bool:
+        """按当前抽样间隔判断下一帧是否需要，调用方可以据此跳过制作快照"""
+        if self.policy != FRAME_POLICY_SAMPLE:
+            return True
+        if self._since_sample + 1 < self.stride:
+            self._since_sample += 1
+            self.submitted += 1
+            self._dropped(filename)
+            return False
+        self._since_sample = 0
+        return True
+
+    def submit(self, snapshot: FrameSnapshot, filename: str) -> bool:
+        """提交一帧，返回是否进入队列"""
+        dropped = None  # 被丢弃的帧，在锁外记录
+        accepted = True
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("FrameExporter 已关闭")
+            self._ensure_thread()
+            self.submitted += 1
+            if len(self.queue) >= self.max_queue:
+                if self.policy == FRAME_POLICY_BLOCK:
+                    while len(self.queue) >= self.max_queue:
+                        self.condition.wait()
+                elif self.policy == FRAME_POLICY_DROP_OLDEST:
+                    _, dropped = self.queue.popleft()
+                else:
+                    if self.policy == FRAME_POLICY_SAMPLE:
+                        self.stride = min(self.stride * 2, self.max_sample_stride)
+                    dropped = filename
+                    accepted = False
+            elif self.policy == FRAME_POLICY_SAMPLE and not self.queue and not self.busy and self.stride > 1:
+                # 后台线程已追上
+                self.stride = max(1, self.stride // 2)
+            if accepted:
+                self.queue.append((snapshot, filename))
+                self.condition.notify_all()
+        if dropped is not None:
+            self._dropped(dropped)
+        return accepted
+
+    def _dropped(self, filename: str) -> None:
+        self.dropped += 1
+        # 丢帧是按策略的正常行为，逐帧只记调试日志，关闭时汇总告警一次
+        events.debug("frames.dropped", "帧 {filename} 被丢弃（策略 {policy}）", filename=filename, policy=self.policy)
+
+    def _ensure_thread(self) -> None:
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._worker, name="frame-exporter", daemon=True)
+            self.thread.start()
+
+    def _worker(self) -> None:
+        renderer = None
+        figure = None
+        while True:
+            with self.condition:
+                while not self.queue and not self.closed:
+                    self.condition.wait()
+                if not self.queue:
+                    return
+                snapshot, filename = self.queue.popleft()
+                self.busy = True
+                self.condition.notify_all()
+            try:
+                if figure is None:
+                    size = (max(4.0, snapshot.width * self.cell_inches), max(3.0, snapshot.height * self.cell_inches))
+                    figure = Figure(figsize=size, dpi=self.dpi)
+                    FigureCanvasAgg(figure)
+                    renderer = RasterRenderer(figure.add_subplot(), self.grid_type_colors, self.vehicle_colors)
+                renderer.draw(snapshot)
+                self._write(figure, filename)
+                self.written += 1
+            except Exception as e:
+                self.failed += 1
+                events.error("frames.failed", "帧 {filename} 输出失败: {error}", filename=filename, error=str(e))
+            finally:
+                with self.condition:
+                    self.busy = False
+                    self.condition.notify_all()
+
+    def _write(self, figure: Figure, filename: str) -> None:
+        if self.animation is None:
+            figure.savefig(os.path.join(self.output_dir, filename), dpi=self.dpi)
+            return
+        from PIL import Image
+        canvas = figure.canvas
+        canvas.draw()
+        # 在后台线程里转成调色板图像，占用内存约为 RGB 的三分之一
+        frame = Image.fromarray(np.asarray(canvas.buffer_rgba())[:, :, :3])
+        self.frames.append(frame.quantize(colors=64, method=Image.Quantize.FASTOCTREE))
+
+    def flush(self) -> None:
+        """等待队列中的帧全部输出"""
+        with self.condition:
+            while self.queue or self.busy:
+                self.condition.wait()
+
+    def close(self) -> None:
+        """输出剩余的帧并结束后台线程，有动画时写出动画文件"""
+        with self.condition:
+            if self.closed:
+                return
+            self.closed = True
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+        if self.animation is not None and self.frames:
+            images = self.frames
+            images[0].save(os.path.join(self.output_dir, self.animation), save_all=True,
+                           append_images=images[1:], duration=100, loop=0)
+            self.frames = []
+        log = events.warning if self.dropped else events.info
+        log("frames.closed", "帧输出完成：提交 {submitted}，写出 {written}，丢弃 {dropped}（策略 {policy}）",
+            submitted=self.submitted, written=self.written, dropped=self.dropped, policy=self.policy)
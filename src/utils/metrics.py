@@ -0,0 +1,152 @@
+from collections import deque
+from typing import Optional, Dict, List, Any, Callable, Iterable, Deque
+import cProfile
+import io
+import pstats
+import time
+from src.algorithms.search import SearchResult
+
+# 计时的阶段；assign_and_plan 包含其中的 find_path 和 occupancy
+PHASE_ASSIGN = "assign_and_plan"
+PHASE_FIND_PATH = "find_path"  # 单车搜索和一对多反向搜索
+PHASE_OCCUPANCY = "occupancy"  # 提交和撤销路径占用
+PHASE_VISUALIZE = "visualize"
+PHASES = (PHASE_ASSIGN, PHASE_FIND_PATH, PHASE_OCCUPANCY, PHASE_VISUALIZE)
+
+# 每步和累计的计数
+COUNTERS = ("plans", "failed_plans", "expanded", "waiting_vehicles")
+
+
+def _empty_record() -> Dict[str, Any]:
+    record: Dict[str, Any] = {f"{phase}_s": 0.0 for phase in PHASES}
+    record.update({counter: 0 for counter in COUNTERS})
+    record["open_peak"] = 0
+    return record
+
+
+class SchedulerMetrics:
+    """调度器每步的耗时和规划统计
+
+    由 Scheduler.enable_metrics 把计时包装装到调度器和规划器的实例上，
+    关闭时移除包装，调用路径与未启用时完全相同，没有额外开销。
+
+    每步记录各阶段耗时、规划次数（一对多搜索按车辆计）、失败次数、扩展节点数、开放表峰值以及
+    步骤结束时等待中的车辆数，最近 history 步保留明细，另有全程累计。
+    profile_phases 中的阶段用 cProfile 采样；阶段嵌套时只采样最外层，
+    因为同一时刻只能有一个 profiler 生效。
+    """
+
+    def __init__(self, history: int = 1000, profile_phases: Iterable[str] = ()):
+        for phase in profile_phases:
+            if phase not in PHASES:
+                raise ValueError(f"未知的阶段: {phase}")
+        self.profiles: Dict[str, cProfile.Profile] = {phase: cProfile.Profile() for phase in profile_phases}
+        self.history: Deque[Dict[str, Any]] = deque(maxlen=history)
+        self.totals = _empty_record()
+        self.calls: Dict[str, int] = {phase: 0 for phase in PHASES}
+        self.ticks = 0
+        self.current: Optional[Dict[str, Any]] = None  # 正在执行的步骤
+        self._profiling = False
+
+    def begin_tick(self, step: int) -> None:
+        self.current = _empty_record()
+        self.current["step"] = step
+
+    def end_tick(self, waiting_vehicles: int) -> None:
+        record = self.current
+        if record is None:
+            return
+        record["waiting_vehicles"] = waiting_vehicles
+        self.totals["waiting_vehicles"] += waiting_vehicles
+        self.history.append(record)
+        self.ticks += 1
+        self.current = None
+
+    def _add(self, key: str, value: float) -> None:
+        self.totals[key] += value
+        if self.current is not None:
+            self.current[key] += value
+
+    def record_search(self, result: SearchResult) -> None:
+        """记录一次搜索的结果"""
+        self._add("plans", 1)
+        self._add("expanded", result.expanded)
+        if result.path is None:
+            self._add("failed_plans", 1)
+        self._peak(result.open_peak)
+
+    def record_searches(self, results: Dict[str, SearchResult], requested: int) -> None:
+        """记录一次一对多搜索：requested 辆车各算一次规划，结果里没有的车辆不可达，
+        计入失败；扩展节点数和开放表峰值是各结果共享的同一次搜索的统计"""
+        self._add("plans", requested)
+        self._add("failed_plans", requested - sum(1 for result in results.values() if result.path is not None))
+        if results:
+            result = next(iter(results.values()))
+            self._add("expanded", result.expanded)
+            self._peak(result.open_peak)
+
+    def _peak(self, open_peak: int) -> None:
+        if open_peak > self.totals["open_peak"]:
+            self.totals["open_peak"] = open_peak
+        if self.current is not None and open_peak > self.current["open_peak"]:
+            self.current["open_peak"] = open_peak
+
+    def timed(self, phase: str, function: Callable, observe: Optional[Callable[[Any], None]] = None) -> Callable:
+        """包装 function，累计 phase 的耗时，observe 接收返回值"""
+        key = f"{phase}_s"
+        clock = time.perf_counter
+
+        def wrapper(*args, **kwargs):
+            profile = self.profiles.get(phase) if not self._profiling else None
+            if profile is not None:
+                self._profiling = True
+                profile.enable()
+            began = clock()
+            try:
+                result = function(*args, **kwargs)
+            finally:
+                elapsed = clock() - began
+                if profile is not None:
+                    profile.disable()
+                    self._profiling = False
+                self.calls[phase] += 1
+                self._add(key, elapsed)
+            if observe is not None:
+                observe(result)
+            return result
+
+        return wrapper
+
+    def snapshot(self) -> Dict[str, Any]:
+        """累计统计和最近一步的明细"""
+        totals = dict(self.totals)
+        return {
+            "ticks": self.ticks,
+            "totals": totals,
+            "calls": dict(self.calls),
+            "mean_tick": {key: value / self.ticks for key, value in totals.items()
+                          if key != "open_peak"} if self.ticks else {},
+            "last_tick": dict(self.history[-1]) if self.history else None,
+        }
+
+    def tick_history(self) -> List[Dict[str, Any]]:
+        """最近若干步的明细"""
+        return [dict(record) for record in self.history]
+
+    def profile_stats(self, phase: str, sort: str = "cumulative", limit: int = 20) -> str:
+        """phase 的 cProfile 结果文本"""
+        profile = self.profiles.get(phase)
+        if profile is None:
+            return ""
+        output = io.StringIO()
+        pstats.Stats(profile, stream=output).sort_stats(sort).print_stats(limit)
+        return output.getvalue()
+
+    def reset(self) -> None:
+        """清空统计和采样，保留配置"""
+        self.profiles = {phase: cProfile.Profile() for phase in self.profiles}
+        self.history.clear()
+        self.totals = _empty_record()
+        self.calls = {phase: 0 for phase in PHASES}
+        self.ticks = 0
+        self.current = None
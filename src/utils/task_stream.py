@@ -0,0 +1,103 @@
+from typing import Iterable, Iterator, Optional, Union, Any
+import json
+from src.models.task import TaskManager, TransportTask, TASK_STATUS_PENDING
+from src.utils.events import events
+
+
+class TaskStream:
+    """在模拟运行中持续读入任务
+
+    source 为文件名时按 JSONL 逐行读取，follow 为 True 时读到文件末尾后不结束，
+    之后每次 poll 继续读取新追加的行（不完整的末行留到下次）；source 也可以是
+    逐个产生记录（字典或 JSON 文本）的可迭代对象或生成器。
+
+    每次 poll 最多取出 batch_size 条；待分配任务达到 max_pending 时不再读取，
+    未读的记录留在源中，内存占用与任务总数无关。
+    """
+
+    def __init__(self, source: Union[str, Iterable[Any]], batch_size: int = 32, max_pending: int = 128,
+                 follow: bool = False):
+        self.source = source
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.follow = follow
+        self.exhausted = False  # 源已读完，follow 模式下只有 close 后才为 True
+        self.ingested = 0  # 读入的任务数
+        self.rejected = 0  # 无法解析或重复的记录数
+        self.throttled = 0  # 因待分配任务过多而暂停读取的次数
+        self.records_read = 0  # 已从源中取出的记录数（含空行）
+        self._file = None
+        self._partial = ""  # follow 模式下尚未读到换行的末行
+        self._records: Optional[Iterator[Any]] = None if isinstance(source, str) else iter(source)
+
+    def poll(self, task_manager: TaskManager) -> int:
+        """读入一批任务加入 task_manager，返回读入的数量"""
+        if self.exhausted:
+            return 0
+        room = min(self.batch_size, self.max_pending - task_manager.count_by_status(TASK_STATUS_PENDING))
+        if room <= 0:
+            self.throttled += 1
+            return 0
+        added = 0
+        for _ in range(room):  # 无效记录也占用名额，每次 poll 的工作量有上限
+            record = self._next_record()
+            if record is None:
+                break
+            if self._ingest(task_manager, record):
+                added += 1
+        return added
+
+    def _next_record(self) -> Optional[Any]:
+        """源中的下一条记录，暂时没有时返回 None"""
+        if self._records is not None:
+            try:
+                record = next(self._records)
+            except StopIteration:
+                self.exhausted = True
+                return None
+            self.records_read += 1
+            return record
+        if self._file is None:
+            self._file = open(self.source, "r", encoding="utf-8")
+        while True:
+            line = self._file.readline()
+            if not line:
+                if not self.follow:
+                    self.close()
+                return None
+            if not line.endswith("\n") and self.follow:
+                # 写入方还没写完这一行
+                self._partial += line
+                return None
+            line, self._partial = self._partial + line, ""
+            self.records_read += 1
+            if line.strip():
+                return line
+
+    def _ingest(self, task_manager: TaskManager, record: Any) -> bool:
+        """解析一条记录并加入任务队列"""
+        try:
+            data = json.loads(record) if isinstance(record, (str, bytes)) else record
+            if "id" in data:
+                task_manager.insert_task(TransportTask.from_dict(data))
+            else:
+                task_manager.add_task(
+                    task_type=data["task_type"],
+                    start_pos=tuple(data["start_position"]),
+                    end_pos=tuple(data["end_position"]),
+                    priority=data.get("priority", 0),
+                )
+        except (ValueError, KeyError, TypeError) as e:
+            self.rejected += 1
+            events.warning("tasks.stream_rejected", "第 {line} 条任务记录无效: {error}",
+                           line=self.records_read, error=str(e))
+            return False
+        self.ingested += 1
+        return True
+
+    def close(self) -> None:
+        """停止读取并关闭文件"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self.exhausted = True
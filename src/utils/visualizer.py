@@ -1,15 +1,157 @@
+import matplotlib
 import matplotlib.pyplot as plt
 from matplotlib.lines import Line2D
+from matplotlib.collections import LineCollection
+from matplotlib.colors import to_rgb, to_rgba
 import matplotlib.patches as patches
-from typing import List
-from src.models.grid import Grid, GRID_TYPE_NORMAL_CHANNEL, GRID_TYPE_MAIN_CHANNEL, GRID_TYPE_OBSTACLE
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+import numpy as np
+from src.models.grid import (
+    Grid, GRID_TYPE_NORMAL_CHANNEL, GRID_TYPE_MAIN_CHANNEL, GRID_TYPE_OBSTACLE,
+    CELL_NORMAL_CHANNEL, CELL_MAIN_CHANNEL, CELL_OBSTACLE,
+)
 from src.models.vehicle import Vehicle
 
+# 绘制方式
+RENDER_MODE_RASTER = "raster"  # 整张地图一次 imshow，车辆和路径用集合绘制，图像复用
+RENDER_MODE_DETAILED = "detailed"  # 每个格子单独绘制，带坐标和方向文字，适合小地图
+
+@dataclass(frozen=True)
+class VehicleSnapshot:
+    """绘制用的车辆状态副本"""
+    id: str
+    position: Tuple[int, int]
+    vehicle_type: str
+    status: str
+    path: Tuple[Tuple[int, int], ...]
+
+
+@dataclass(frozen=True)
+class FrameSnapshot:
+    """绘制一帧所需的全部状态，创建后不再修改，可以交给其他线程绘制"""
+    width: int
+    height: int
+    structure_version: int
+    grid_version: Tuple[int, int]
+    cell_types: np.ndarray  # 只读
+    cargo: np.ndarray  # 只读
+    entrances: Tuple[Tuple[int, int], ...]
+    exits: Tuple[Tuple[int, int], ...]
+    occupancy_version: Optional[int]
+    occupied: Tuple[Tuple[Tuple[int, int], str], ...]  # (位置, 车辆编号)
+    vehicles: Tuple[VehicleSnapshot, ...]
+
+
+def _rgb8(color) -> np.ndarray:
+    return (np.array(to_rgb(color)) * 255).round().astype(np.uint8)
+
+
+class RasterRenderer:
+    """在给定坐标轴上按快照绘制栅格图像，图层复用，只更新变化的部分
+
+    不依赖 pyplot，坐标轴可以来自 pyplot 的图，也可以来自后台线程自建的 Figure。
+    """
+
+    def __init__(self, ax, grid_type_colors: dict, vehicle_colors: dict):
+        self.ax = ax
+        self.vehicle_colors = vehicle_colors
+        # uint8 图像在绘制时不需要归一化，比浮点图像快得多
+        self.type_colors = np.zeros((3, 3), dtype=np.uint8)
+        self.type_colors[CELL_NORMAL_CHANNEL] = _rgb8(grid_type_colors[GRID_TYPE_NORMAL_CHANNEL])
+        self.type_colors[CELL_MAIN_CHANNEL] = _rgb8(grid_type_colors[GRID_TYPE_MAIN_CHANNEL])
+        self.type_colors[CELL_OBSTACLE] = _rgb8(grid_type_colors[GRID_TYPE_OBSTACLE])
+        self.cargo_color = _rgb8('#FFB6B6')
+        self.shape = None
+        self.base = None
+        self.grid_version = None
+        self.structure_version = None
+        self.occupancy_version = None
+        self.vehicle_state = None
+
+    def _create_layers(self, width: int, height: int) -> None:
+        """创建复用的图层：格子图像、出入口、路径和车辆"""
+        ax = self.ax
+        ax.clear()
+        self.image = ax.imshow(np.full((height, width, 3), 255, dtype=np.uint8), interpolation='nearest',
+                               origin='upper', extent=(-0.5, width - 0.5, height - 0.5, -0.5))
+        ax.set_xlim(-0.5, width - 0.5)
+        ax.set_ylim(height - 0.5, -0.5)
+        ax.set_xticks([])
+        ax.set_yticks([])
+        self.entrances = ax.scatter([], [], marker='s', s=30, facecolors='none', edgecolors='blue', linewidths=1.5)
+        self.exits = ax.scatter([], [], marker='s', s=30, facecolors='none', edgecolors='green', linewidths=1.5)
+        self.paths = LineCollection([], linewidths=1.5, alpha=0.8)
+        ax.add_collection(self.paths)
+        self.vehicles = ax.scatter([], [], s=40, edgecolors='black', linewidths=0.5, zorder=3)
+        self.shape = (height, width)
+        self.grid_version = self.structure_version = self.occupancy_version = self.vehicle_state = None
+
+    def draw(self, snapshot: FrameSnapshot) -> None:
+        if self.shape != (snapshot.height, snapshot.width):
+            self._create_layers(snapshot.width, snapshot.height)
+        self._update_cells(snapshot)
+        self._update_vehicles(snapshot)
+
+    @staticmethod
+    def _vehicle_palette(snapshot: FrameSnapshot) -> dict:
+        cmap = matplotlib.colormaps['tab20']
+        return {vehicle.id: cmap(i % 20) for i, vehicle in enumerate(snapshot.vehicles)}
+
+    def _update_cells(self, snapshot: FrameSnapshot) -> None:
+        """地图或占用变化时重新着色格子图像"""
+        if self.structure_version != snapshot.structure_version:
+            self.entrances.set_offsets(np.array(snapshot.entrances, dtype=float).reshape(-1, 2))
+            self.exits.set_offsets(np.array(snapshot.exits, dtype=float).reshape(-1, 2))
+            self.structure_version = snapshot.structure_version
+        base_changed = self.grid_version != snapshot.grid_version
+        if base_changed:
+            base = self.type_colors[snapshot.cell_types.reshape(self.shape)]
+            # 货物按原图的半透明粉色叠加
+            cargo = snapshot.cargo.reshape(self.shape)
+            base[cargo] = (base[cargo] * 0.4 + self.cargo_color * 0.6).astype(np.uint8)
+            self.base = base
+            self.grid_version = snapshot.grid_version
+        if not base_changed and self.occupancy_version == snapshot.occupancy_version:
+            return
+        pixels = self.base
+        if snapshot.occupied:
+            pixels = pixels.copy()
+            palette = self._vehicle_palette(snapshot)
+            height, width = self.shape
+            for (x, y), vehicle_id in snapshot.occupied:
+                if 0 <= x < width and 0 <= y < height:
+                    pixels[y, x] = _rgb8(palette.get(vehicle_id, 'yellow'))
+        self.image.set_data(pixels)
+        self.occupancy_version = snapshot.occupancy_version
+
+    def _update_vehicles(self, snapshot: FrameSnapshot) -> None:
+        """车辆位置或路径变化时更新车辆和路径集合"""
+        if snapshot.vehicles == self.vehicle_state:
+            return
+        self.vehicle_state = snapshot.vehicles
+        palette = self._vehicle_palette(snapshot)
+        vehicles = snapshot.vehicles
+        self.vehicles.set_offsets(np.array([vehicle.position for vehicle in vehicles], dtype=float).reshape(-1, 2))
+        self.vehicles.set_facecolors([to_rgba(self.vehicle_colors.get(vehicle.vehicle_type, 'gray'), 0.8)
+                                      for vehicle in vehicles])
+        with_path = [vehicle for vehicle in vehicles if len(vehicle.path) > 1]
+        self.paths.set_segments([np.array(vehicle.path, dtype=float) for vehicle in with_path])
+        self.paths.set_colors([palette[vehicle.id] for vehicle in with_path])
+        self.paths.set_linestyles(['--' if vehicle.status == "waiting" else '-' for vehicle in with_path])
+
+
 class GridVisualizer:
     """网格可视化器"""
-    def __init__(self, grid: Grid):
+    def __init__(self, grid: Grid, render_mode: str = RENDER_MODE_RASTER, cell_inches: float = 0.15, dpi: int = 100):
         self.grid = grid
-        self.fig, self.ax = plt.subplots(figsize=(300, 200))
+        self.render_mode = render_mode
+        self.cell_inches = cell_inches  # 栅格模式下每个格子的尺寸
+        self.dpi = dpi
+        self._fig = None
+        self._ax = None
+        self._raster: Optional[RasterRenderer] = None  # 栅格模式复用的图层
+        self._snapshot_arrays = None  # (地图版本, 格子类型, 货物)，供快照复用
         self.vehicles: List[Vehicle] = []
         
         # 设置颜色映射
@@ -41,6 +183,25 @@ class GridVisualizer:
             "right": "→"
         }
     
+    @property
+    def fig(self):
+        if self._fig is None:
+            self._create_figure()
+        return self._fig
+
+    @property
+    def ax(self):
+        if self._ax is None:
+            self._create_figure()
+        return self._ax
+
+    def _create_figure(self) -> None:
+        if self.render_mode == RENDER_MODE_DETAILED:
+            self._fig, self._ax = plt.subplots(figsize=(300, 200))
+        else:
+            size = (max(4.0, self.grid.width * self.cell_inches), max(3.0, self.grid.height * self.cell_inches))
+            self._fig, self._ax = plt.subplots(figsize=size, dpi=self.dpi)
+
     def add_vehicle(self, vehicle: Vehicle) -> None:
         """添加车辆到可视化器"""
         self.vehicles.append(vehicle)
@@ -145,9 +306,51 @@ class GridVisualizer:
         legend_element = Line2D([0], [0], color='black', lw=4, label='车辆路径')
         self.ax.legend(handles=[legend_element], loc='upper right', fontsize=32, title="图例", title_fontsize=32)
     
+    def snapshot(self, constraint_manager=None) -> "FrameSnapshot":
+        """复制当前状态用于绘制；地图数组只在版本变化时复制，未变化时复用上一份"""
+        grid = self.grid
+        cached = self._snapshot_arrays
+        if cached is None or cached[0] != grid.version:
+            cell_types = grid.cell_types.copy()
+            cargo = grid.cargo.copy()
+            cell_types.setflags(write=False)
+            cargo.setflags(write=False)
+            cached = self._snapshot_arrays = (grid.version, cell_types, cargo)
+        conflict = constraint_manager.vehicle_conflict_constraint if constraint_manager is not None else None
+        return FrameSnapshot(
+            width=grid.width,
+            height=grid.height,
+            structure_version=grid.structure_version,
+            grid_version=grid.version,
+            cell_types=cached[1],
+            cargo=cached[2],
+            entrances=tuple(grid.entrances),
+            exits=tuple(grid.exits),
+            occupancy_version=conflict.version if conflict is not None else None,
+            occupied=tuple(conflict.occupied_positions.items()) if conflict is not None else (),
+            vehicles=tuple(
+                VehicleSnapshot(vehicle.id, vehicle.current_position, vehicle.vehicle_type,
+                                vehicle.status, tuple(vehicle.path))
+                for vehicle in self.vehicles
+            ),
+        )
+
+    def render(self, constraint_manager=None) -> None:
+        """绘制当前状态；栅格方式只更新变化过的图层"""
+        if self.render_mode == RENDER_MODE_DETAILED:
+            self.draw_grid(constraint_manager)
+            self.draw_vehicles()
+            return
+        if self._raster is None:
+            self._raster = RasterRenderer(self.ax, self.grid_type_colors, self.vehicle_colors)
+        self._raster.draw(self.snapshot(constraint_manager))
+
     def save(self, filename: str) -> None:
         """保存图像"""
-        plt.savefig(filename, dpi=100, bbox_inches='tight')
+        if self.render_mode == RENDER_MODE_DETAILED:
+            self.fig.savefig(filename, dpi=100, bbox_inches='tight')
+        else:
+            self.fig.savefig(filename, dpi=self.dpi)
         # plt.close()
     
     def show(self) -> None:
@@ -0,0 +1,38 @@
+from src.models.task import (
+    TaskManager,
+    TASK_TYPE_INBOUND,
+    TASK_STATUS_COMPLETED,
+    TASK_STATUS_PENDING,
+)
+
+
+def test_pending_heap_stays_bounded_under_churn():
+    manager = TaskManager()
+    for i in range(100000):
+        task = manager.add_task(TASK_TYPE_INBOUND, (0, 0), (1, 1))
+        task.assign_to_vehicle(f"V{i % 8}")
+        task.start_execution()
+        task.complete()
+        manager.remove_task(task.id)
+    assert len(manager) == 0
+    assert len(manager._pending_heap) <= 1
+
+
+def test_pending_heap_compaction_keeps_dispatch_order():
+    manager = TaskManager()
+    tasks = [manager.add_task(TASK_TYPE_INBOUND, (0, 0), (1, 1), priority=i % 5) for i in range(50)]
+    for task in tasks[::2]:
+        task.assign_to_vehicle("V1")
+    for task in tasks[1::4]:
+        manager.remove_task(task.id)
+    pending = manager.get_tasks_by_status(TASK_STATUS_PENDING)
+    assert len(manager._pending_heap) <= 2 * len(pending)
+
+    order = []
+    while True:
+        task = manager.get_next_task()
+        if task is None:
+            break
+        order.append(task)
+        task.status = TASK_STATUS_COMPLETED
+    assert order == sorted(pending, key=lambda task: (-task.priority, task.created_at))